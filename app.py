@@ -1,27 +1,92 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, g
-from db import get_db, init_db
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, flash, g
+from db import get_db, close_db, init_db, pool_stats, PoolTimeout
+import identity
+import counters
+import audit
+import table_versions
+import qcache
+import events
+import search as search_index
+import import_equipment
+import export
+import wire
+import instrumentation
+import profiler
+import queries
+import passwords
+from queries import (REQUEST_STAGES, REQUEST_CARD_QUERY, request_filter_conditions, equipment_filter_conditions,
+                     log_filter_conditions)
+from pagination import InvalidParam, parse_limit
 import datetime
+import math
 import os
+import time
 import requests 
 import functools
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)
+# Sessions are signed with this key: every worker and every restart must share
+# it (serve.py refuses to start without SECRET_KEY). The random fallback is for
+# `python app.py` only and logs everyone out on restart.
+app.secret_key = os.getenv('SECRET_KEY') or os.urandom(24)
 init_db(app)
+wire.init_app(app)
+instrumentation.init_app(app)
+profiler.init_app(app)
+
+# 'counters' reads the maintained RequestStatCounter tables, 'scan' aggregates
+# MaintenanceRequest directly in one pass
+STATS_SOURCE = os.getenv('STATS_SOURCE', 'counters')
 
 # --- Helpers ---
 def log_action(user_id, action, target_type=None, target_id=None, details=None):
-    try:
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO AuditLog (user_id, action, target_type, target_id, details)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (user_id, action, target_type, target_id, details))
-        cursor.close()
-    except Exception as e:
-        print(f"Log Error: {e}")
+    # Queued for the background audit writer (see audit.py); never raises
+    audit.writer.submit(user_id, action, target_type, target_id, details)
+
+def log_actions(entries):
+    # Several (user_id, action, target_type, target_id, details) rows in one go
+    audit.writer.submit_many(entries)
+
+@app.errorhandler(PoolTimeout)
+@app.errorhandler(passwords.PasswordBusy)
+def handle_pool_timeout(e):
+    # Connection or password pool exhausted: tell the client to back off
+    # instead of piling onto MySQL / the hashing processes
+    if request.path.startswith('/api/'):
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+    return "Server busy, please retry", 503, {'Retry-After': '1'}
+
+@app.errorhandler(InvalidParam)
+def handle_invalid_param(e):
+    return jsonify({'error': str(e)}), 400
+
+# Tables read by the cached queries (query cache tags, see qcache.py).
+# User is left out of the request listing: names never change once a user has requests.
+# Request listings add the caller's scope tags (queries.request_scope_tags).
+EQUIPMENT_READ_TABLES = ['Equipment', 'Technician', 'MaintenanceTeam', 'WorkCenter', 'EquipmentCategory']
+REQUEST_READ_TABLES = ['MaintenanceRequest', 'Equipment', 'EquipmentCategory', 'Technician', 'MaintenanceTeam']
+
+def invalidate_requests(cursor, changes, equipment_changed):
+    # After commit: changes are (old, new) request rows. Only the scopes that
+    # can see them are bumped, and Equipment only when is_scrapped or
+    # open_request_count changed.
+    tags = queries.request_change_tags([row for change in changes for row in change])
+    if equipment_changed:
+        tags.append('Equipment')
+    qcache.cache.invalidate(cursor, *tags)
+
+def load_request_cards(cursor, ids):
+    # -> {id: card}
+    if not ids:
+        return {}
+    cursor.execute(REQUEST_CARD_QUERY + f" WHERE r.id IN ({', '.join(['%s'] * len(ids))})", list(ids))
+    return {card['id']: card for card in cursor.fetchall()}
+
+def load_request_card(cursor, req_id):
+    return load_request_cards(cursor, [req_id]).get(req_id)
+
+def request_scope_conditions(alias='r'):
+    return queries.request_scope_conditions(g.identity, alias)
 
 # --- Auth Decorator ---
 def login_required(view):
@@ -49,41 +114,70 @@ def role_required(roles):
 @app.before_request
 def load_logged_in_user():
     user_id = session.get('user_id')
+    g.identity = None
     if user_id is None:
         g.user = None
     else:
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM User WHERE id = %s", (user_id,))
-        g.user = cursor.fetchone()
-        cursor.close()
+        # Cached per process: user row plus technician/team scope in one lookup
+        g.identity = identity.load_identity(get_db(), user_id)
+        g.user = g.identity['user'] if g.identity else None
 
 # --- Auth Routes ---
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        email = request.form['email']
-        password = request.form['password']
-        db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM User WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        cursor.close()
-
-        if user and check_password_hash(user['password_hash'], password):
-            session.clear()
-            session['user_id'] = user['id']
-            session['user_role'] = user['role']
-            session['user_name'] = user['name']
-            
-            log_action(user['id'], 'LOGIN')
-            
-            # Unified Entry Point: Dashboard
-            return redirect(url_for('dashboard'))
-        
-        flash('Invalid email or password', 'error')
+        started = time.monotonic()
+        outcome = 'busy'   # PasswordBusy goes on to the 503 handler
+        try:
+            response, outcome = attempt_login(request.form['email'], request.form['password'])
+            return response
+        finally:
+            instrumentation.observe_login(outcome, time.monotonic() - started)
     return render_template('login.html')
 
+def attempt_login(email, password):
+    # -> (response, outcome)
+    wait = passwords.throttle.check(email, request.remote_addr)
+    if wait:
+        retry_after = math.ceil(wait)
+        flash(f'Too many login attempts. Try again in {retry_after} seconds.', 'error')
+        return (render_template('login.html'), 429, {'Retry-After': str(retry_after)}), 'throttled'
+
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT * FROM User WHERE email = %s", (email,))
+    user = cursor.fetchone()
+    cursor.close()
+    # Don't hold a pooled connection while queued for the password pool
+    close_db()
+
+    ok = False
+    if user:
+        ok, new_hash = passwords.verify_password(user['password_hash'], password)
+    if ok:
+        if new_hash:
+            # Hash parameters changed since this password was set
+            db = get_db()
+            cursor = db.cursor()
+            cursor.execute("UPDATE User SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                           (new_hash, user['id'], user['password_hash']))
+            db.commit()
+            cursor.close()
+            identity.cache.invalidate(user['id'])
+
+        session.clear()
+        session['user_id'] = user['id']
+        session['user_role'] = user['role']
+        session['user_name'] = user['name']
+
+        log_action(user['id'], 'LOGIN')
+
+        # Unified Entry Point: Dashboard
+        return redirect(url_for('dashboard')), 'success'
+
+    flash('Invalid email or password', 'error')
+    return render_template('login.html'), 'failure'
+
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
     if request.method == 'POST':
@@ -101,10 +195,11 @@ def signup():
              flash('Invalid role selected.', 'error')
              return render_template('signup.html')
 
+        # Outside the try below: PasswordBusy is a 503, not a form error
+        p_hash = passwords.hash_password(password)
         db = get_db()
         cursor = db.cursor()
         try:
-            p_hash = generate_password_hash(password)
             # Role comes from form, but validated above. Explicitly NOT Admin.
             cursor.execute("INSERT INTO User (name, email, password_hash, role) VALUES (%s, %s, %s, %s)", (name, email, p_hash, role))
             db.commit() 
@@ -115,9 +210,11 @@ def signup():
             # If they choose Tech, we should probably create a Technician record for them so they show up in lists?
             if role == 'Technician':
                  cursor.execute("INSERT INTO Technician (name, user_id, role) VALUES (%s, %s, 'Technician')", (name, new_id))
+                 qcache.cache.invalidate(cursor, 'Technician')
                  db.commit()
 
             cursor.close()
+            identity.cache.invalidate(new_id)
             
             log_action(new_id, 'SIGNUP')
             flash('Account created! Please login.', 'success')
@@ -168,17 +265,11 @@ def equipment_detail(id):
         
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT e.*, t.name as technician_name, m.team_name, wc.name as work_center_name, ec.name as category_name,
-        (SELECT COUNT(*) FROM MaintenanceRequest mr WHERE mr.equipment_id = e.id AND mr.stage != 'Repaired' AND mr.stage != 'Scrap') as open_requests
-        FROM Equipment e
-        LEFT JOIN Technician t ON e.default_technician_id = t.id
-        LEFT JOIN MaintenanceTeam m ON e.maintenance_team_id = m.id
-        LEFT JOIN WorkCenter wc ON e.work_center_id = wc.id
-        LEFT JOIN EquipmentCategory ec ON e.category_id = ec.id
-        WHERE e.id = %s
-    """, (id,))
-    item = cursor.fetchone()
+    def load():
+        cursor.execute(queries.EQUIPMENT_LIST_QUERY + " WHERE e.id = %s", (id,))
+        # False marks "not found" so lookups of unknown ids are cached too
+        return cursor.fetchone() or False
+    item = qcache.cache.fetch(cursor, EQUIPMENT_READ_TABLES, 'equipment:detail', (id,), None, load)
     cursor.close()
     if not item:
         return "Equipment not found", 404
@@ -246,70 +337,111 @@ def create_request_page():
 def api_stats():
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    stats = {}
-    
-    conditions_mr = []
-    params_mr = []
-    conditions_eq = [] 
-    params_eq = []
-
-    if g.user['role'] == 'Technician':
-        cursor.execute("SELECT team_id FROM Technician WHERE user_id = %s", (g.user['id'],))
-        t = cursor.fetchone()
-        if t and t['team_id']:
-             conditions_mr.append("team_id = %s")
-             params_mr.append(t['team_id'])
-             conditions_eq.append("maintenance_team_id = %s")
-             params_eq.append(t['team_id'])
-        else:
-             conditions_mr.append("1=0")
-             conditions_eq.append("1=0")
-    
-    elif g.user['role'] == 'Company User':
-        conditions_mr.append("created_by_user_id = %s")
-        params_mr.append(g.user['id'])
-        # Critical equipment? They might care about all, or none. 
-        # Requirement: "Track status of their requests".
-        # Let's show global critical equip for awareness or 0? 
-        # Safer to show 0 or only relevant. Let's filter MR related stats.
-
-    where_mr = " AND ".join(conditions_mr) if conditions_mr else ""
-    where_mr_clause = f" AND {where_mr}" if where_mr else ""
-    
-    # 1. Critical Equipment (Corrective + New/InProgress)
-    # This query joins MR anyway
-    query_crit = f"""
-        SELECT COUNT(DISTINCT equipment_id) as count 
-        FROM MaintenanceRequest 
-        WHERE request_type = 'Corrective' AND stage IN ('New', 'In Progress') {where_mr_clause}
-    """
-    cursor.execute(query_crit, params_mr)
-    stats['critical_equipment'] = cursor.fetchone()['count']
-    
-    # 2. Technician Load (Active requests with tech assigned)
-    # Meaningful for Admin/Manager. For Tech, it's their team's load or their own?
-    # "Technician Load" usually means total active jobs.
-    query_load = f"""
-        SELECT COUNT(*) as count 
-        FROM MaintenanceRequest 
-        WHERE stage IN ('In Progress') AND technician_id IS NOT NULL {where_mr_clause}
-    """
-    cursor.execute(query_load, params_mr)
-    stats['technician_load'] = cursor.fetchone()['count']
-    
-    # 3. Active Requests
-    query_active = f"SELECT COUNT(*) as count FROM MaintenanceRequest WHERE stage IN ('New', 'In Progress') {where_mr_clause}"
-    cursor.execute(query_active, params_mr)
-    stats['active_requests'] = cursor.fetchone()['count']
-
-    # 4. By Stage
-    query_stage = f"SELECT stage, COUNT(*) as count FROM MaintenanceRequest WHERE 1=1 {where_mr_clause} GROUP BY stage"
-    cursor.execute(query_stage, params_mr)
-    stats['by_stage'] = cursor.fetchall()
-    
+
+    # Technicians see their team's numbers (none when teamless),
+    # Company Users only the requests they created, Admins everything.
+    conditions, params = counters.scope_conditions(g.user['role'], g.user['id'], g.identity['team_id'])
+
+    if STATS_SOURCE == 'scan':
+        # Single pass over MaintenanceRequest
+        stats = counters.compute_stats(cursor, conditions, params)
+    else:
+        # Maintained counters: cost depends on the number of teams/users, not requests
+        stats = counters.read_stats(cursor, conditions, params)
+
     cursor.close()
     return jsonify(stats)
 
+CALENDAR_CARDS_PER_DAY = 3
+
+@app.route('/api/calendar')
+@login_required
+def api_calendar():
+    month = request.args.get('month', '')
+    try:
+        first_day = datetime.datetime.strptime(month, '%Y-%m').date()
+    except ValueError:
+        return jsonify({'error': 'month must be YYYY-MM'}), 400
+    next_month = (first_day + datetime.timedelta(days=32)).replace(day=1)
+    per_day = parse_limit(request.args.get('per_day'), default=CALENDAR_CARDS_PER_DAY, maximum=20)
+
+    # Range predicate on scheduled_date so idx_request_scheduled_date is used
+    conditions = ["r.scheduled_date >= %s", "r.scheduled_date < %s"]
+    params = [first_day, next_month]
+    scope_conditions, scope_params = request_scope_conditions()
+    conditions += scope_conditions
+    params += scope_params
+    where = " AND ".join(conditions)
+
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT r.scheduled_date, r.request_type, r.stage, COUNT(*) as count
+        FROM MaintenanceRequest r
+        WHERE {where}
+        GROUP BY r.scheduled_date, r.request_type, r.stage
+    """, params)
+    counts = cursor.fetchall()
+
+    # Top N cards per day, ranked in SQL so the payload stays capped
+    cursor.execute(f"""
+        SELECT * FROM (
+            SELECT r.id, r.subject, r.request_type, r.stage, r.scheduled_date,
+                   e.name as equipment_name, e.location as equipment_location, t.name as technician_name,
+                   ROW_NUMBER() OVER (PARTITION BY r.scheduled_date ORDER BY r.request_type, r.id) as rn
+            FROM MaintenanceRequest r
+            JOIN Equipment e ON r.equipment_id = e.id
+            LEFT JOIN Technician t ON r.technician_id = t.id
+            WHERE {where}
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY scheduled_date, rn
+    """, params + [per_day])
+    cards = cursor.fetchall()
+    cursor.close()
+
+    days = {}
+    for row in counts:
+        day = days.setdefault(str(row['scheduled_date']), {'total': 0, 'by_type': {}, 'by_stage': {}, 'cards': []})
+        day['total'] += row['count']
+        day['by_type'][row['request_type']] = day['by_type'].get(row['request_type'], 0) + row['count']
+        day['by_stage'][row['stage']] = day['by_stage'].get(row['stage'], 0) + row['count']
+    for card in cards:
+        card.pop('rn')
+        card['scheduled_date'] = str(card['scheduled_date'])
+        day = days.get(card['scheduled_date'])
+        if day is not None:
+            day['cards'].append(card)
+    for day in days.values():
+        day['more'] = day['total'] - len(day['cards'])
+
+    response = jsonify({'month': first_day.strftime('%Y-%m'), 'days': days})
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response
+
+@app.route('/api/search')
+@login_required
+def api_search():
+    q = request.args.get('q', '').strip()
+    limit = parse_limit(request.args.get('limit'), default=search_index.DEFAULT_LIMIT,
+                        maximum=search_index.MAX_RESULTS)
+    results = {'equipment': [], 'requests': []}
+    if not q:
+        return jsonify(results)
+
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    # Equipment listing is limited to the same roles as /api/equipment
+    if g.user['role'] in ['Company User', 'Admin']:
+        ids = search_index.equipment_ids(cursor, q, limit)
+        results['equipment'] = search_index.fetch_equipment(cursor, ids)
+
+    scope_conditions, scope_params = request_scope_conditions()
+    ids = search_index.request_ids(cursor, q, scope_conditions, scope_params, limit)
+    results['requests'] = search_index.fetch_requests(cursor, ids)
+    cursor.close()
+    return jsonify(results)
+
 @app.route('/api/equipment', methods=['GET', 'POST'])
 @login_required
 def api_equipment():
@@ -320,31 +452,31 @@ def api_equipment():
     cursor = db.cursor(dictionary=True)
     
     if request.method == 'GET':
-        query = """
-            SELECT e.*, t.name as technician_name, m.team_name, wc.name as work_center_name, ec.name as category_name,
-            (SELECT COUNT(*) FROM MaintenanceRequest mr WHERE mr.equipment_id = e.id AND mr.stage != 'Repaired' AND mr.stage != 'Scrap') as open_requests
-            FROM Equipment e
-            LEFT JOIN Technician t ON e.default_technician_id = t.id
-            LEFT JOIN MaintenanceTeam m ON e.maintenance_team_id = m.id
-            LEFT JOIN WorkCenter wc ON e.work_center_id = wc.id
-            LEFT JOIN EquipmentCategory ec ON e.category_id = ec.id
-        """
-        search = request.args.get('search')
-        params = []
-        conditions = []
-        
-        if search:
-            conditions.append("(e.name LIKE %s OR e.serial_number LIKE %s)")
-            params.extend([f"%{search}%", f"%{search}%"])
-            
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY e.id DESC"
-        cursor.execute(query, params)
-        equipment_list = cursor.fetchall()
+        limit = parse_limit(request.args.get('limit'))
+        def load():
+            search = request.args.get('search')
+            if search:
+                # Resolved through the FULLTEXT / prefix indexes instead of '%term%' scans
+                ids = search_index.equipment_ids(cursor, search)
+                if not ids:
+                    return [], None, False
+                cursor.execute(*queries.equipment_list_query(request.args, limit, ids))
+                return queries.search_page(cursor.fetchall(), ids, request.args, limit, search_index.MAX_RESULTS)
+            query, params = queries.equipment_list_query(request.args, limit)
+            cursor.execute(query, params)
+            return queries.split_page(cursor.fetchall(), limit, 'id') + (False,)
+
+        # Equipment is not role-scoped: every permitted role shares an entry
+        equipment_list, next_cursor, truncated = qcache.cache.fetch(
+            cursor, EQUIPMENT_READ_TABLES, 'equipment:page', sorted(request.args.items(multi=True)), None, load)
         cursor.close()
-        return jsonify(equipment_list)
+
+        response = wire.rows_response(equipment_list)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        if truncated:
+            response.headers['X-Search-Truncated'] = '1'
+        return response
     
     if request.method == 'POST':
         # Already checked role above - STRICT Company User
@@ -365,10 +497,38 @@ def api_equipment():
               data.get('default_technician_id'), data.get('description'), data.get('equipment_type')))
         
         new_id = cursor.lastrowid
+        qcache.cache.invalidate(cursor, 'Equipment')
         cursor.close()
         log_action(g.user['id'], 'CREATE_EQUIPMENT', 'Equipment', new_id, f"Created {data['name']}")
         return jsonify({'id': new_id, 'message': 'Equipment created'}), 201
 
+@app.route('/api/equipment/import', methods=['POST'])
+@login_required
+def api_equipment_import():
+    # Bulk upsert from CSV / NDJSON, sent as the raw body or as a multipart 'file'.
+    # The body is read as a stream; see import_equipment.py for the columns.
+    if g.user['role'] != 'Company User':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    try:
+        fmt = import_equipment.detect_format(upload.filename if upload else None, request.content_type,
+                                             request.args.get('format'))
+    except ValueError as e:
+        raise InvalidParam(str(e))
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+
+    db = get_db()
+    report = import_equipment.import_rows(db, import_equipment.read_rows(stream, fmt), dry_run=dry_run)
+    if not dry_run and (report.created or report.updated):
+        cursor = db.cursor()
+        qcache.cache.invalidate(cursor, 'Equipment')
+        cursor.close()
+        log_action(g.user['id'], 'IMPORT_EQUIPMENT', 'Equipment', None,
+                   f"Imported {report.created} new, {report.updated} updated, {report.error_count} rejected")
+    return jsonify(report.as_dict())
+
 @app.route('/api/equipment/<int:id>', methods=['PUT', 'DELETE'])
 @login_required
 def api_equipment_action(id):
@@ -379,7 +539,17 @@ def api_equipment_action(id):
     cursor = db.cursor(dictionary=True)
     
     if request.method == 'DELETE':
+        db.start_transaction()
+        # Requests cascade with the equipment; take them out of the counters first
+        counters.before_equipment_delete(cursor, id)
+        cursor.execute("""
+            SELECT id, team_id, technician_id, created_by_user_id, scheduled_date, stage, request_type
+            FROM MaintenanceRequest WHERE equipment_id = %s
+        """, (id,))
+        events.publish_many(cursor, [('deleted', req['id'], req, None) for req in cursor.fetchall()])
         cursor.execute("DELETE FROM Equipment WHERE id = %s", (id,))
+        db.commit()
+        qcache.cache.invalidate(cursor, 'Equipment', 'MaintenanceRequest')
         cursor.close()
         log_action(g.user['id'], 'DELETE_EQUIPMENT', 'Equipment', id, "Deleted equipment")
         return jsonify({'message': 'Deleted'})
@@ -394,63 +564,37 @@ def api_requests():
     cursor = db.cursor(dictionary=True)
     
     if request.method == 'GET':
-        equipment_id = request.args.get('equipment_id')
-        search = request.args.get('search')
-        query = """
-            SELECT r.*, r.description, e.name as equipment_name, e.location as equipment_location, t.name as technician_name, t.avatar_url, m.team_name, ec.name as category_name, u.name as created_by_name
-            FROM MaintenanceRequest r
-            JOIN Equipment e ON r.equipment_id = e.id
-            LEFT JOIN EquipmentCategory ec ON e.category_id = ec.id
-            LEFT JOIN Technician t ON r.technician_id = t.id
-            LEFT JOIN MaintenanceTeam m ON r.team_id = m.id
-            LEFT JOIN User u ON r.created_by_user_id = u.id
-        """
-        params = []
-        conditions = []
-        
-        if equipment_id:
-            conditions.append("r.equipment_id = %s")
-            params.append(equipment_id)
-        
-        if search:
-            conditions.append("(r.subject LIKE %s OR e.name LIKE %s)")
-            params.extend([f"%{search}%", f"%{search}%"])
-            
-        if g.user['role'] == 'Company User':
-            conditions.append("r.created_by_user_id = %s")
-            params.append(g.user['id'])
-        elif g.user['role'] == 'Technician':
-             # Get user's team and technician ID
-             cursor.execute("SELECT id, team_id FROM Technician WHERE user_id = %s", (g.user['id'],))
-             tech_rec = cursor.fetchone()
-             if tech_rec:
-                 if tech_rec.get('team_id'):
-                     # Restrict to Team OR Self
-                     clauses = []
-                     clauses.append("r.team_id = %s")
-                     clauses.append("r.technician_id = %s")
-                     conditions.append(f"({' OR '.join(clauses)})")
-                     params.extend([tech_rec['team_id'], tech_rec['id']])
-                 else:
-                     # Teamless -> Show ALL (Global View for new/unassigned techs)
-                     pass
-             else:
-                  conditions.append("1=0") # No tech record found
-
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-        
-        query += " ORDER BY r.created_at DESC"
-        cursor.execute(query, params)
-        requests_data = cursor.fetchall()
-        
-        # Serialization Fix: Ensure dates are strings YYYY-MM-DD
-        for r in requests_data:
-             if r.get('scheduled_date'):
-                 r['scheduled_date'] = str(r['scheduled_date']) # Standardizes to YYYY-MM-DD for date objects
-        
+        limit = parse_limit(request.args.get('limit'))
+        scope_conditions, scope_params = request_scope_conditions()
+
+        def load():
+            search = request.args.get('search')
+            if search:
+                # Resolved through the FULLTEXT / prefix indexes instead of '%term%' scans;
+                # results stay in relevance order
+                ids = search_index.request_ids(cursor, search, scope_conditions, scope_params)
+                if not ids:
+                    return [], None, False
+                cursor.execute(*queries.request_list_query(request.args, scope_conditions, scope_params,
+                                                           limit, ids))
+                return queries.search_page(cursor.fetchall(), ids, request.args, limit, search_index.MAX_RESULTS)
+            query, params = queries.request_list_query(request.args, scope_conditions, scope_params, limit)
+            cursor.execute(query, params)
+            # Dates serialise as YYYY-MM-DD through the JSON provider (wire.py)
+            return queries.split_page(cursor.fetchall(), limit, 'created_at', 'id') + (False,)
+
+        # The visibility scope is part of the key: entries are never shared across scopes
+        requests_data, next_cursor, truncated = qcache.cache.fetch(
+            cursor, REQUEST_READ_TABLES + queries.request_scope_tags(g.identity), 'requests:page', sorted(request.args.items(multi=True)),
+            (tuple(scope_conditions), tuple(scope_params)), load)
         cursor.close()
-        return jsonify(requests_data)
+
+        response = wire.rows_response(requests_data)
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        if truncated:
+            response.headers['X-Search-Truncated'] = '1'
+        return response
 
     if request.method == 'POST':
         if g.user['role'] != 'Company User':
@@ -473,18 +617,42 @@ def api_requests():
         if not data.get('subject') or not data.get('equipment_id') or not data.get('request_type'):
              return jsonify({'error': 'Subject, Equipment, and Request Type are required'}), 400
 
+        db.start_transaction()
         cursor.execute("""
             INSERT INTO MaintenanceRequest (subject, equipment_id, team_id, technician_id, created_by_user_id, request_type, stage, scheduled_date, description)
             VALUES (%s, %s, %s, %s, %s, %s, 'New', %s, %s)
         """, (data['subject'], data['equipment_id'], data.get('team_id'), data.get('technician_id'), g.user['id'], data['request_type'], data.get('scheduled_date'), data.get('description')))
         
         new_id = cursor.lastrowid
+        new_req = {
+            'team_id': data.get('team_id'), 'created_by_user_id': g.user['id'], 'stage': 'New',
+            'request_type': data['request_type'], 'technician_id': data.get('technician_id'),
+            'equipment_id': data['equipment_id']}
+        counters.record_change(cursor, None, new_req)
+        events.publish(cursor, 'created', new_id, card=load_request_card(cursor, new_id))
         db.commit()
+        # A new request is open: open_request_count (and is_scrapped) live on Equipment
+        invalidate_requests(cursor, [(None, new_req)], True)
         cursor.close()
         
         log_action(g.user['id'], 'CREATE_REQUEST', 'MaintenanceRequest', new_id, f"Created {data['subject']}")
         return jsonify({'id': new_id, 'message': 'Request created successfully'}), 201
 
+# Columns locked before a request changes (counters, events and rule checks use them)
+REQUEST_LOCK_COLUMNS = "id, stage, equipment_id, team_id, technician_id, created_by_user_id, request_type, scheduled_date"
+REQUEST_UPDATE_FIELDS = ('stage', 'technician_id', 'duration_hours', 'scheduled_date')
+MAX_BATCH_ITEMS = 500
+
+def request_update_error(current_req, data):
+    # Rules shared by request_ops and the batch endpoint -> (message, status) or None
+    # Strict Scrap Lock: reject any attempt to change stage FROM "Scrap"
+    if current_req and current_req['stage'] == 'Scrap':
+        return 'This request is in Scrap stage and is PERMANENTLY LOCKED. Cannot move.', 403
+    # Role Check: Allow Technician, Deny Admin
+    if data.get('stage') == 'Scrap' and g.user['role'] == 'Admin':
+        return 'Admins cannot scrap equipment. Technician required.', 403
+    return None
+
 @app.route('/api/requests/<int:req_id>', methods=['PUT', 'DELETE'])
 @login_required
 def request_ops(req_id):
@@ -493,24 +661,31 @@ def request_ops(req_id):
     
     if request.method == 'PUT':
         data = request.json
+        fields = []
+        values = []
+        for key in REQUEST_UPDATE_FIELDS:
+            if key in data:
+                fields.append(f"{key} = %s")
+                values.append(data[key])
+
+        if not fields:
+            cursor.close()
+            return jsonify({'message': 'No fields'}), 400
+
         # Strict Scrap Lock: Backend must reject any attempt to change stage FROM "Scrap"
-        # First, check current stage
-        cursor.execute("SELECT stage, equipment_id FROM MaintenanceRequest WHERE id = %s", (req_id,))
+        # First, check current stage (row locked so the counter update below sees the true old values)
+        db.start_transaction()
+        cursor.execute(f"SELECT {REQUEST_LOCK_COLUMNS} FROM MaintenanceRequest WHERE id = %s FOR UPDATE", (req_id,))
         current_req = cursor.fetchone()
         
-        if current_req and current_req['stage'] == 'Scrap':
-             # Request is already in Scrap column. IT IS LOCKED.
-             # User is trying to update it (drag it out). DENY.
-             return jsonify({'error': 'This request is in Scrap stage and is PERMANENTLY LOCKED. Cannot move.'}), 403
+        error = request_update_error(current_req, data)
+        if error:
+            # Release the row lock now rather than when the connection goes back to the pool
+            db.rollback()
+            cursor.close()
+            return jsonify({'error': error[0]}), error[1]
 
         if data.get('stage') == 'Scrap':
-            # Role Check: Allow Technician, Deny Admin
-            if g.user['role'] == 'Admin':
-                return jsonify({'error': 'Admins cannot scrap equipment. Technician required.'}), 403
-            
-            if g.user['role'] != 'Technician':
-                 pass # Technician proceeds.
-
             # Lock confirmed above. Now proceed to set Scrap if not already.
             if current_req: # Re-using result
                 cursor.execute("UPDATE Equipment SET is_scrapped = TRUE WHERE id = %s", (current_req['equipment_id'],))
@@ -518,19 +693,21 @@ def request_ops(req_id):
         # REMOVED: Un-scrap logic. "Equipment must never appear again in repair selection". 
         # Once Scrapped, it stays Scrapped.
 
-        fields = []
-        values = []
-        for key in ['stage', 'technician_id', 'duration_hours', 'scheduled_date']:
-            if key in data:
-                fields.append(f"{key} = %s")
-                values.append(data[key])
-        
-        if not fields:
-            return jsonify({'message': 'No fields'}), 400
-            
         values.append(req_id)
         query = f"UPDATE MaintenanceRequest SET {', '.join(fields)} WHERE id = %s"
         cursor.execute(query, values)
+        changes = []
+        equipment_changed = data.get('stage') == 'Scrap'
+        if current_req:
+            updated = dict(current_req)
+            for key in ('stage', 'technician_id'):
+                if key in data:
+                    updated[key] = data[key]
+            changes.append((current_req, updated))
+            equipment_changed = counters.record_change(cursor, current_req, updated) or equipment_changed
+            events.publish(cursor, 'updated', req_id, old=current_req, card=load_request_card(cursor, req_id))
+        db.commit()
+        invalidate_requests(cursor, changes, equipment_changed)
         cursor.close()
         log_action(g.user['id'], 'UPDATE_REQUEST', 'MaintenanceRequest', req_id, f"Updated fields: {list(data.keys())}")
         return jsonify({'message': 'Updated'})
@@ -539,11 +716,168 @@ def request_ops(req_id):
         if g.user['role'] != 'Admin':
              return jsonify({'error': 'Admin only'}), 403
         
+        db.start_transaction()
+        cursor.execute(f"SELECT {REQUEST_LOCK_COLUMNS} FROM MaintenanceRequest WHERE id = %s FOR UPDATE", (req_id,))
+        current_req = cursor.fetchone()
         cursor.execute("DELETE FROM MaintenanceRequest WHERE id = %s", (req_id,))
+        changes = []
+        equipment_changed = False
+        if current_req:
+            changes.append((current_req, None))
+            equipment_changed = counters.record_change(cursor, current_req, None)
+            events.publish(cursor, 'deleted', req_id, old=current_req)
+        db.commit()
+        invalidate_requests(cursor, changes, equipment_changed)
         cursor.close()
         log_action(g.user['id'], 'DELETE_REQUEST', 'MaintenanceRequest', req_id, "Deleted request")
         return jsonify({'message': 'Deleted'})
 
+@app.route('/api/requests/batch', methods=['POST'])
+@login_required
+def requests_batch():
+    # Many stage/technician/schedule changes and deletes in one transaction:
+    #   {"update": [{"id": 1, "stage": "In Progress"}, ...], "delete": [3, 4]}
+    # Same rules as request_ops; a rejected item fails alone and every item
+    # gets its own result. The writes themselves are set-based statements.
+    data = request.json or {}
+    updates = data.get('update') or []
+    deletes = data.get('delete') or []
+    if not isinstance(updates, list) or not isinstance(deletes, list):
+        raise InvalidParam('update and delete must be lists')
+    if len(updates) + len(deletes) > MAX_BATCH_ITEMS:
+        raise InvalidParam(f'At most {MAX_BATCH_ITEMS} items per batch')
+
+    results = []
+    pending = []  # (result, changes or None for delete)
+    seen = set()
+    items = [('update', item) for item in updates] + [('delete', {'id': item}) for item in deletes]
+    for op, item in items:
+        raw_id = item.get('id') if isinstance(item, dict) else None
+        result = {'id': raw_id, 'op': op, 'status': 200}
+        results.append(result)
+        try:
+            req_id = int(raw_id)
+        except (TypeError, ValueError):
+            result.update(status=400, error='id must be an integer')
+            continue
+        result['id'] = req_id
+        if req_id in seen:
+            result.update(status=400, error='Duplicate id in batch')
+            continue
+        seen.add(req_id)
+        if op == 'delete':
+            if g.user['role'] != 'Admin':
+                result.update(status=403, error='Admin only')
+                continue
+            pending.append((result, None))
+            continue
+        changes = {key: item[key] for key in REQUEST_UPDATE_FIELDS if key in item}
+        if not changes:
+            result.update(status=400, error='No fields')
+        elif 'stage' in changes and changes['stage'] not in REQUEST_STAGES:
+            result.update(status=400, error=f"stage must be one of: {', '.join(REQUEST_STAGES)}")
+        else:
+            pending.append((result, changes))
+
+    if not pending:
+        return jsonify({'results': results, 'updated': 0, 'deleted': 0})
+
+    db = get_db()
+    cursor = db.cursor(dictionary=True)
+    db.start_transaction()
+    # One locking read for the whole batch, in id order so concurrent batches don't deadlock
+    ids = sorted(result['id'] for result, _ in pending)
+    cursor.execute(f"""
+        SELECT {REQUEST_LOCK_COLUMNS} FROM MaintenanceRequest
+        WHERE id IN ({', '.join(['%s'] * len(ids))}) ORDER BY id FOR UPDATE
+    """, ids)
+    current = {row['id']: row for row in cursor.fetchall()}
+
+    to_update = []  # (id, old, changes)
+    to_delete = []  # (id, old)
+    for result, changes in pending:
+        old = current.get(result['id'])
+        if old is None:
+            result.update(status=404, error='Request not found')
+            continue
+        if changes is None:
+            to_delete.append((result['id'], old))
+            continue
+        error = request_update_error(old, changes)
+        if error:
+            result.update(status=error[1], error=error[0])
+            continue
+        to_update.append((result['id'], old, changes))
+
+    if to_update:
+        # Per-row values folded into one UPDATE with a CASE per column
+        sets = []
+        params = []
+        for field in REQUEST_UPDATE_FIELDS:
+            touched = [(req_id, changes[field]) for req_id, _, changes in to_update if field in changes]
+            if not touched:
+                continue
+            sets.append(f"{field} = CASE id {' '.join(['WHEN %s THEN %s'] * len(touched))} ELSE {field} END")
+            for req_id, value in touched:
+                params.extend([req_id, value])
+        update_ids = [req_id for req_id, _, _ in to_update]
+        cursor.execute(f"""
+            UPDATE MaintenanceRequest SET {', '.join(sets)}
+            WHERE id IN ({', '.join(['%s'] * len(update_ids))})
+        """, params + update_ids)
+
+        # Once Scrapped, equipment stays Scrapped
+        scrapped = sorted({old['equipment_id'] for _, old, changes in to_update if changes.get('stage') == 'Scrap'})
+        if scrapped:
+            cursor.execute(f"UPDATE Equipment SET is_scrapped = TRUE WHERE id IN ({', '.join(['%s'] * len(scrapped))})",
+                           scrapped)
+
+    if to_delete:
+        delete_ids = [req_id for req_id, _ in to_delete]
+        cursor.execute(f"DELETE FROM MaintenanceRequest WHERE id IN ({', '.join(['%s'] * len(delete_ids))})",
+                       delete_ids)
+
+    changed = []
+    for _, old, changes in to_update:
+        updated = dict(old)
+        for key in ('stage', 'technician_id'):
+            if key in changes:
+                updated[key] = changes[key]
+        changed.append((old, updated))
+    changed += [(old, None) for _, old in to_delete]
+    equipment_changed = counters.record_changes(cursor, changed)
+
+    cards = load_request_cards(cursor, [req_id for req_id, _, _ in to_update])
+    events.publish_many(cursor,
+                        [('updated', req_id, old, cards.get(req_id)) for req_id, old, _ in to_update] +
+                        [('deleted', req_id, old, None) for req_id, old in to_delete])
+    db.commit()
+    if changed:
+        scrapped = any(changes.get('stage') == 'Scrap' for _, _, changes in to_update)
+        invalidate_requests(cursor, changed, equipment_changed or scrapped)
+    cursor.close()
+
+    log_actions(
+        [(g.user['id'], 'UPDATE_REQUEST', 'MaintenanceRequest', req_id, f"Updated fields: {list(changes.keys())} (batch)")
+         for req_id, _, changes in to_update] +
+        [(g.user['id'], 'DELETE_REQUEST', 'MaintenanceRequest', req_id, "Deleted request (batch)")
+         for req_id, _ in to_delete])
+    return jsonify({'results': results, 'updated': len(to_update), 'deleted': len(to_delete)})
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    # Server-sent events for request changes within the caller's scope.
+    # The stream runs after the view returns, so the pooled connection used
+    # for the login check goes back to the pool right away.
+    scope = events.scope_for(g.identity)
+    try:
+        sub = events.broker.subscribe(scope, request.headers.get('Last-Event-ID'))
+    except events.TooManySubscribers:
+        return jsonify({'error': 'Too many live connections, please retry'}), 503, {'Retry-After': '5'}
+    return Response(events.stream(sub), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # --- New API Endpoints (Admin CRUD) ---
 @app.route('/api/teams', methods=['GET', 'POST'])
 @login_required
@@ -552,16 +886,20 @@ def api_teams():
     cursor = db.cursor(dictionary=True)
     
     if request.method == 'GET':
-        cursor.execute("SELECT * FROM MaintenanceTeam")
-        teams = cursor.fetchall()
+        def build():
+            cursor.execute("SELECT * FROM MaintenanceTeam")
+            return jsonify(cursor.fetchall())
+        # 304 without querying when the client's ETag is current
+        response = table_versions.conditional(cursor, ['MaintenanceTeam'], build)
         cursor.close()
-        return jsonify(teams)
+        return response
     
     if request.method == 'POST':
         if g.user['role'] != 'Admin': return jsonify({'error': 'Admin only'}), 403
         data = request.json
         cursor.execute("INSERT INTO MaintenanceTeam (team_name) VALUES (%s)", (data['name'],))
         new_id = cursor.lastrowid
+        qcache.cache.invalidate(cursor, 'MaintenanceTeam')
         cursor.close()
         return jsonify({'id': new_id, 'message': 'Team created'}), 201
 
@@ -570,9 +908,16 @@ def api_teams():
 @role_required(['Admin'])
 def delete_team(id):
     db = get_db()
-    cursor = db.cursor()
+    cursor = db.cursor(dictionary=True)
+    db.start_transaction()
+    counters.before_team_delete(cursor, id)
     cursor.execute("DELETE FROM MaintenanceTeam WHERE id = %s", (id,))
+    db.commit()
+    # Technicians, equipment and requests lost their team_id through ON DELETE SET NULL
+    qcache.cache.invalidate(cursor, 'MaintenanceTeam', 'Technician', 'Equipment', 'MaintenanceRequest')
     cursor.close()
+    # Members fall back to team_id NULL (teamless view)
+    identity.cache.invalidate_team(id)
     return jsonify({'message': 'Deleted'})
 
 @app.route('/technicians')
@@ -588,17 +933,19 @@ def api_technicians():
     cursor = db.cursor(dictionary=True)
     
     if request.method == 'GET':
-        cursor.execute("SELECT t.*, m.team_name FROM Technician t LEFT JOIN MaintenanceTeam m ON t.team_id = m.id")
-        techs = cursor.fetchall()
+        def build():
+            cursor.execute("SELECT t.*, m.team_name FROM Technician t LEFT JOIN MaintenanceTeam m ON t.team_id = m.id")
+            return jsonify(cursor.fetchall())
+        response = table_versions.conditional(cursor, ['Technician', 'MaintenanceTeam'], build)
         cursor.close()
-        return jsonify(techs)
+        return response
 
     if request.method == 'POST':
         if g.user['role'] != 'Admin': return jsonify({'error': 'Admin only'}), 403
         data = request.json
         
         # 1. Create User Account
-        p_hash = generate_password_hash(data['password'])
+        p_hash = passwords.hash_password(data['password'])
         try:
             cursor.execute("INSERT INTO User (name, email, password_hash, role) VALUES (%s, %s, %s, 'Technician')", 
                            (data['name'], data['email'], p_hash))
@@ -611,7 +958,9 @@ def api_technicians():
                        (data['name'], data.get('team_id'), user_id, 'Technician'))
         new_id = cursor.lastrowid
         db.commit()
+        qcache.cache.invalidate(cursor, 'Technician')
         cursor.close()
+        identity.cache.invalidate(user_id)
         return jsonify({'id': new_id, 'message': 'Technician created'}), 201
 
 @app.route('/api/technicians/<int:id>', methods=['DELETE'])
@@ -619,9 +968,18 @@ def api_technicians():
 @role_required(['Admin'])
 def delete_tech(id):
     db = get_db()
-    cursor = db.cursor()
+    cursor = db.cursor(dictionary=True)
+    cursor.execute("SELECT user_id FROM Technician WHERE id = %s", (id,))
+    tech = cursor.fetchone()
+    db.start_transaction()
+    counters.before_technician_delete(cursor, id)
     cursor.execute("DELETE FROM Technician WHERE id = %s", (id,))
+    db.commit()
+    # Equipment defaults and request assignments were SET NULL by the delete
+    qcache.cache.invalidate(cursor, 'Technician', 'Equipment', 'MaintenanceRequest')
     cursor.close()
+    if tech and tech['user_id']:
+        identity.cache.invalidate(tech['user_id'])
     return jsonify({'message': 'Deleted'})
 
 @app.route('/api/work_centers')
@@ -629,36 +987,166 @@ def delete_tech(id):
 def api_work_centers():
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM WorkCenter")
-    data = cursor.fetchall()
+    def build():
+        cursor.execute("SELECT * FROM WorkCenter")
+        return jsonify(cursor.fetchall())
+    # Future WorkCenter writes must call qcache.cache.invalidate(cursor, 'WorkCenter')
+    response = table_versions.conditional(cursor, ['WorkCenter'], build)
     cursor.close()
-    return jsonify(data)
+    return response
 
 @app.route('/api/categories')
 @login_required
 def api_categories():
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM EquipmentCategory")
-    data = cursor.fetchall()
+    def build():
+        cursor.execute("SELECT * FROM EquipmentCategory")
+        return jsonify(cursor.fetchall())
+    # Future EquipmentCategory writes must call qcache.cache.invalidate(cursor, 'EquipmentCategory')
+    response = table_versions.conditional(cursor, ['EquipmentCategory'], build)
     cursor.close()
-    return jsonify(data)
+    return response
     
 @app.route('/api/logs')
 @login_required
 @role_required(['Admin'])
 def api_logs():
+    limit = parse_limit(request.args.get('limit'), default=50)
+    query, params = queries.log_list_query(request.args, limit)
     db = get_db()
     cursor = db.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT l.*, u.name as user_name, u.role as user_role 
-        FROM AuditLog l 
-        LEFT JOIN User u ON l.user_id = u.id 
-        ORDER BY l.timestamp DESC LIMIT 50
-    """)
-    logs = cursor.fetchall()
+    cursor.execute(query, params)
+    logs, next_cursor = queries.split_page(cursor.fetchall(), limit, 'timestamp', 'id')
     cursor.close()
-    return jsonify(logs)
+
+    response = wire.rows_response(logs)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+# Export column sets; rows go out in index order so nothing is sorted in memory
+EXPORT_QUERIES = {
+    'requests': ("""
+        SELECT r.id, r.subject, r.request_type, r.stage, r.scheduled_date, r.duration_hours, r.created_at,
+               r.equipment_id, e.serial_number as equipment_serial, e.name as equipment_name,
+               r.team_id, m.team_name, r.technician_id, t.name as technician_name,
+               r.created_by_user_id, u.name as created_by_name, r.description
+        FROM MaintenanceRequest r
+        JOIN Equipment e ON r.equipment_id = e.id
+        LEFT JOIN Technician t ON r.technician_id = t.id
+        LEFT JOIN MaintenanceTeam m ON r.team_id = m.id
+        LEFT JOIN User u ON r.created_by_user_id = u.id
+    """, "ORDER BY r.created_at, r.id"),
+    'equipment': ("""
+        SELECT e.id, e.name, e.serial_number, e.equipment_type, e.department, e.location, e.assigned_employee,
+               e.purchase_date, e.warranty_info, e.is_scrapped, e.open_request_count,
+               ec.name as category_name, wc.name as work_center_name, m.team_name, t.name as technician_name,
+               e.description
+        FROM Equipment e
+        LEFT JOIN Technician t ON e.default_technician_id = t.id
+        LEFT JOIN MaintenanceTeam m ON e.maintenance_team_id = m.id
+        LEFT JOIN WorkCenter wc ON e.work_center_id = wc.id
+        LEFT JOIN EquipmentCategory ec ON e.category_id = ec.id
+    """, "ORDER BY e.id"),
+    'logs': ("""
+        SELECT l.id, l.timestamp, l.user_id, u.name as user_name, u.role as user_role,
+               l.action, l.target_type, l.target_id, l.details
+        FROM AuditLog l
+        LEFT JOIN User u ON l.user_id = u.id
+    """, "ORDER BY l.timestamp, l.id"),
+}
+
+@app.route('/api/export/<entity>')
+@login_required
+def api_export(entity):
+    # Streams CSV (default) or NDJSON with the same scoping and filters as the listings
+    if entity not in EXPORT_QUERIES:
+        return jsonify({'error': 'Unknown export'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in export.FORMATS:
+        raise InvalidParam(f"format must be one of: {', '.join(export.FORMATS)}")
+
+    if entity == 'requests':
+        conditions, params = request_filter_conditions(request.args)
+        scope_conditions, scope_params = request_scope_conditions()
+        conditions += scope_conditions
+        params += scope_params
+    elif entity == 'equipment':
+        if g.user['role'] not in ['Company User', 'Admin']:
+            return jsonify({'error': 'Unauthorized'}), 403
+        conditions, params = equipment_filter_conditions(request.args)
+    else:
+        if g.user['role'] != 'Admin':
+            return jsonify({'error': 'Admin only'}), 403
+        conditions, params = log_filter_conditions(request.args)
+
+    select, order = EXPORT_QUERIES[entity]
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    try:
+        export.acquire()
+    except export.ExportBusy:
+        return jsonify({'error': 'Too many exports running, please retry'}), 503, {'Retry-After': '10'}
+
+    response = Response(export.stream(f"{select} {where} {order}", params, fmt), content_type=export.FORMATS[fmt])
+    response.call_on_close(export.release)
+    filename = f"{entity}-{datetime.date.today():%Y%m%d}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    log_action(g.user['id'], 'EXPORT', entity, None, request.query_string.decode()[:255])
+    return response
+
+@app.route('/api/db_pool')
+@login_required
+@role_required(['Admin'])
+def api_db_pool():
+    return jsonify(pool_stats())
+
+@app.route('/api/query_cache')
+@login_required
+@role_required(['Admin'])
+def api_query_cache():
+    return jsonify(qcache.cache.status())
+
+@app.route('/api/event_broker')
+@login_required
+@role_required(['Admin'])
+def api_event_broker():
+    return jsonify(events.broker.status())
+
+@app.route('/api/audit_writer')
+@login_required
+@role_required(['Admin'])
+def api_audit_writer():
+    return jsonify(audit.writer.status())
+
+@app.route('/api/password_pool')
+@login_required
+@role_required(['Admin'])
+def api_password_pool():
+    return jsonify(dict(passwords.pool.status(), **passwords.throttle.status()))
+
+# --- Health checks (no login; for load balancers and serve.py) ---
+@app.route('/healthz')
+def healthz():
+    # Liveness: the worker answers requests
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    # Readiness: a pooled connection can run a query. 503 (pool timeout
+    # included) takes the worker out of rotation until the database is back.
+    start = time.perf_counter()
+    try:
+        cursor = get_db().cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+    except Exception as e:
+        app.logger.warning("Readiness check failed: %s", e)
+        return jsonify({'status': 'unavailable', 'error': type(e).__name__}), 503
+    return jsonify({'status': 'ok', 'db_ms': round((time.perf_counter() - start) * 1000, 2)})
 
 if __name__ == '__main__':
+    # Development server; production runs `python serve.py` (gunicorn)
     app.run(debug=True, port=8000)
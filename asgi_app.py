@@ -0,0 +1,366 @@
+import asyncio
+import contextlib
+import functools
+import os
+
+import aiomysql
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, RedirectResponse, Response
+from starlette.routing import Mount, Route
+from werkzeug.http import http_date, parse_date, parse_etags
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    from starlette.middleware.wsgi import WSGIMiddleware
+
+import counters
+import db
+import identity
+import qcache
+import queries
+import search as search_index
+import storage
+import table_versions
+import wire
+from app import app as flask_app, EQUIPMENT_READ_TABLES, REQUEST_READ_TABLES, STATS_SOURCE
+from pagination import InvalidParam, parse_limit
+
+# Async serving mode for the polled JSON API.
+#
+#   uvicorn asgi_app:app --workers 4          (or: python asgi_app.py)
+#
+# GET /api/requests, /api/stats, /api/equipment, /api/teams, /api/technicians,
+# /api/work_centers, /api/categories and /api/logs run as coroutines on an
+# aiomysql pool: a request waiting on MySQL holds neither a thread nor a
+# connection it isn't using, so one process keeps thousands of polling
+# clients in flight with ASYNC_POOL_SIZE connections. Independent queries of
+# one request run concurrently on separate connections (the counter reads
+# behind /api/stats).
+#
+# Everything else (pages, writes, exports, /api/events) falls through to the
+# Flask app mounted underneath, run in a thread pool, so this serves the
+# whole site. Under heavy live-board or export load route /api/events and
+# /api/export/ to `python serve.py` instead.
+#
+# Same SQL (queries.py, counters.py, search.py), same query cache keys and
+# ETags, and the same session cookie: SECRET_KEY must match the Flask
+# workers'. Role rules mirror the Flask views, including their redirects to
+# /login and /dashboard (the flash message on the latter is not set: these
+# views never write the session). MySQL only; DB_BACKEND=sqlite stays on the
+# Flask app.
+
+POOL_SIZE = int(os.getenv('ASYNC_POOL_SIZE', 20))
+POOL_MIN = int(os.getenv('ASYNC_POOL_MIN', 2))
+# Waiting for a free connection longer than this answers 503, like db.PoolTimeout
+POOL_TIMEOUT = float(os.getenv('ASYNC_POOL_TIMEOUT') or db.POOL_TIMEOUT)
+BIND_HOST = os.getenv('ASYNC_HOST', '0.0.0.0')
+BIND_PORT = int(os.getenv('ASYNC_PORT', 8001))
+WORKERS = int(os.getenv('ASYNC_WORKERS', 1))
+
+
+_pool = None
+
+
+# --- Database ---
+
+@contextlib.asynccontextmanager
+async def connection():
+    try:
+        conn = await asyncio.wait_for(_pool.acquire(), POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise db.PoolTimeout(f"No database connection available after {POOL_TIMEOUT}s")
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+
+async def fetchall(sql, params=None):
+    async with connection() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchall()
+
+
+async def fetch_ids(query):
+    # search.*_ids_query() result -> ids (None: the text can't match anything)
+    if query is None:
+        return []
+    return [row['id'] for row in await fetchall(*query)]
+
+
+async def get_versions(tables):
+    return table_versions.versions_from_rows(tables, await fetchall(*table_versions.versions_query(tables)))
+
+
+async def _cache_call(fn, *args):
+    # The Redis client blocks; keep it off the event loop
+    if isinstance(qcache.cache.backend, qcache.RedisBackend):
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def cached(tags, shape, params, scope, compute):
+    # qcache.cache.fetch() for coroutines: same keys, so Flask and async
+    # workers share entries through a Redis backend
+    if qcache.cache.backend is None:
+        return await compute()
+    key = qcache.cache.make_key(shape, params, scope, await get_versions(tags))
+    value = await _cache_call(qcache.cache.lookup, key)
+    if value is None:
+        value = await compute()
+        await _cache_call(qcache.cache.store, key, value)
+    return value
+
+
+# --- Sessions and roles ---
+
+def read_session(request):
+    # The Flask session cookie, verified exactly as SecureCookieSessionInterface does
+    value = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if not value or serializer is None:
+        return {}
+    try:
+        return serializer.loads(value, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+async def load_identity(user_id):
+    # identity.load_identity() on the async pool, sharing its per-process cache
+    ident = identity.cache.get(user_id)
+    if ident is not None:
+        return ident
+    rows = await fetchall(identity.IDENTITY_QUERY, (user_id,))
+    if not rows:
+        return None
+    ident = identity.identity_from_row(rows[0])
+    identity.cache.put(user_id, ident)
+    return ident
+
+
+def login_required(view):
+    @functools.wraps(view)
+    async def wrapped(request):
+        session = read_session(request)
+        if 'user_id' not in session:
+            return RedirectResponse('/login', 302)
+        ident = await load_identity(session['user_id'])
+        if ident is None:
+            # User deleted since login
+            return RedirectResponse('/login', 302)
+        request.state.session = session
+        request.state.identity = ident
+        return await view(request)
+    return wrapped
+
+
+def role_required(roles):
+    # Like app.role_required: the session's role decides, Admins always pass
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapped(request):
+            role = request.state.session.get('user_role')
+            if role != 'Admin' and role not in roles:
+                return RedirectResponse('/dashboard', 302)
+            return await view(request)
+        return wrapped
+    return decorator
+
+
+# --- Responses ---
+
+def json_response(request, data, status=200, headers=None):
+    # Encoded and compressed like wire.py does for the Flask views
+    body = wire.dumps(data)
+    encoding = None
+    if status == 200:
+        body, encoding = wire.compress(body, request.headers.get('accept-encoding', ''))
+    response = Response(body, status, headers, media_type='application/json')
+    response.headers['Vary'] = 'Accept-Encoding, Cookie'
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def rows_response(request, rows, next_cursor=None, truncated=False):
+    data = wire.columnar(rows) if request.query_params.get('format') == 'columnar' else rows
+    response = json_response(request, data)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    if truncated:
+        response.headers['X-Search-Truncated'] = '1'
+    return response
+
+
+def full_path(request):
+    # werkzeug's request.full_path (the '?' is always there): part of the ETag
+    return f"{request.url.path}?{request.url.query}"
+
+
+async def conditional(request, tables, sql):
+    # table_versions.conditional(): 304 without running `sql` when the client is current
+    versions = await get_versions(tables)
+    etag = table_versions.etag_for(versions, full_path(request))
+    last_modified = table_versions.last_modified_of(versions)
+    if table_versions.is_not_modified(etag, last_modified, parse_etags(request.headers.get('if-none-match')),
+                                      parse_date(request.headers.get('if-modified-since'))):
+        response = Response(status_code=304)
+    else:
+        response = json_response(request, await fetchall(sql))
+    weak = 'Content-Encoding' in response.headers
+    response.headers['ETag'] = f'W/"{etag}"' if weak else f'"{etag}"'
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    response.headers['Cache-Control'] = table_versions.CACHE_CONTROL
+    return response
+
+
+# --- Views (mirror the GET branches in app.py) ---
+
+@login_required
+async def api_requests(request):
+    args = request.query_params
+    limit = parse_limit(args.get('limit'))
+    scope_conditions, scope_params = queries.request_scope_conditions(request.state.identity)
+
+    async def load():
+        if args.get('search'):
+            ids = await fetch_ids(search_index.request_ids_query(args['search'], scope_conditions, scope_params))
+            if not ids:
+                return [], None, False
+            rows = await fetchall(*queries.request_list_query(args, scope_conditions, scope_params, limit, ids))
+            return queries.search_page(rows, ids, args, limit, search_index.MAX_RESULTS)
+        rows = await fetchall(*queries.request_list_query(args, scope_conditions, scope_params, limit))
+        return queries.split_page(rows, limit, 'created_at', 'id') + (False,)
+
+    rows, next_cursor, truncated = await cached(REQUEST_READ_TABLES + queries.request_scope_tags(request.state.identity),
+                                                'requests:page', sorted(args.multi_items()),
+                                                (tuple(scope_conditions), tuple(scope_params)), load)
+    return rows_response(request, rows, next_cursor, truncated)
+
+
+@login_required
+async def api_stats(request):
+    ident = request.state.identity
+    conditions, params = counters.scope_conditions(ident['role'], ident['user']['id'], ident['team_id'])
+    if STATS_SOURCE == 'scan':
+        rows = await fetchall(*counters.scan_query(conditions, params))
+        stats = counters.stats_from_scan(rows[0])
+    else:
+        # Both counter reads at once, each on its own connection
+        rows, critical = await asyncio.gather(*(fetchall(*query)
+                                                for query in counters.stats_queries(conditions, params)))
+        stats = counters.combine_stats(rows, critical[0] if critical else None)
+    return json_response(request, stats)
+
+
+@login_required
+async def api_equipment(request):
+    if request.state.identity['role'] not in ['Company User', 'Admin']:
+        return json_response(request, {'error': 'Unauthorized'}, 403)
+    args = request.query_params
+    limit = parse_limit(args.get('limit'))
+
+    async def load():
+        if args.get('search'):
+            ids = await fetch_ids(search_index.equipment_ids_query(args['search']))
+            if not ids:
+                return [], None, False
+            rows = await fetchall(*queries.equipment_list_query(args, limit, ids))
+            return queries.search_page(rows, ids, args, limit, search_index.MAX_RESULTS)
+        rows = await fetchall(*queries.equipment_list_query(args, limit))
+        return queries.split_page(rows, limit, 'id') + (False,)
+
+    rows, next_cursor, truncated = await cached(EQUIPMENT_READ_TABLES, 'equipment:page', sorted(args.multi_items()),
+                                                None, load)
+    return rows_response(request, rows, next_cursor, truncated)
+
+
+def reference_view(tables, sql):
+    @login_required
+    async def view(request):
+        return await conditional(request, tables, sql)
+    return view
+
+
+@login_required
+@role_required(['Admin'])
+async def api_logs(request):
+    limit = parse_limit(request.query_params.get('limit'), default=50)
+    rows = await fetchall(*queries.log_list_query(request.query_params, limit))
+    rows, next_cursor = queries.split_page(rows, limit, 'timestamp', 'id')
+    return rows_response(request, rows, next_cursor)
+
+
+# --- Errors ---
+
+async def handle_invalid_param(request, exc):
+    return JSONResponse({'error': str(exc)}, 400)
+
+
+async def handle_pool_timeout(request, exc):
+    return JSONResponse({'error': 'Server busy, please retry'}, 503, {'Retry-After': '1'})
+
+
+# --- App ---
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global _pool
+    if not os.getenv('SECRET_KEY'):
+        raise RuntimeError("SECRET_KEY must be set (and match the Flask workers') to read their sessions")
+    if storage.BACKEND != 'mysql':
+        raise RuntimeError("asgi_app.py needs DB_BACKEND=mysql")
+    _pool = await aiomysql.create_pool(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD') or '',
+        db=os.getenv('DB_NAME', 'mechcare_db'),
+        charset='utf8mb4',
+        autocommit=True,
+        minsize=POOL_MIN,
+        maxsize=POOL_SIZE,
+        pool_recycle=int(db.POOL_RECYCLE),
+    )
+    try:
+        yield
+    finally:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+app = Starlette(
+    routes=[
+        Route('/api/requests', api_requests, methods=['GET']),
+        Route('/api/stats', api_stats, methods=['GET']),
+        Route('/api/equipment', api_equipment, methods=['GET']),
+        Route('/api/teams', reference_view(['MaintenanceTeam'], "SELECT * FROM MaintenanceTeam"),
+              methods=['GET']),
+        Route('/api/technicians', reference_view(
+            ['Technician', 'MaintenanceTeam'],
+            "SELECT t.*, m.team_name FROM Technician t LEFT JOIN MaintenanceTeam m ON t.team_id = m.id"),
+              methods=['GET']),
+        Route('/api/work_centers', reference_view(['WorkCenter'], "SELECT * FROM WorkCenter"), methods=['GET']),
+        Route('/api/categories', reference_view(['EquipmentCategory'], "SELECT * FROM EquipmentCategory"),
+              methods=['GET']),
+        Route('/api/logs', api_logs, methods=['GET']),
+        # Other methods on the paths above (a partial match) and every other
+        # path end up here
+        Mount('/', app=WSGIMiddleware(flask_app)),
+    ],
+    exception_handlers={
+        InvalidParam: handle_invalid_param,
+        db.PoolTimeout: handle_pool_timeout,
+    },
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi_app:app', host=BIND_HOST, port=BIND_PORT, workers=WORKERS)
@@ -0,0 +1,199 @@
+import atexit
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+
+import db
+
+# Audit rows are queued in-process and written by a background thread in
+# multi-row INSERTs, so request handlers never wait on AuditLog.
+#
+# AUDIT_MODE=sync writes each row immediately on the request's connection
+# (useful for tests and scripts that read the log right back).
+
+MODE = os.getenv('AUDIT_MODE', 'async')
+QUEUE_SIZE = int(os.getenv('AUDIT_QUEUE_SIZE', 10000))
+BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 200))
+FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1.0))
+# How long a request may block on a full queue before the row is dropped
+ENQUEUE_TIMEOUT = float(os.getenv('AUDIT_ENQUEUE_TIMEOUT', 0.05))
+
+INSERT_SQL = """
+    INSERT INTO AuditLog (user_id, action, target_type, target_id, details, timestamp)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+log = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    def __init__(self, mode=MODE, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, enqueue_timeout=ENQUEUE_TIMEOUT):
+        self.mode = mode
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.stats = {
+            'enqueued': 0,
+            'written': 0,
+            'batches': 0,
+            'blocked': 0,     # submit had to wait for queue space (backpressure)
+            'dropped': 0,     # queue stayed full past enqueue_timeout
+            'failed': 0,      # rows lost to database errors
+        }
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stop = None
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.stats[key] += n
+
+    def _ensure_started(self):
+        # Started lazily and again after a fork: threads don't survive fork()
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, user_id, action, target_type=None, target_id=None, details=None):
+        row = (user_id, action, target_type, target_id, details, datetime.datetime.now())
+        if self.mode == 'sync':
+            self._write_sync(row)
+            return True
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count('blocked')
+            try:
+                self._queue.put(row, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._count('dropped')
+                log.warning("Audit queue full, dropped %s for user %s", action, user_id)
+                return False
+        self._count('enqueued')
+        return True
+
+    def submit_many(self, entries):
+        # entries: (user_id, action, target_type, target_id, details) tuples.
+        # Sync mode writes them as one multi-row INSERT.
+        now = datetime.datetime.now()
+        rows = [tuple(entry) + (now,) for entry in entries]
+        if not rows:
+            return 0
+        if self.mode == 'sync':
+            self._write_sync(*rows)
+            return len(rows)
+        return sum(1 for row in rows if self.submit(*row[:5]))
+
+    def _write_sync(self, *rows):
+        try:
+            cursor = db.get_db().cursor()
+            cursor.executemany(INSERT_SQL, rows)
+            cursor.close()
+            self._count('written', len(rows))
+        except Exception:
+            self._count('failed', len(rows))
+            log.exception("Audit write failed")
+
+    def _drain(self, limit):
+        items = []
+        while len(items) < limit:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write_batch(self, batch):
+        pool = db.get_pool()
+        try:
+            conn = pool.checkout()
+        except Exception:
+            self._count('failed', len(batch))
+            log.exception("Audit writer could not get a connection; %d rows lost", len(batch))
+            return
+        try:
+            cursor = conn.cursor()
+            # mysql-connector rewrites this into a single multi-row INSERT
+            cursor.executemany(INSERT_SQL, batch)
+            cursor.close()
+            self._count('written', len(batch))
+            self._count('batches')
+        except Exception:
+            self._count('failed', len(batch))
+            log.exception("Audit batch insert failed; %d rows lost", len(batch))
+        finally:
+            pool.release(conn)
+
+    def _run(self):
+        q = self._queue
+        stop = self._stop
+        while True:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            # Collect until the batch is full or the flush interval elapses
+            while len(batch) < self.batch_size and not stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    # Short waits so close() is noticed promptly
+                    batch.append(q.get(timeout=min(remaining, 0.1)))
+                except queue.Empty:
+                    continue
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            if stop.is_set():
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            if batch:
+                self._write_batch(batch)
+            elif stop.is_set():
+                break
+
+    def flush(self, timeout=5.0):
+        # Block until everything queued so far has been written (or timeout)
+        if self._pid != os.getpid() or self._queue is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._stats_lock:
+                done = self.stats['written'] + self.stats['failed']
+                pending = self.stats['enqueued'] - done
+            if pending <= 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def close(self, timeout=5.0):
+        if self._pid != os.getpid() or self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._pid = None
+
+    def status(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['mode'] = self.mode
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+        stats['queue_size'] = self.queue_size
+        return stats
+
+
+writer = AuditWriter()
+atexit.register(writer.close)
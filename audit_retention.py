@@ -0,0 +1,121 @@
+import argparse
+import datetime
+import decimal
+import gzip
+import json
+import os
+import sys
+
+from db import connect
+
+# AuditLog retention: rows older than --days are appended to gzip-compressed
+# JSONL segments under --archive-dir and then deleted in chunks, so the live
+# table (and the admin log browser) stays small.
+#
+#   python audit_retention.py --days 365
+#   python audit_retention.py --days 365 --dry-run
+#
+# Each chunk is written and closed as its own gzip member before its rows are
+# deleted, so an interrupted run never loses rows (at worst a chunk is
+# archived twice). Segments are plain `gzip -dc`/`zcat`-readable JSONL.
+
+DEFAULT_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', 365))
+DEFAULT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', 'archive/audit')
+DEFAULT_CHUNK = 5000
+DEFAULT_SEGMENT_ROWS = 500000
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+
+class SegmentWriter:
+    # Rolls over to a new file after `segment_rows` rows
+    def __init__(self, directory, prefix, segment_rows):
+        self.directory = directory
+        self.prefix = prefix
+        self.segment_rows = segment_rows
+        self.path = None
+        self.rows = 0
+        self.paths = []
+
+    def write_chunk(self, rows):
+        if self.path is None or self.rows >= self.segment_rows:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(self.directory, f"{self.prefix}-{rows[0]['id']}.jsonl.gz")
+            self.rows = 0
+            self.paths.append(self.path)
+        # Append mode adds a new gzip member; readers see one continuous stream
+        with gzip.open(self.path, 'at', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, default=_json_default, separators=(',', ':')))
+                f.write('\n')
+        self.rows += len(rows)
+
+
+def archive_and_purge(conn, days=DEFAULT_DAYS, archive_dir=DEFAULT_ARCHIVE_DIR,
+                      chunk=DEFAULT_CHUNK, segment_rows=DEFAULT_SEGMENT_ROWS, dry_run=False, out=print):
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    cursor = conn.cursor(dictionary=True)
+
+    # Upper id bound found through idx_auditlog_timestamp; rows are then walked in PK order
+    cursor.execute("SELECT MAX(id) as max_id, COUNT(*) as n FROM AuditLog WHERE timestamp < %s", (cutoff,))
+    bounds = cursor.fetchone()
+    if not bounds['max_id']:
+        out(f"No audit rows older than {cutoff:%Y-%m-%d}.")
+        cursor.close()
+        return 0
+    if dry_run:
+        out(f"Would archive and delete {bounds['n']} audit rows older than {cutoff:%Y-%m-%d}.")
+        cursor.close()
+        return 0
+
+    writer = SegmentWriter(archive_dir, f"auditlog-{cutoff:%Y%m%d}", segment_rows)
+    last_id = 0
+    total = 0
+    while True:
+        cursor.execute("""
+            SELECT * FROM AuditLog
+            WHERE id > %s AND id <= %s AND timestamp < %s
+            ORDER BY id
+            LIMIT %s
+        """, (last_id, bounds['max_id'], cutoff, chunk))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        writer.write_chunk(rows)
+        ids = [row['id'] for row in rows]
+        cursor.execute(f"DELETE FROM AuditLog WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+        conn.commit()
+        last_id = ids[-1]
+        total += len(rows)
+        out(f"  archived {total}/{bounds['n']} (through id {last_id})")
+
+    cursor.close()
+    out(f"Archived and deleted {total} rows into {', '.join(writer.paths)}")
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Archive and purge old AuditLog rows")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help="keep this many days in the live table")
+    parser.add_argument('--archive-dir', default=DEFAULT_ARCHIVE_DIR)
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help="rows archived/deleted per transaction")
+    parser.add_argument('--segment-rows', type=int, default=DEFAULT_SEGMENT_ROWS, help="rows per archive file")
+    parser.add_argument('--dry-run', action='store_true')
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        archive_and_purge(conn, args.days, args.archive_dir, args.chunk, args.segment_rows, args.dry_run)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
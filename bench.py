@@ -0,0 +1,482 @@
+import argparse
+import datetime
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+import counters
+import gen_dataset
+import qcache
+from db import connect
+
+# End-to-end API benchmarks.
+#
+#   python bench.py --fixture small --save-baseline bench_baseline.json
+#   python bench.py --compare bench_baseline.json
+#   python bench.py --target http --url http://127.0.0.1:8000 --concurrency 16
+#   python bench.py --target http --server-cmd "gunicorn -w 4 -b 127.0.0.1:8000 app:app"
+#
+# Each scenario drives a real route (listings, stats, equipment, calendar,
+# Kanban stage moves, logins) as an Admin, a Technician and a Company User:
+# through the Flask test client in this process (--target client), or over
+# HTTP against a running multi-worker server (--target http, optionally
+# started and stopped by --server-cmd; run it with LOGIN_THROTTLE=0). Reported
+# per scenario and role:
+# p50/p95/p99 latency, throughput, and queries per request (the server's
+# global Questions counter over the run, so nothing else should be using the
+# database meanwhile; background audit writes are included).
+#
+# --fixture loads a fixed gen_dataset.py dataset first (skipped when the
+# database already holds that many requests). --save-baseline writes the
+# results as JSON; --compare fails (exit 1) when a scenario is slower, has
+# lower throughput, or issues more queries than the baseline by more than the
+# configured thresholds.
+
+FIXTURES = {
+    'small': {'users': 200, 'technicians': 40, 'teams': 8, 'equipment': 2000, 'requests': 20000},
+    'medium': {'users': 2000, 'technicians': 200, 'teams': 20, 'equipment': 20000, 'requests': 200000},
+    'large': {'users': 5000, 'technicians': 400, 'teams': 40, 'equipment': 50000, 'requests': 1000000},
+}
+FIXTURE_SEED = 2024
+FIXTURE_ANCHOR = '2025-01-01'
+
+ROLES = ('Admin', 'Technician', 'Company User')
+DEFAULT_PASSWORD = gen_dataset.DEFAULT_PASSWORD
+
+# Relative slowdown / throughput drop that counts as a regression
+LATENCY_THRESHOLD = float(os.getenv('BENCH_LATENCY_THRESHOLD', 0.20))
+THROUGHPUT_THRESHOLD = float(os.getenv('BENCH_THROUGHPUT_THRESHOLD', 0.20))
+# Extra queries per request allowed before failing
+QUERY_THRESHOLD = float(os.getenv('BENCH_QUERY_THRESHOLD', 0.5))
+# Latency changes smaller than this (ms) are noise whatever the ratio
+NOISE_FLOOR_MS = float(os.getenv('BENCH_NOISE_FLOOR_MS', 2.0))
+
+
+# --- Scenarios ---
+# name -> fn(session, ctx, n) issuing one request and returning the status code.
+# ctx holds what the run discovered up front (month, request ids to move).
+
+def _requests_list(s, ctx, n):
+    return s.get('/api/requests', {'limit': 50})
+
+
+def _requests_filtered(s, ctx, n):
+    return s.get('/api/requests', {'stage': 'New', 'request_type': 'Corrective', 'limit': 50})
+
+
+def _stats(s, ctx, n):
+    return s.get('/api/stats')
+
+
+def _equipment_list(s, ctx, n):
+    return s.get('/api/equipment', {'limit': 50})
+
+
+def _equipment_search(s, ctx, n):
+    return s.get('/api/equipment', {'search': 'Pump', 'limit': 50})
+
+
+def _calendar(s, ctx, n):
+    return s.get('/api/calendar', {'month': ctx['month']})
+
+
+def _kanban_move(s, ctx, n):
+    # Each session owns its own ids, so concurrent moves don't queue on row locks
+    ids = ctx['movable'][s.index::ctx['concurrency']]
+    if not ids:
+        return None
+    req_id = ids[n % len(ids)]
+    stage = 'In Progress' if (n // len(ids)) % 2 == 0 else 'New'
+    return s.put(f'/api/requests/{req_id}', {'stage': stage})
+
+
+def _login(s, ctx, n):
+    return s.login()
+
+
+SCENARIOS = {
+    'requests': _requests_list,
+    'requests_filtered': _requests_filtered,
+    'stats': _stats,
+    'equipment': _equipment_list,
+    'equipment_search': _equipment_search,
+    'calendar': _calendar,
+    'kanban_move': _kanban_move,
+    'login': _login,
+}
+
+
+# --- Targets ---
+
+class ClientSession:
+    # One logged-in Flask test client
+    def __init__(self, app, index, email, password):
+        self.client = app.test_client()
+        self.index = index
+        self.email = email
+        self.password = password
+
+    def login(self):
+        return self.client.post('/login', data={'email': self.email, 'password': self.password}).status_code
+
+    def get(self, path, params=None):
+        return self.client.get(path, query_string=params).status_code
+
+    def put(self, path, body):
+        return self.client.put(path, json=body).status_code
+
+
+class HttpSession:
+    # One keep-alive HTTP session with its own cookie
+    def __init__(self, base_url, index, email, password):
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+        self.index = index
+        self.email = email
+        self.password = password
+
+    def login(self):
+        return self.http.post(self.base_url + '/login', data={'email': self.email, 'password': self.password},
+                              allow_redirects=False).status_code
+
+    def get(self, path, params=None):
+        return self.http.get(self.base_url + path, params=params).status_code
+
+    def put(self, path, body):
+        return self.http.put(self.base_url + path, json=body).status_code
+
+
+def _session_factory(args):
+    if args.target == 'http':
+        return lambda index, email: HttpSession(args.url, index, email, args.password)
+    from app import app
+    import passwords
+    # Every session logs in to the same account, over and over
+    passwords.throttle.enabled = False
+    return lambda index, email: ClientSession(app, index, email, args.password)
+
+
+# --- Measurement ---
+
+def percentile(sorted_values, p):
+    # Nearest-rank
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class QuestionCounter:
+    # Statements the server executed (all sessions); our own SHOW counts as one
+    def __init__(self):
+        self.conn = connect()
+
+    def read(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        value = int(cursor.fetchone()[1])
+        cursor.close()
+        return value
+
+    def close(self):
+        self.conn.close()
+
+
+def run_scenario(fn, sessions, ctx, iterations, warmup):
+    for n in range(warmup):
+        fn(sessions[n % len(sessions)], ctx, n)
+
+    latencies = [[] for _ in sessions]
+    errors = [0] * len(sessions)
+    start = threading.Barrier(len(sessions) + 1)
+
+    def worker(i):
+        session = sessions[i]
+        start.wait()
+        for n in range(i, iterations, len(sessions)):
+            t0 = time.perf_counter()
+            status = fn(session, ctx, n // len(sessions))
+            elapsed = time.perf_counter() - t0
+            if status is None:
+                return
+            latencies[i].append(elapsed)
+            if status >= 400:
+                errors[i] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(sessions))]
+    for t in threads:
+        t.start()
+    before = ctx['questions'].read()
+    started = time.perf_counter()
+    start.wait()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    # Let the async audit writer flush so its inserts land in this scenario
+    time.sleep(ctx['settle'])
+    after = ctx['questions'].read()
+
+    samples = sorted(x for per_session in latencies for x in per_session)
+    count = len(samples)
+    if not count:
+        return None
+    return {
+        'requests': count,
+        'errors': sum(errors),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p95_ms': round(percentile(samples, 95) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'throughput_rps': round(count / wall, 1),
+        'queries_per_request': round((after - before - 1) / count, 2),
+    }
+
+
+# --- Fixtures and identities ---
+
+def load_fixture(name, workers):
+    preset = FIXTURES[name]
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM MaintenanceRequest")
+    existing = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    if existing >= preset['requests']:
+        print(f"Fixture '{name}': database already has {existing} requests, not generating.")
+        return
+    argv = ['--seed', str(FIXTURE_SEED), '--anchor', FIXTURE_ANCHOR, '--workers', str(workers)]
+    for key, value in preset.items():
+        argv += [f'--{key}', str(value)]
+    print(f"Fixture '{name}': generating {preset['requests']} requests...")
+    gen_dataset.generate(gen_dataset.parse_args(argv))
+
+
+def discover(roles):
+    # One representative account per role, the month to show, and requests that can be moved
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    accounts = {}
+    if 'Admin' in roles:
+        cursor.execute("SELECT id, email FROM User WHERE role = 'Admin' ORDER BY id LIMIT 1")
+        accounts['Admin'] = cursor.fetchone()
+    if 'Technician' in roles:
+        # The technician whose team has the most requests
+        cursor.execute("""
+            SELECT u.id, u.email, t.id as technician_id, t.team_id
+            FROM Technician t JOIN User u ON u.id = t.user_id
+            WHERE u.role = 'Technician' AND t.team_id IS NOT NULL
+            ORDER BY (SELECT COUNT(*) FROM MaintenanceRequest r WHERE r.team_id = t.team_id) DESC, t.id
+            LIMIT 1
+        """)
+        accounts['Technician'] = cursor.fetchone()
+    if 'Company User' in roles:
+        cursor.execute("""
+            SELECT u.id, u.email FROM User u
+            JOIN MaintenanceRequest r ON r.created_by_user_id = u.id
+            WHERE u.role = 'Company User'
+            GROUP BY u.id, u.email ORDER BY COUNT(*) DESC LIMIT 1
+        """)
+        accounts['Company User'] = cursor.fetchone()
+
+    cursor.execute("SELECT MAX(created_at) as latest FROM MaintenanceRequest")
+    latest = cursor.fetchone()['latest'] or datetime.datetime.now()
+
+    movable = {}
+    for role, account in accounts.items():
+        if account is None:
+            continue
+        if role == 'Company User':
+            where, params = "created_by_user_id = %s", [account['id']]
+        elif role == 'Technician':
+            where, params = "(team_id = %s OR technician_id = %s)", [account['team_id'], account['technician_id']]
+        else:
+            where, params = "1=1", []
+        cursor.execute(f"""
+            SELECT id FROM MaintenanceRequest
+            WHERE {where} AND stage = 'New'
+            ORDER BY id DESC LIMIT 200
+        """, params)
+        movable[role] = [row['id'] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return accounts, latest.strftime('%Y-%m'), movable
+
+
+def restore_stages(ids):
+    # Kanban moves alternate New <-> In Progress on requests that started New
+    if not ids:
+        return
+    conn = connect()
+    cursor = conn.cursor()
+    conn.start_transaction()
+    cursor.execute(f"UPDATE MaintenanceRequest SET stage = 'New' WHERE id IN ({', '.join(['%s'] * len(ids))})",
+                   list(ids))
+    counters.rebuild(cursor)
+    conn.commit()
+    qcache.cache.invalidate(cursor, 'MaintenanceRequest', 'Equipment')
+    cursor.close()
+    conn.close()
+
+
+# --- Baselines ---
+
+def compare(baseline, results, latency_threshold, throughput_threshold, query_threshold, noise_floor):
+    # -> list of regression messages
+    regressions = []
+    for key, current in sorted(results.items()):
+        before = baseline.get('results', {}).get(key)
+        if before is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            limit = before[metric] * (1 + latency_threshold)
+            if current[metric] > limit and current[metric] - before[metric] > noise_floor:
+                regressions.append(f"{key}: {metric} {before[metric]} -> {current[metric]}")
+        if current['throughput_rps'] < before['throughput_rps'] * (1 - throughput_threshold):
+            regressions.append(f"{key}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s")
+        if current['queries_per_request'] > before['queries_per_request'] + query_threshold:
+            regressions.append(f"{key}: queries/request {before['queries_per_request']} -> "
+                               f"{current['queries_per_request']}")
+    return regressions
+
+
+def print_table(results, baseline=None):
+    print(f"{'scenario':<42} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>9} {'q/req':>7} {'err':>5}")
+    for key, r in sorted(results.items()):
+        line = (f"{key:<42} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8} "
+                f"{r['throughput_rps']:>9} {r['queries_per_request']:>7} {r['errors']:>5}")
+        before = (baseline or {}).get('results', {}).get(key)
+        if before and before['p95_ms']:
+            line += f"  (p95 {100 * (r['p95_ms'] / before['p95_ms'] - 1):+.0f}%)"
+        print(line)
+
+
+# --- Server ---
+
+def start_server(cmd, url, timeout=30):
+    proc = subprocess.Popen(shlex.split(cmd))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            requests.get(url.rstrip('/') + '/login', timeout=1)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError(f"server did not answer on {url} within {timeout}s")
+
+
+def run(args):
+    if args.fixture != 'none':
+        load_fixture(args.fixture, args.workers)
+
+    accounts, month, movable = discover(args.roles)
+    make_session = _session_factory(args)
+    ctx = {'month': month, 'concurrency': args.concurrency, 'settle': args.settle, 'questions': QuestionCounter()}
+    results = {}
+    moved = set()
+    try:
+        for role in args.roles:
+            account = accounts.get(role)
+            if account is None:
+                print(f"No {role} account with data; skipping.")
+                continue
+            sessions = [make_session(i, account['email']) for i in range(args.concurrency)]
+            for session in sessions:
+                if session.login() >= 400:
+                    raise RuntimeError(f"login failed for {account['email']}; check --password")
+            ctx['movable'] = movable.get(role, [])
+            for name in args.scenarios:
+                iterations = args.login_iterations if name == 'login' else args.iterations
+                result = run_scenario(SCENARIOS[name], sessions, ctx, iterations, args.warmup)
+                if result is None:
+                    continue
+                if name == 'kanban_move':
+                    moved.update(ctx['movable'])
+                results[f"{args.target}/{role}/{name}"] = result
+                print(f"  {role:<13} {name:<18} p95 {result['p95_ms']} ms, {result['throughput_rps']} req/s")
+    finally:
+        ctx['questions'].close()
+        restore_stages(sorted(moved))
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the MechCare API")
+    parser.add_argument('--target', choices=['client', 'http'], default='client')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help="server for --target http")
+    parser.add_argument('--server-cmd', help="start this server for the run (implies --target http)")
+    parser.add_argument('--fixture', choices=['none'] + list(FIXTURES), default='none')
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1), help="fixture loaders")
+    parser.add_argument('--roles', nargs='+', choices=ROLES, default=list(ROLES))
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help="password of the benchmark accounts")
+    parser.add_argument('--iterations', type=int, default=200, help="requests per scenario and role")
+    parser.add_argument('--login-iterations', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--settle', type=float, default=1.5,
+                        help="seconds to wait for background writes before reading the query counter")
+    parser.add_argument('--save-baseline', metavar='FILE')
+    parser.add_argument('--compare', metavar='FILE')
+    parser.add_argument('--latency-threshold', type=float, default=LATENCY_THRESHOLD)
+    parser.add_argument('--throughput-threshold', type=float, default=THROUGHPUT_THRESHOLD)
+    parser.add_argument('--query-threshold', type=float, default=QUERY_THRESHOLD)
+    parser.add_argument('--noise-floor', type=float, default=NOISE_FLOOR_MS)
+    args = parser.parse_args(argv)
+    if args.server_cmd:
+        args.target = 'http'
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    server = start_server(args.server_cmd, args.url) if args.server_cmd else None
+    try:
+        results = run(args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print()
+    print_table(results, baseline)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({
+                'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+                'target': args.target,
+                'fixture': args.fixture,
+                'concurrency': args.concurrency,
+                'iterations': args.iterations,
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save_baseline}")
+    if baseline is not None:
+        if baseline.get('concurrency') != args.concurrency:
+            print(f"\nNote: baseline ran with concurrency {baseline.get('concurrency')}, this run {args.concurrency}")
+        regressions = compare(baseline, results, args.latency_threshold, args.throughput_threshold,
+                              args.query_threshold, args.noise_floor)
+        if regressions:
+            print("\nRegressions:")
+            for message in regressions:
+                print(f"  {message}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# testing first: it points the app at a per-worker SQLite database on import
+pytest_plugins = ['testing', 'profiler']
@@ -0,0 +1,336 @@
+import sys
+
+# Incrementally maintained dashboard counters.
+#
+# RequestStatCounter holds one row per (team, creator, stage, type, assigned)
+# combination, so reading the dashboard touches a handful of rows no matter how
+# many requests exist. CriticalEquipmentCounter tracks open corrective requests
+# per equipment for the "critical equipment" distinct count, and
+# Equipment.open_request_count backs the equipment listing's open_requests.
+#
+# NULL team/creator ids are stored as 0 so they can be part of the primary key.
+# Every path that inserts, updates or deletes MaintenanceRequest rows (including
+# FK cascades from Equipment/Team/Technician deletes) must report the change
+# here; `python counters.py rebuild` recomputes everything if they ever drift.
+
+OPEN_STAGES = ('New', 'In Progress')
+CLOSED_STAGES = ('Repaired', 'Scrap')
+STAGES = ('New', 'In Progress', 'Repaired', 'Scrap')
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS RequestStatCounter (
+        team_id INT NOT NULL DEFAULT 0,
+        created_by_user_id INT NOT NULL DEFAULT 0,
+        stage ENUM('New', 'In Progress', 'Repaired', 'Scrap') NOT NULL,
+        request_type ENUM('Corrective', 'Preventive') NOT NULL,
+        has_technician BOOLEAN NOT NULL,
+        request_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (team_id, created_by_user_id, stage, request_type, has_technician),
+        INDEX idx_stat_counter_creator (created_by_user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS CriticalEquipmentCounter (
+        team_id INT NOT NULL DEFAULT 0,
+        created_by_user_id INT NOT NULL DEFAULT 0,
+        equipment_id INT NOT NULL,
+        request_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (team_id, created_by_user_id, equipment_id),
+        INDEX idx_critical_counter_creator (created_by_user_id),
+        INDEX idx_critical_counter_equipment (equipment_id)
+    )
+    """,
+]
+
+
+def _id(value):
+    return int(value) if value not in (None, '') else 0
+
+
+def _stat_key(row):
+    return (_id(row.get('team_id')), _id(row.get('created_by_user_id')), row['stage'],
+            row['request_type'], 1 if row.get('technician_id') not in (None, '') else 0)
+
+
+def _critical_key(row):
+    if row['request_type'] == 'Corrective' and row['stage'] in OPEN_STAGES:
+        return (_id(row.get('team_id')), _id(row.get('created_by_user_id')), int(row['equipment_id']))
+    return None
+
+
+def _is_open(row):
+    return row['stage'] not in CLOSED_STAGES
+
+
+def _apply(cursor, stat_deltas, critical_deltas, open_deltas):
+    # -> True when Equipment.open_request_count changed
+    # Rows are written in key order: two transactions touching the same counter
+    # rows (New -> In Progress and back) then lock them in the same order
+    # instead of deadlocking
+    stat_rows = [key + (n,) for key, n in sorted(stat_deltas.items()) if n]
+    if stat_rows:
+        cursor.executemany("""
+            INSERT INTO RequestStatCounter (team_id, created_by_user_id, stage, request_type, has_technician, request_count)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE request_count = request_count + VALUES(request_count)
+        """, stat_rows)
+
+    critical_rows = [key + (n,) for key, n in sorted(critical_deltas.items()) if n]
+    if critical_rows:
+        cursor.executemany("""
+            INSERT INTO CriticalEquipmentCounter (team_id, created_by_user_id, equipment_id, request_count)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE request_count = request_count + VALUES(request_count)
+        """, critical_rows)
+        # Keep the critical table limited to currently open work
+        drained = [key for key, n in sorted(critical_deltas.items()) if n < 0]
+        if drained:
+            cursor.executemany("""
+                DELETE FROM CriticalEquipmentCounter
+                WHERE team_id = %s AND created_by_user_id = %s AND equipment_id = %s AND request_count <= 0
+            """, drained)
+
+    open_rows = [(n, equipment_id) for equipment_id, n in sorted(open_deltas.items()) if n]
+    if open_rows:
+        cursor.executemany("UPDATE Equipment SET open_request_count = open_request_count + %s WHERE id = %s",
+                           open_rows)
+    return bool(open_rows)
+
+
+def record_changes(cursor, changes):
+    # changes: iterable of (old_row, new_row); either side may be None for
+    # create/delete. Rows need team_id, created_by_user_id, stage,
+    # request_type, technician_id and equipment_id.
+    # -> True when an Equipment row changed (open_request_count)
+    stat_deltas = {}
+    critical_deltas = {}
+    open_deltas = {}
+    for old, new in changes:
+        for row, sign in ((old, -1), (new, 1)):
+            if row is None:
+                continue
+            key = _stat_key(row)
+            stat_deltas[key] = stat_deltas.get(key, 0) + sign
+            key = _critical_key(row)
+            if key:
+                critical_deltas[key] = critical_deltas.get(key, 0) + sign
+            if _is_open(row):
+                key = int(row['equipment_id'])
+                open_deltas[key] = open_deltas.get(key, 0) + sign
+    return _apply(cursor, stat_deltas, critical_deltas, open_deltas)
+
+
+def record_change(cursor, old, new):
+    return record_changes(cursor, [(old, new)])
+
+
+def _grouped_rows(cursor, where, params):
+    cursor.execute(f"""
+        SELECT team_id, created_by_user_id, stage, request_type, technician_id, equipment_id, COUNT(*) as n
+        FROM MaintenanceRequest
+        WHERE {where}
+        GROUP BY team_id, created_by_user_id, stage, request_type, technician_id, equipment_id
+    """, params)
+    return [dict(zip(cursor.column_names, row)) if not isinstance(row, dict) else row
+            for row in cursor.fetchall()]
+
+
+def _record_grouped(cursor, groups, transform):
+    stat_deltas = {}
+    critical_deltas = {}
+    open_deltas = {}
+    for row in groups:
+        new = transform(dict(row))
+        for r, sign in ((row, -1), (new, 1)):
+            if r is None:
+                continue
+            key = _stat_key(r)
+            stat_deltas[key] = stat_deltas.get(key, 0) + sign * r['n']
+            key = _critical_key(r)
+            if key:
+                critical_deltas[key] = critical_deltas.get(key, 0) + sign * r['n']
+            if _is_open(r):
+                key = int(r['equipment_id'])
+                open_deltas[key] = open_deltas.get(key, 0) + sign * r['n']
+    _apply(cursor, stat_deltas, critical_deltas, open_deltas)
+
+
+# --- FK cascade helpers: call BEFORE the parent row is deleted ---
+def before_equipment_delete(cursor, equipment_id):
+    # ON DELETE CASCADE removes the requests
+    groups = _grouped_rows(cursor, "equipment_id = %s", (equipment_id,))
+    _record_grouped(cursor, groups, lambda row: None)
+
+
+def before_team_delete(cursor, team_id):
+    # ON DELETE SET NULL moves the requests to "no team"
+    groups = _grouped_rows(cursor, "team_id = %s", (team_id,))
+    _record_grouped(cursor, groups, lambda row: dict(row, team_id=None))
+
+
+def before_technician_delete(cursor, technician_id):
+    # ON DELETE SET NULL unassigns the requests
+    groups = _grouped_rows(cursor, "technician_id = %s", (technician_id,))
+    _record_grouped(cursor, groups, lambda row: dict(row, technician_id=None))
+
+
+# --- Reads ---
+def scope_conditions(role, user_id, team_id):
+    # Dashboard scope: technicians see their team, company users their own requests
+    if role == 'Technician':
+        if team_id:
+            return ["team_id = %s"], [team_id]
+        return ["1=0"], []
+    if role == 'Company User':
+        return ["created_by_user_id = %s"], [user_id]
+    return [], []
+
+
+def stats_queries(conditions, params):
+    # The two independent counter reads -> [(sql, params), (sql, params)];
+    # the async API (asgi_app.py) runs them concurrently
+    where = " AND ".join(conditions) if conditions else "1=1"
+    return [
+        (f"""
+            SELECT stage, request_type, has_technician, SUM(request_count) as n
+            FROM RequestStatCounter
+            WHERE {where}
+            GROUP BY stage, request_type, has_technician
+        """, params),
+        (f"""
+            SELECT COUNT(DISTINCT equipment_id) as count
+            FROM CriticalEquipmentCounter
+            WHERE request_count > 0 AND {where}
+        """, params),
+    ]
+
+
+def read_stats(cursor, conditions, params):
+    rows_query, critical_query = stats_queries(conditions, params)
+    cursor.execute(*rows_query)
+    rows = cursor.fetchall()
+    cursor.execute(*critical_query)
+    critical = cursor.fetchone()
+    return combine_stats(rows, critical)
+
+
+def combine_stats(rows, critical):
+    # stats_queries results -> the /api/stats body
+    by_stage = {}
+    technician_load = 0
+    for row in rows:
+        n = int(row['n'] or 0)
+        by_stage[row['stage']] = by_stage.get(row['stage'], 0) + n
+        if row['stage'] == 'In Progress' and row['has_technician']:
+            technician_load += n
+    return {
+        'critical_equipment': critical['count'] if critical else 0,
+        'technician_load': technician_load,
+        'active_requests': sum(by_stage.get(s, 0) for s in OPEN_STAGES),
+        'by_stage': [{'stage': s, 'count': by_stage[s]} for s in STAGES if by_stage.get(s)],
+    }
+
+
+def scan_query(conditions, params):
+    where = " AND ".join(conditions) if conditions else "1=1"
+    return f"""
+        SELECT
+            COUNT(DISTINCT CASE WHEN request_type = 'Corrective' AND stage IN ('New', 'In Progress')
+                                THEN equipment_id END) as critical_equipment,
+            COALESCE(SUM(stage = 'In Progress' AND technician_id IS NOT NULL), 0) as technician_load,
+            COALESCE(SUM(stage = 'New'), 0) as stage_new,
+            COALESCE(SUM(stage = 'In Progress'), 0) as stage_in_progress,
+            COALESCE(SUM(stage = 'Repaired'), 0) as stage_repaired,
+            COALESCE(SUM(stage = 'Scrap'), 0) as stage_scrap
+        FROM MaintenanceRequest
+        WHERE {where}
+    """, params
+
+
+def compute_stats(cursor, conditions, params):
+    # Single scan of MaintenanceRequest; used by `check` and as the fallback
+    cursor.execute(*scan_query(conditions, params))
+    return stats_from_scan(cursor.fetchone())
+
+
+def stats_from_scan(row):
+    by_stage = dict(zip(STAGES, (int(row['stage_new']), int(row['stage_in_progress']),
+                                 int(row['stage_repaired']), int(row['stage_scrap']))))
+    return {
+        'critical_equipment': row['critical_equipment'],
+        'technician_load': int(row['technician_load']),
+        'active_requests': by_stage['New'] + by_stage['In Progress'],
+        'by_stage': [{'stage': s, 'count': by_stage[s]} for s in STAGES if by_stage[s]],
+    }
+
+
+# --- Maintenance ---
+def ensure_tables(cursor):
+    for stmt in SCHEMA:
+        cursor.execute(stmt)
+
+
+def rebuild(cursor):
+    ensure_tables(cursor)
+    cursor.execute("DELETE FROM RequestStatCounter")
+    cursor.execute("""
+        INSERT INTO RequestStatCounter (team_id, created_by_user_id, stage, request_type, has_technician, request_count)
+        SELECT COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), stage, request_type,
+               technician_id IS NOT NULL, COUNT(*)
+        FROM MaintenanceRequest
+        GROUP BY COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), stage, request_type, technician_id IS NOT NULL
+    """)
+    cursor.execute("DELETE FROM CriticalEquipmentCounter")
+    cursor.execute("""
+        INSERT INTO CriticalEquipmentCounter (team_id, created_by_user_id, equipment_id, request_count)
+        SELECT COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), equipment_id, COUNT(*)
+        FROM MaintenanceRequest
+        WHERE request_type = 'Corrective' AND stage IN ('New', 'In Progress')
+        GROUP BY COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), equipment_id
+    """)
+    cursor.execute("""
+        UPDATE Equipment e
+        LEFT JOIN (
+            SELECT equipment_id, COUNT(*) as n
+            FROM MaintenanceRequest
+            WHERE stage NOT IN ('Repaired', 'Scrap')
+            GROUP BY equipment_id
+        ) open_requests ON open_requests.equipment_id = e.id
+        SET e.open_request_count = COALESCE(open_requests.n, 0)
+    """)
+
+
+def check(cursor):
+    # Compare counters against a fresh scan for the global scope
+    expected = compute_stats(cursor, [], [])
+    actual = read_stats(cursor, [], [])
+    return expected == actual, expected, actual
+
+
+def main(argv):
+    from db import connect
+    if len(argv) < 2 or argv[1] not in ('rebuild', 'check'):
+        print("Usage: python counters.py [rebuild|check]")
+        return 1
+    conn = connect()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if argv[1] == 'rebuild':
+            conn.start_transaction()
+            rebuild(cursor)
+            conn.commit()
+            print("Dashboard counters rebuilt.")
+            return 0
+        ok, expected, actual = check(cursor)
+        print(f"Expected: {expected}")
+        print(f"Counters: {actual}")
+        print("Counters are in sync." if ok else "Counters have drifted; run 'python counters.py rebuild'.")
+        return 0 if ok else 2
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -1,25 +1,212 @@
-import mysql.connector
 from flask import g
 import os
+import threading
+import time
+from collections import deque
 from dotenv import load_dotenv
 
+import storage
+
 load_dotenv()
 
+# Pool tuning (see .env.example)
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+POOL_MAX_OVERFLOW = int(os.getenv('DB_POOL_MAX_OVERFLOW', 5))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+POOL_RECYCLE = float(os.getenv('DB_POOL_RECYCLE', 1800))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def connect():
+    # MySQL or SQLite, per DB_BACKEND (see storage.py)
+    return storage.get_driver().connect()
+
+
+class ConnectionPool:
+    # Keeps up to `size` idle connections around and allows `max_overflow` extra
+    # ones during bursts. Checkout blocks for at most `timeout` seconds once
+    # size + max_overflow connections are in use.
+    def __init__(self, size=POOL_SIZE, max_overflow=POOL_MAX_OVERFLOW,
+                 timeout=POOL_TIMEOUT, recycle=POOL_RECYCLE, factory=connect):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.recycle = recycle
+        self.factory = factory
+        self._idle = deque()        # (conn, created_at)
+        self._created = {}          # id(conn) -> created_at, for checked-out conns
+        self._lock = threading.Condition()
+        self._total = 0
+        self.stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'connects': 0,
+            'recycled': 0,
+            'broken': 0,
+        }
+
+    def _is_healthy(self, conn, created_at):
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            self.stats['recycled'] += 1
+            return False
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            self.stats['broken'] += 1
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _new_connection(self):
+        try:
+            conn = self.factory()
+        except Exception:
+            with self._lock:
+                self._total -= 1
+                self._lock.notify()
+            raise
+        created_at = time.monotonic()
+        with self._lock:
+            self.stats['connects'] += 1
+            self._created[id(conn)] = created_at
+        return conn
+
+    def checkout(self):
+        start = None
+        with self._lock:
+            while True:
+                if self._idle:
+                    conn, created_at = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    self.stats['checkouts'] += 1
+                    conn = None
+                    break
+                if start is None:
+                    start = time.monotonic()
+                    self.stats['waits'] += 1
+                remaining = self.timeout - (time.monotonic() - start)
+                if remaining <= 0 or not self._lock.wait(remaining):
+                    if not self._idle and self._total >= self.size + self.max_overflow:
+                        self.stats['timeouts'] += 1
+                        self.stats['wait_time'] += time.monotonic() - start
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout}s "
+                            f"({self._total} in use)")
+            if start is not None:
+                self.stats['wait_time'] += time.monotonic() - start
+
+        if conn is None:
+            return self._new_connection()
+
+        # Ping outside the lock; replace stale or dead connections transparently
+        if not self._is_healthy(conn, created_at):
+            self._discard(conn)
+            with self._lock:
+                self.stats['checkouts'] += 1
+            return self._new_connection()
+
+        with self._lock:
+            self.stats['checkouts'] += 1
+            self._created[id(conn)] = created_at
+        return conn
+
+    def release(self, conn):
+        with self._lock:
+            created_at = self._created.pop(id(conn), None)
+        if created_at is None:
+            return
+
+        keep = True
+        try:
+            # Drop anything a view left half-done so the next borrower starts clean
+            if conn.in_transaction:
+                conn.rollback()
+            conn.autocommit = True
+        except Exception:
+            keep = False
+
+        with self._lock:
+            if keep and len(self._idle) < self.size:
+                self._idle.append((conn, created_at))
+                conn = None
+            else:
+                self._total -= 1
+            self._lock.notify()
+        if conn is not None:
+            self._discard(conn)
+
+    def dispose(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats,
+                        size=self.size,
+                        max_overflow=self.max_overflow,
+                        in_use=self._total - len(self._idle),
+                        idle=len(self._idle),
+                        total=self._total)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # Created lazily so importing the app never opens a connection
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def reset_pool():
+    # Drop the pool (and its idle connections); the next get_pool() builds a new
+    # one. Used after switching storage drivers and in freshly forked workers.
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.dispose()
+
+
+def pool_stats():
+    return get_pool().status()
+
+
+# Optional fn(conn) -> proxy applied to the request's connection (see instrumentation.py)
+connection_wrapper = None
+
+
 def get_db():
     if 'db' not in g:
-        g.db = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME', 'mechcare_db')
-        )
-        g.db.autocommit = True
+        conn = get_pool().checkout()
+        g.db = connection_wrapper(conn) if connection_wrapper is not None else conn
     return g.db
 
 def close_db(e=None):
     db = g.pop('db', None)
     if db is not None:
-        db.close()
+        get_pool().release(getattr(db, '__wrapped__', db))
 
 def init_db(app):
     app.teardown_appcontext(close_db)
@@ -0,0 +1,374 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from flask import json as flask_json
+
+import db
+
+# Live request changes for the Kanban board and calendar (/api/events, SSE).
+#
+# Write paths call publish() inside their transaction, which appends a row to
+# RequestEvent. Each worker process runs one broker thread that polls the
+# table by id and fans new events out to its local subscribers, filtered by
+# the subscriber's visibility scope. A subscriber that falls too far behind is
+# told to resync (reload) instead of being buffered without bound.
+#
+# Ids are handed out when the INSERT runs, not at commit, so the poll can see
+# a later id before an earlier one commits. Ids skipped that way are tracked
+# as gaps and looked up on every poll until they show up. A gap still open
+# after EVENTS_GAP_TIMEOUT seconds (rolled back, or a very slow commit) makes
+# every subscriber resync, since the change can no longer be placed.
+#
+# Each open stream holds a server thread. Under serve.py the per-worker cap is
+# lowered to SERVER_THREADS - EVENTS_RESERVED_THREADS (see subscriber_cap), so
+# live boards can never take the threads every other route needs.
+
+POLL_INTERVAL = float(os.getenv('EVENTS_POLL_INTERVAL', 0.5))
+HEARTBEAT = float(os.getenv('EVENTS_HEARTBEAT', 15))
+RETENTION_MINUTES = int(os.getenv('EVENTS_RETENTION_MINUTES', 60))
+MAX_SUBSCRIBERS = int(os.getenv('EVENTS_MAX_SUBSCRIBERS', 200))
+# Threads per worker kept free of streams for ordinary requests
+RESERVED_THREADS = int(os.getenv('EVENTS_RESERVED_THREADS', 4))
+SUBSCRIBER_QUEUE = 256
+REPLAY_BUFFER = 1000
+BATCH = 500
+# Seconds an id below the high-water mark may stay missing before subscribers resync
+GAP_TIMEOUT = float(os.getenv('EVENTS_GAP_TIMEOUT', 30))
+# More open gaps than this (an id jump) resyncs at once instead of tracking them
+MAX_GAPS = 1000
+PRUNE_EVERY = 60.0
+
+log = logging.getLogger(__name__)
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+# Queued to wake a stream that should check its resync flag
+_WAKE = (None, None)
+
+
+def subscriber_cap(threads, reserved=RESERVED_THREADS, maximum=MAX_SUBSCRIBERS):
+    # Streams one worker with `threads` request threads may hold
+    return max(0, min(maximum, threads - reserved))
+
+
+def _event_row(action, request_id, old, card):
+    new = card or {}
+    old = old or {}
+    previous = None
+    if old:
+        previous = {key: old.get(key) for key in ('scheduled_date', 'stage', 'request_type')}
+    payload = flask_json.dumps({'request': card, 'previous': previous})
+    return (request_id, action, new.get('team_id'), new.get('technician_id'),
+            new.get('created_by_user_id') or old.get('created_by_user_id'),
+            old.get('team_id'), old.get('technician_id'), payload)
+
+
+def publish(cursor, action, request_id, old=None, card=None):
+    # action: created / updated / deleted. `old` is the locked row before the
+    # change, `card` the row as the listings return it afterwards.
+    publish_many(cursor, [(action, request_id, old, card)])
+
+
+def publish_many(cursor, changes):
+    # changes: (action, request_id, old, card) tuples, written as one multi-row INSERT
+    rows = [_event_row(*change) for change in changes]
+    if not rows:
+        return
+    cursor.executemany("""
+        INSERT INTO RequestEvent (request_id, action, team_id, technician_id, created_by_user_id,
+                                  old_team_id, old_technician_id, payload)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, rows)
+
+
+def scope_for(identity):
+    return {
+        'role': identity['role'],
+        'user_id': identity['user']['id'],
+        'team_id': identity['team_id'],
+        'technician_id': identity['technician_id'],
+    }
+
+
+def _visible(scope, team_id, technician_id, created_by_user_id):
+    # Mirrors request_scope_conditions() in app.py
+    if scope['role'] == 'Company User':
+        return created_by_user_id == scope['user_id']
+    if scope['role'] == 'Technician':
+        if not scope['technician_id']:
+            return False
+        if scope['team_id']:
+            return team_id == scope['team_id'] or technician_id == scope['technician_id']
+    return True
+
+
+def message_for(scope, event):
+    # -> dict for the client, or None when the change is outside the scope
+    if event['action'] != 'deleted' and _visible(
+            scope, event['team_id'], event['technician_id'], event['created_by_user_id']):
+        action = event['action']
+    elif event['action'] != 'created' and _visible(
+            scope, event['old_team_id'], event['old_technician_id'], event['created_by_user_id']):
+        # Deleted, or moved out of this subscriber's view
+        action = 'removed'
+    else:
+        return None
+    return {
+        'action': action,
+        'request_id': event['request_id'],
+        'request': event['payload']['request'] if action != 'removed' else None,
+        'previous': event['payload']['previous'],
+    }
+
+
+class Subscription:
+    def __init__(self, scope):
+        self.scope = scope
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, event_id, message):
+        try:
+            self.queue.put_nowait((event_id, message))
+            return True
+        except queue.Full:
+            self.overflowed = True
+            return False
+
+    def resync(self):
+        self.overflowed = True
+        try:
+            self.queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass
+
+    def close(self):
+        # Wakes the stream so it ends (the client reconnects with Last-Event-ID)
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class EventBroker:
+    def __init__(self, poll_interval=POLL_INTERVAL, max_subscribers=MAX_SUBSCRIBERS, gap_timeout=GAP_TIMEOUT):
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.gap_timeout = gap_timeout
+        self.stats = {'polls': 0, 'events': 0, 'delivered': 0, 'overflows': 0, 'errors': 0,
+                      'late_events': 0, 'gap_resyncs': 0}
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = deque(maxlen=REPLAY_BUFFER)
+        self._gaps = {}        # missing id -> monotonic time it was first skipped
+        self._lost_below = 0   # ids up to here may never have been delivered
+        self._last_id = None
+        self._last_prune = 0.0
+        self._pid = None
+        self._thread = None
+
+    def _ensure_started(self):
+        # Threads don't survive fork(); restart in each worker
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._subscribers = set()
+            self._recent.clear()
+            self._gaps = {}
+            self._last_id = None
+            self._thread = threading.Thread(target=self._run, name='event-broker', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def subscribe(self, scope, last_event_id=None):
+        self._ensure_started()
+        sub = Subscription(scope)
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                raise TooManySubscribers()
+            self._subscribers.add(sub)
+            if last_event_id:
+                self._replay(sub, last_event_id)
+        return sub
+
+    def _replay(self, sub, last_event_id):
+        # Reconnecting EventSource sends Last-Event-ID; fill the gap from memory.
+        # Events are replayed in delivery order, which is not id order when one
+        # committed late.
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return
+        position = next((i for i, event in enumerate(self._recent) if event['id'] == last_event_id), None)
+        if position is None or last_event_id < self._lost_below:
+            sub.overflowed = True  # gap not covered by the buffer, or an event was lost since
+            return
+        for event in list(self._recent)[position + 1:]:
+            message = message_for(sub.scope, event)
+            if message is not None:
+                sub.offer(event['id'], message)
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def close(self):
+        # Worker shutting down: end every open stream instead of holding the
+        # worker until its graceful timeout. Called from a signal handler, so
+        # no lock (list() of a set is atomic under the GIL).
+        for sub in list(self._subscribers):
+            sub.close()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                idle = not self._subscribers
+            if idle:
+                # Nobody listening: stop tracking, pick up at the head on the next subscriber
+                self._last_id = None
+                continue
+            pool = db.get_pool()
+            try:
+                conn = pool.checkout()
+            except Exception:
+                self.stats['errors'] += 1
+                log.exception("Event broker could not get a connection")
+                continue
+            try:
+                self._poll(conn)
+                if time.monotonic() - self._last_prune > PRUNE_EVERY:
+                    self._prune(conn)
+            except Exception:
+                self.stats['errors'] += 1
+                log.exception("Event broker poll failed")
+            finally:
+                pool.release(conn)
+
+    def _poll(self, conn):
+        cursor = conn.cursor(dictionary=True)
+        try:
+            if self._last_id is None:
+                cursor.execute("SELECT COALESCE(MAX(id), 0) as max_id FROM RequestEvent")
+                self._last_id = cursor.fetchone()['max_id']
+                self._gaps = {}
+                return
+            gaps = sorted(self._gaps)
+            where = "id > %s"
+            if gaps:
+                where += f" OR id IN ({', '.join(['%s'] * len(gaps))})"
+            cursor.execute(f"SELECT * FROM RequestEvent WHERE {where} ORDER BY id LIMIT %s",
+                           [self._last_id] + gaps + [BATCH])
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+        self.stats['polls'] += 1
+
+        now = time.monotonic()
+        lost = False
+        for row in rows:
+            if row['id'] > self._last_id:
+                skipped = row['id'] - self._last_id - 1
+                if skipped > MAX_GAPS:
+                    lost = True
+                else:
+                    self._gaps.update((i, now) for i in range(self._last_id + 1, row['id']))
+                self._last_id = row['id']
+            elif self._gaps.pop(row['id'], None) is not None:
+                self.stats['late_events'] += 1
+            else:
+                continue
+            row['payload'] = json.loads(row['payload']) if row['payload'] else {'request': None, 'previous': None}
+            self._dispatch(row)
+
+        expired = [i for i, since in self._gaps.items() if now - since > self.gap_timeout]
+        for i in expired:
+            del self._gaps[i]
+        if len(self._gaps) > MAX_GAPS:
+            expired = list(self._gaps)
+            self._gaps = {}
+        if expired or lost:
+            self._resync_all(self._last_id if lost else max(expired))
+
+    def _resync_all(self, lost_below):
+        # Some event may never be delivered: every subscriber reloads
+        self.stats['gap_resyncs'] += 1
+        with self._lock:
+            self._lost_below = max(self._lost_below, lost_below)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            sub.resync()
+
+    def _dispatch(self, event):
+        self.stats['events'] += 1
+        with self._lock:
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            message = message_for(sub.scope, event)
+            if message is None:
+                continue
+            if sub.offer(event['id'], message):
+                self.stats['delivered'] += 1
+            else:
+                self.stats['overflows'] += 1
+
+    def _prune(self, conn):
+        self._last_prune = time.monotonic()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM RequestEvent WHERE created_at < NOW() - INTERVAL %s MINUTE LIMIT 5000",
+                       (RETENTION_MINUTES,))
+        cursor.close()
+
+    def status(self):
+        stats = dict(self.stats)
+        with self._lock:
+            stats['subscribers'] = len(self._subscribers) if self._pid == os.getpid() else 0
+        stats['last_event_id'] = self._last_id
+        stats['open_gaps'] = len(self._gaps)
+        return stats
+
+
+def _format(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream(sub, heartbeat=HEARTBEAT):
+    # Generator for the SSE response body. Holds no database connection.
+    try:
+        yield "retry: 3000\n\n"
+        while not sub.closed:
+            if sub.overflowed:
+                sub.overflowed = False
+                while not sub.queue.empty():
+                    sub.queue.get_nowait()
+                yield "event: resync\ndata: {}\n\n"
+            try:
+                item = sub.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            if item is None:
+                break
+            if item is _WAKE:
+                continue
+            event_id, message = item
+            yield _format(event_id, 'request', message)
+    finally:
+        broker.unsubscribe(sub)
+
+
+broker = EventBroker()
@@ -0,0 +1,115 @@
+import csv
+import datetime
+import decimal
+import io
+import json
+import logging
+import os
+import threading
+
+import db
+
+# Streaming exports (/api/export/<entity>).
+#
+# The query runs on its own connection with an unbuffered cursor and rows are
+# pulled in small batches, encoded and sent as they arrive, so memory stays
+# flat however large the result. Exports don't borrow from the request pool
+# (a slow download would pin a pooled connection for minutes); instead at most
+# EXPORT_MAX_CONCURRENT run per worker process.
+
+BATCH_ROWS = 500
+MAX_CONCURRENT = int(os.getenv('EXPORT_MAX_CONCURRENT', 2))
+# Server-side wait for a slow client reading an unbuffered result, in seconds
+NET_WRITE_TIMEOUT = int(os.getenv('EXPORT_NET_WRITE_TIMEOUT', 600))
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+log = logging.getLogger(__name__)
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+
+class ExportBusy(Exception):
+    pass
+
+
+def _plain(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def _encode_csv(columns, rows, header):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow(['' if v is None else _plain(v) for v in row])
+    return buf.getvalue()
+
+
+def _encode_ndjson(columns, rows, header):
+    return ''.join(json.dumps(dict(zip(columns, map(_plain, row))), separators=(',', ':')) + '\n'
+                   for row in rows)
+
+
+def acquire():
+    # Taken in the view so a busy worker can answer 503 before streaming starts;
+    # the view hands release() to response.call_on_close, which runs even when
+    # the body is never iterated
+    if not _slots.acquire(blocking=False):
+        raise ExportBusy()
+
+
+def release():
+    _slots.release()
+
+
+def stream(sql, params, fmt, connect=None):
+    # Generator for the response body. Holds one dedicated connection until
+    # the last row is sent or the client goes away.
+    encode = _encode_csv if fmt == 'csv' else _encode_ndjson
+    conn = None
+    cursor = None
+    try:
+        conn = (connect or db.connect)()
+        cursor = conn.cursor(buffered=False)
+        cursor.execute("SET SESSION net_write_timeout = %s", (NET_WRITE_TIMEOUT,))
+        cursor.execute(sql, params)
+        columns = list(cursor.column_names)
+        header = True
+        while True:
+            rows = cursor.fetchmany(BATCH_ROWS)
+            if not rows:
+                break
+            yield encode(columns, rows, header)
+            header = False
+        if header and fmt == 'csv':
+            # Empty result: still send the header line
+            yield encode(columns, [], True)
+    except GeneratorExit:
+        # Client disconnected; closing the connection abandons the rest of the result
+        raise
+    except Exception:
+        # Headers are already sent: re-raise so the server aborts the chunked
+        # response instead of ending it cleanly, and the client sees a failed
+        # download rather than a complete-looking truncated file
+        log.exception("Export failed mid-stream")
+        raise
+    finally:
+        # Connection first: closing an unbuffered cursor would read the rest of
+        # the result. The cursor still has to go (SQLite keeps the connection's
+        # locks until its statements are finalized).
+        for resource in (conn, cursor):
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
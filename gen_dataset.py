@@ -0,0 +1,462 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+import audit
+import counters
+import qcache
+from db import connect
+
+# Synthetic data for load and capacity testing.
+#
+#   python gen_dataset.py --requests 1000000
+#   python gen_dataset.py --users 5000 --technicians 400 --teams 40 --equipment 50000 \
+#       --requests 1000000 --workers 8 --seed 7
+#
+# Rows are added on top of whatever is already there (ids continue from the
+# current maximum), so run it against an idle database: the app must not
+# insert into the same tables while the generator runs.
+#
+# Output is deterministic: every block of RNG_BLOCK rows draws from its own RNG
+# seeded by (--seed, table, block start), so the same seed and --anchor give
+# the same rows whatever --workers and --chunk are. Equipment and requests are
+# generated and inserted by a pool of worker processes, one connection each,
+# in multi-row INSERTs with one transaction per chunk; ids are assigned up
+# front so chunks never need to read each other's rows. Dashboard counters
+# are rebuilt at the end.
+#
+# Every generated user's password is 'password123'. Emails look like
+# user<id>@example.test.
+
+DEFAULT_CHUNK = 5000
+# Chunks are whole blocks
+RNG_BLOCK = 1000
+DEFAULT_PASSWORD = 'password123'
+
+CATEGORIES = [
+    ('CNC Machines', 'Machining centres and lathes'),
+    ('Conveyors', 'Belt and roller conveyors'),
+    ('Compressors', 'Air compressors and dryers'),
+    ('Pumps', 'Process and transfer pumps'),
+    ('Forklifts', 'Warehouse forklifts and pallet trucks'),
+    ('Delivery Vehicles', 'Vans and light trucks'),
+    ('Workstations', 'Desktop computers'),
+    ('Servers', 'Rack servers and storage'),
+    ('HVAC', 'Heating, ventilation and air conditioning'),
+    ('Generators', 'Standby power'),
+]
+# category name -> equipment_type
+CATEGORY_TYPES = {
+    'Forklifts': 'Vehicle', 'Delivery Vehicles': 'Vehicle',
+    'Workstations': 'Computer', 'Servers': 'Computer',
+}
+DEPARTMENTS = ['Production', 'Assembly', 'Packaging', 'Logistics', 'IT', 'Facilities', 'Quality', 'R&D']
+LOCATIONS = ['Shop Floor', 'Warehouse', 'Garage', 'Office', 'Server Room', 'Yard', 'Lab', 'Roof']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Priya', 'Chen', 'Maria', 'Omar', 'Lena', 'Kofi',
+               'Yuki', 'Ivan', 'Fatima', 'Diego', 'Noah', 'Aisha', 'Lucas', 'Mei', 'Arjun', 'Sofia']
+LAST_NAMES = ['Smith', 'Patel', 'Garcia', 'Nguyen', 'Kim', 'Müller', 'Okafor', 'Rossi', 'Silva', 'Cohen',
+              'Tanaka', 'Novak', 'Haddad', 'Johansson', 'Singh', 'Dubois', 'Kowalski', 'Ali', 'Brown', 'Lopez']
+TEAM_WORDS = ['Alpha', 'Bravo', 'Delta', 'Echo', 'Falcon', 'Granite', 'Harbor', 'Ion', 'Juniper', 'Kestrel']
+SUBJECTS = {
+    'Machine': ['Spindle vibration', 'Coolant leak', 'Belt replacement', 'Overheating motor',
+                'Calibration drift', 'Hydraulic pressure low', 'Lubrication service', 'Emergency stop fault'],
+    'Vehicle': ['Brake inspection', 'Oil change', 'Battery failure', 'Tyre replacement',
+                'Hydraulic mast leak', 'Engine warning light', 'Annual service'],
+    'Computer': ['Disk failure', 'OS patching', 'Fan noise', 'Memory errors',
+                 'Network card fault', 'Backup check', 'Power supply failure'],
+}
+
+# Stage mix by where the scheduled date falls relative to the anchor
+STAGE_WEIGHTS = {
+    'future': (('New', 85), ('In Progress', 15)),
+    'recent': (('New', 30), ('In Progress', 40), ('Repaired', 28), ('Scrap', 2)),
+    'past': (('New', 5), ('In Progress', 5), ('Repaired', 87), ('Scrap', 3)),
+}
+RECENT_DAYS = 14
+CORRECTIVE_SHARE = 0.65
+
+
+class Plan:
+    # Everything a worker needs to generate any chunk: counts, id bases and
+    # shared constants. Picklable, so it travels to the worker processes.
+    def __init__(self, args, bases, password_hash):
+        self.seed = args.seed
+        self.anchor = args.anchor
+        self.days_back = args.days_back
+        self.days_ahead = args.days_ahead
+        self.admins = args.admins
+        self.users = args.users
+        self.technicians = args.technicians
+        self.teams = args.teams
+        self.work_centers = args.work_centers
+        self.equipment = args.equipment
+        self.requests = args.requests
+        self.audit = not args.no_audit
+        self.bases = bases
+        self.password_hash = password_hash
+
+    # --- id layout ---
+    # Users: admins, then one per technician, then company users
+    def admin_user_id(self, i):
+        return self.bases['User'] + 1 + i
+
+    def technician_user_id(self, i):
+        return self.bases['User'] + 1 + self.admins + i
+
+    def company_user_id(self, i):
+        return self.bases['User'] + 1 + self.admins + self.technicians + i
+
+    def team_id(self, i):
+        return self.bases['MaintenanceTeam'] + 1 + i
+
+    def technician_id(self, i):
+        return self.bases['Technician'] + 1 + i
+
+    def category_id(self, i):
+        return self.bases['EquipmentCategory'] + 1 + i
+
+    def work_center_id(self, i):
+        return self.bases['WorkCenter'] + 1 + i
+
+    def equipment_id(self, i):
+        return self.bases['Equipment'] + 1 + i
+
+    def request_id(self, i):
+        return self.bases['MaintenanceRequest'] + 1 + i
+
+    # Technician i works in team i % teams; equipment i belongs to team
+    # i % teams and defaults to one of that team's technicians. Pure
+    # arithmetic, so request chunks can derive them without reading rows.
+    def technician_team(self, i):
+        return i % self.teams
+
+    def team_technician(self, team, n):
+        per_team = len(range(team, self.technicians, self.teams))
+        if not per_team:
+            return None
+        return team + self.teams * (n % per_team)
+
+    def equipment_team(self, i):
+        return i % self.teams
+
+    def equipment_technician(self, i):
+        return self.team_technician(self.equipment_team(i), i // self.teams)
+
+    def equipment_category(self, i):
+        return (i * 7 + i // len(CATEGORIES)) % len(CATEGORIES)
+
+
+def _rng(plan, table, start):
+    return random.Random(f"{plan.seed}:{table}:{start}")
+
+
+def _block_rngs(plan, table, start, stop):
+    # -> (i, rng) for start..stop, reseeding at every block boundary
+    rng = None
+    for i in range(start, stop):
+        if rng is None or i % RNG_BLOCK == 0:
+            rng = _rng(plan, table, i - i % RNG_BLOCK)
+        yield i, rng
+
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+
+def _timestamp(rng, day):
+    return datetime.datetime.combine(day, datetime.time(rng.randint(7, 18), rng.randint(0, 59), rng.randint(0, 59)))
+
+
+def _weighted(rng, pairs):
+    return rng.choices([p[0] for p in pairs], weights=[p[1] for p in pairs])[0]
+
+
+# --- Row generators (one chunk each) ---
+
+def user_rows(plan):
+    rng = _rng(plan, 'User', 0)
+    rows = []
+    created = _timestamp(rng, plan.anchor - datetime.timedelta(days=plan.days_back))
+    for i in range(plan.admins):
+        uid = plan.admin_user_id(i)
+        rows.append((uid, f"Admin {i + 1}", f"user{uid}@example.test", plan.password_hash, 'Admin', created))
+    for i in range(plan.technicians):
+        uid = plan.technician_user_id(i)
+        rows.append((uid, _person(rng), f"user{uid}@example.test", plan.password_hash, 'Technician', created))
+    for i in range(plan.users):
+        uid = plan.company_user_id(i)
+        rows.append((uid, _person(rng), f"user{uid}@example.test", plan.password_hash, 'Company User', created))
+    return rows
+
+
+def team_rows(plan):
+    return [(plan.team_id(i), f"{TEAM_WORDS[i % len(TEAM_WORDS)]} Team {plan.team_id(i)}") for i in range(plan.teams)]
+
+
+def technician_rows(plan, user_names):
+    rng = _rng(plan, 'Technician', 0)
+    rows = []
+    for i in range(plan.technicians):
+        role = 'Team Lead' if i < plan.teams else rng.choice(['Technician', 'Technician', 'Senior Technician'])
+        rows.append((plan.technician_id(i), user_names[plan.technician_user_id(i)],
+                     plan.team_id(plan.technician_team(i)), plan.technician_user_id(i), role))
+    return rows
+
+
+def category_rows(plan):
+    return [(plan.category_id(i), f"{name} {plan.category_id(i)}" if plan.bases['EquipmentCategory'] else name,
+             description) for i, (name, description) in enumerate(CATEGORIES)]
+
+
+def work_center_rows(plan):
+    rng = _rng(plan, 'WorkCenter', 0)
+    rows = []
+    for i in range(plan.work_centers):
+        wid = plan.work_center_id(i)
+        rows.append((wid, f"Work Center {wid}", f"WC-{wid:05d}", rng.choice(DEPARTMENTS),
+                     round(rng.uniform(40, 250), 2), round(rng.uniform(1, 20), 2),
+                     round(rng.uniform(70, 99), 2), round(rng.uniform(75, 95), 2)))
+    return rows
+
+
+def equipment_rows(plan, start, stop):
+    rows = []
+    for i, rng in _block_rngs(plan, 'Equipment', start, stop):
+        eid = plan.equipment_id(i)
+        category = plan.equipment_category(i)
+        category_name = CATEGORIES[category][0]
+        equipment_type = CATEGORY_TYPES.get(category_name, 'Machine')
+        technician = plan.equipment_technician(i)
+        purchased = plan.anchor - datetime.timedelta(days=rng.randint(plan.days_back, plan.days_back + 3650))
+        rows.append((
+            eid, f"{category_name.rstrip('s')} {eid}", f"GEN-{eid:09d}", plan.category_id(category),
+            plan.work_center_id(rng.randrange(plan.work_centers)) if plan.work_centers else None,
+            rng.choice(DEPARTMENTS), _person(rng) if rng.random() < 0.6 else None, purchased,
+            f"{rng.choice([1, 2, 3, 5])} years" if rng.random() < 0.7 else None, rng.choice(LOCATIONS),
+            plan.team_id(plan.equipment_team(i)),
+            plan.technician_id(technician) if technician is not None else None,
+            f"Generated {equipment_type.lower()}", equipment_type,
+        ))
+    return rows
+
+
+def request_rows(plan, start, stop):
+    # -> (request rows, audit rows)
+    now = datetime.datetime.combine(plan.anchor, datetime.time(18, 0))
+    requests, audits = [], []
+    for i, rng in _block_rngs(plan, 'MaintenanceRequest', start, stop):
+        rid = plan.request_id(i)
+        # A few machines break far more often than the rest
+        equipment = int(plan.equipment * rng.random() ** 2)
+        equipment_type = CATEGORY_TYPES.get(CATEGORIES[plan.equipment_category(equipment)][0], 'Machine')
+        team = plan.equipment_team(equipment)
+
+        offset = round(rng.triangular(-plan.days_back, plan.days_ahead, 0))
+        scheduled = plan.anchor + datetime.timedelta(days=offset)
+        bucket = 'future' if offset > 0 else 'recent' if offset > -RECENT_DAYS else 'past'
+        stage = _weighted(rng, STAGE_WEIGHTS[bucket])
+        request_type = 'Corrective' if rng.random() < CORRECTIVE_SHARE else 'Preventive'
+
+        technician = None
+        if stage != 'New' or rng.random() < 0.4:
+            if rng.random() < 0.8:
+                technician = plan.equipment_technician(equipment)
+            else:
+                technician = plan.team_technician(team, rng.randrange(1 << 16))
+        creator = plan.company_user_id(rng.randrange(plan.users)) if plan.users else plan.admin_user_id(0)
+        created = _timestamp(rng, scheduled - datetime.timedelta(days=rng.randint(0, 30)))
+        created = min(created, now - datetime.timedelta(minutes=rng.randint(1, 600)))
+        duration = round(rng.uniform(0.5, 8), 2) if stage in counters.CLOSED_STAGES else None
+        subject = rng.choice(SUBJECTS[equipment_type])
+
+        requests.append((
+            rid, subject, plan.equipment_id(equipment), plan.team_id(team),
+            plan.technician_id(technician) if technician is not None else None,
+            creator, request_type, stage, scheduled, duration,
+            f"{subject} reported on equipment #{plan.equipment_id(equipment)}.", created,
+        ))
+        if not plan.audit:
+            continue
+        audits.append((creator, 'CREATE_REQUEST', 'MaintenanceRequest', rid, f"Created {subject}", created))
+        if stage != 'New':
+            actor = plan.technician_user_id(technician) if technician is not None else plan.admin_user_id(0)
+            moved = min(created + datetime.timedelta(hours=rng.randint(1, 72)), now)
+            audits.append((actor, 'UPDATE_REQUEST', 'MaintenanceRequest', rid, "Updated fields: ['stage']", moved))
+            if stage in counters.CLOSED_STAGES:
+                closed = min(moved + datetime.timedelta(hours=rng.randint(1, 120)), now)
+                audits.append((actor, 'UPDATE_REQUEST', 'MaintenanceRequest', rid,
+                               "Updated fields: ['stage', 'duration_hours']", closed))
+    return requests, audits
+
+
+# --- Loading ---
+
+USER_SQL = "INSERT INTO User (id, name, email, password_hash, role, created_at) VALUES (%s, %s, %s, %s, %s, %s)"
+TEAM_SQL = "INSERT INTO MaintenanceTeam (id, team_name) VALUES (%s, %s)"
+TECHNICIAN_SQL = "INSERT INTO Technician (id, name, team_id, user_id, role) VALUES (%s, %s, %s, %s, %s)"
+CATEGORY_SQL = "INSERT INTO EquipmentCategory (id, name, description) VALUES (%s, %s, %s)"
+WORK_CENTER_SQL = """
+    INSERT INTO WorkCenter (id, name, code, tag, cost_per_hour, capacity, efficiency, oee_target)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+"""
+EQUIPMENT_SQL = """
+    INSERT INTO Equipment (id, name, serial_number, category_id, work_center_id, department, assigned_employee,
+                           purchase_date, warranty_info, location, maintenance_team_id, default_technician_id,
+                           description, equipment_type)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+REQUEST_SQL = """
+    INSERT INTO MaintenanceRequest (id, subject, equipment_id, team_id, technician_id, created_by_user_id,
+                                    request_type, stage, scheduled_date, duration_hours, description, created_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+_conn = None
+
+
+def _bulk_session(conn):
+    # Ids and references are consistent by construction; skip the per-row checks
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    cursor.execute("SET SESSION unique_checks = 0")
+    cursor.close()
+
+
+def _insert(conn, sql, rows, batch):
+    # executemany() turns a plain INSERT into one multi-row statement per call
+    cursor = conn.cursor()
+    conn.start_transaction()
+    for i in range(0, len(rows), batch):
+        cursor.executemany(sql, rows[i:i + batch])
+    conn.commit()
+    cursor.close()
+
+
+def _worker_init():
+    global _conn
+    _conn = connect()
+    _bulk_session(_conn)
+
+
+def _load_equipment(plan, start, stop, batch):
+    _insert(_conn, EQUIPMENT_SQL, equipment_rows(plan, start, stop), batch)
+    return stop - start
+
+
+def _load_requests(plan, start, stop, batch):
+    requests, audits = request_rows(plan, start, stop)
+    _insert(_conn, REQUEST_SQL, requests, batch)
+    if audits:
+        _insert(_conn, audit.INSERT_SQL, audits, batch)
+    return stop - start
+
+
+def _run_chunks(pool, label, fn, plan, total, chunk, batch):
+    if not total:
+        return
+    started = time.monotonic()
+    futures = [pool.submit(fn, plan, start, min(start + chunk, total), batch) for start in range(0, total, chunk)]
+    done = 0
+    for future in futures:
+        done += future.result()
+        print(f"  {label}: {done}/{total}", end='\r', flush=True)
+    elapsed = time.monotonic() - started
+    print(f"  {label}: {total} rows in {elapsed:.1f}s ({total / max(elapsed, 0.001):,.0f} rows/s)")
+
+
+def _max_ids(cursor):
+    bases = {}
+    for table in ('User', 'MaintenanceTeam', 'Technician', 'EquipmentCategory', 'WorkCenter',
+                  'Equipment', 'MaintenanceRequest'):
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        bases[table] = cursor.fetchone()[0]
+    return bases
+
+
+def generate(args, out=print):
+    conn = connect()
+    _bulk_session(conn)
+    cursor = conn.cursor()
+    plan = Plan(args, _max_ids(cursor), generate_password_hash(args.password))
+    batch = args.batch
+
+    out(f"Reference data: {args.admins + args.users + args.technicians} users, {args.teams} teams, "
+        f"{args.technicians} technicians, {len(CATEGORIES)} categories, {args.work_centers} work centers")
+    users = user_rows(plan)
+    _insert(conn, USER_SQL, users, batch)
+    _insert(conn, TEAM_SQL, team_rows(plan), batch)
+    _insert(conn, TECHNICIAN_SQL, technician_rows(plan, {row[0]: row[1] for row in users}), batch)
+    _insert(conn, CATEGORY_SQL, category_rows(plan), batch)
+    _insert(conn, WORK_CENTER_SQL, work_center_rows(plan), batch)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_worker_init) as pool:
+        _run_chunks(pool, 'Equipment', _load_equipment, plan, args.equipment, args.chunk, batch)
+        _run_chunks(pool, 'MaintenanceRequest', _load_requests, plan, args.requests, args.chunk, batch)
+
+    out("Rebuilding dashboard counters...")
+    conn.start_transaction()
+    # Equipment with a scrapped request is scrapped, as the app does on Scrap
+    cursor.execute("""
+        UPDATE Equipment SET is_scrapped = TRUE
+        WHERE id > %s AND id IN (SELECT equipment_id FROM MaintenanceRequest WHERE id > %s AND stage = 'Scrap')
+    """, (plan.bases['Equipment'], plan.bases['MaintenanceRequest']))
+    counters.rebuild(cursor)
+    conn.commit()
+    qcache.cache.invalidate(cursor, 'MaintenanceTeam', 'Technician', 'WorkCenter', 'EquipmentCategory',
+                            'Equipment', 'MaintenanceRequest')
+    cursor.execute("ANALYZE TABLE User, MaintenanceTeam, Technician, Equipment, MaintenanceRequest, AuditLog")
+    cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+
+def _date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic MechCare dataset for load testing")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--anchor', type=_date, default=datetime.date.today(),
+                        help="'today' for the generated dates (YYYY-MM-DD); fix it for reproducible data")
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--users', type=int, default=1000, help="company users")
+    parser.add_argument('--technicians', type=int, default=100)
+    parser.add_argument('--teams', type=int, default=10)
+    parser.add_argument('--work-centers', type=int, default=20)
+    parser.add_argument('--equipment', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=100000)
+    parser.add_argument('--days-back', type=int, default=730, help="history covered by scheduled dates")
+    parser.add_argument('--days-ahead', type=int, default=90)
+    parser.add_argument('--no-audit', action='store_true', help="skip the AuditLog history rows")
+    parser.add_argument('--password', default=DEFAULT_PASSWORD)
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count() or 1))
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help=f"rows per worker task / transaction (a multiple of {RNG_BLOCK})")
+    parser.add_argument('--batch', type=int, default=1000, help="rows per INSERT statement")
+    args = parser.parse_args(argv)
+    if args.teams < 1:
+        parser.error("--teams must be at least 1")
+    if args.admins < 1:
+        parser.error("--admins must be at least 1")
+    if args.requests and not args.equipment:
+        parser.error("requests need --equipment > 0")
+    args.chunk = max(RNG_BLOCK, args.chunk - args.chunk % RNG_BLOCK)
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.monotonic()
+    generate(args)
+    print(f"Done in {time.monotonic() - started:.1f}s.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
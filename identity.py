@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Per-process cache of who a session user is and what they can see.
+# Entries expire after IDENTITY_CACHE_TTL seconds so other worker processes
+# pick up changes even though invalidation only reaches the local process.
+CACHE_TTL = float(os.getenv('IDENTITY_CACHE_TTL', 60))
+CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', 2048))
+
+
+class IdentityCache:
+    def __init__(self, ttl=CACHE_TTL, max_size=CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, identity = entry
+                if expires_at > now:
+                    self._entries.move_to_end(user_id)
+                    self.stats['hits'] += 1
+                    return identity
+                del self._entries[user_id]
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, user_id, identity):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    self.stats['invalidations'] += 1
+
+    def invalidate_team(self, team_id):
+        with self._lock:
+            stale = [uid for uid, (_, ident) in self._entries.items() if ident['team_id'] == team_id]
+            for uid in stale:
+                del self._entries[uid]
+            self.stats['invalidations'] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.stats['invalidations'] += len(self._entries)
+            self._entries.clear()
+
+
+cache = IdentityCache()
+
+
+# One round trip for the user row plus their technician/team link
+IDENTITY_QUERY = """
+    SELECT u.*, t.id as _technician_id, t.team_id as _team_id
+    FROM User u
+    LEFT JOIN Technician t ON t.user_id = u.id
+    WHERE u.id = %s
+"""
+
+
+def identity_from_row(row):
+    # IDENTITY_QUERY row (dict) -> identity; the row is modified
+    technician_id = row.pop('_technician_id')
+    team_id = row.pop('_team_id')
+    return {
+        'user': row,
+        'role': row['role'],
+        'technician_id': technician_id,
+        'team_id': team_id,
+    }
+
+
+def load_identity(db, user_id):
+    identity = cache.get(user_id)
+    if identity is not None:
+        return identity
+
+    cursor = db.cursor(dictionary=True)
+    cursor.execute(IDENTITY_QUERY, (user_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    if row is None:
+        return None
+
+    identity = identity_from_row(row)
+    cache.put(user_id, identity)
+    return identity
@@ -0,0 +1,291 @@
+import argparse
+import codecs
+import csv
+import datetime
+import json
+import sys
+
+import mysql.connector
+
+import qcache
+from db import connect
+
+# Bulk equipment import from CSV or NDJSON (one JSON object per line).
+#
+#   python import_equipment.py plant.csv
+#   python import_equipment.py assets.ndjson --dry-run
+#
+# Also served as POST /api/equipment/import. Rows are read as a stream, so
+# the file is never held in memory; category / work center / team / technician
+# names are resolved through lookups loaded once per import. Valid rows are
+# upserted on serial_number in chunks of multi-row INSERT ... ON DUPLICATE KEY
+# UPDATE, one transaction per chunk. Invalid rows are skipped and reported by
+# line number.
+
+EQUIPMENT_TYPES = ('Machine', 'Vehicle', 'Computer')
+DEFAULT_CHUNK = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Plain columns copied from the input, with their VARCHAR limits (None = TEXT)
+TEXT_COLUMNS = {
+    'name': 100,
+    'serial_number': 100,
+    'department': 100,
+    'assigned_employee': 100,
+    'location': 100,
+    'warranty_info': None,
+    'description': None,
+}
+
+# column -> (accepted name fields, lookup table, name column)
+REFERENCE_COLUMNS = {
+    'category_id': (('category', 'category_name'), 'EquipmentCategory', 'name'),
+    'work_center_id': (('work_center', 'work_center_name'), 'WorkCenter', 'name'),
+    'maintenance_team_id': (('team', 'team_name', 'maintenance_team'), 'MaintenanceTeam', 'team_name'),
+    'default_technician_id': (('technician', 'technician_name', 'default_technician'), 'Technician', 'name'),
+}
+
+COLUMNS = list(TEXT_COLUMNS) + ['equipment_type', 'purchase_date'] + list(REFERENCE_COLUMNS)
+# Re-importing a serial updates the asset in place (is_scrapped and counters are left alone)
+UPSERT_SQL = f"""
+    INSERT INTO Equipment ({', '.join(COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(COLUMNS))})
+    ON DUPLICATE KEY UPDATE {', '.join(f'{c} = VALUES({c})' for c in COLUMNS if c != 'serial_number')}
+"""
+
+
+class RowError(Exception):
+    pass
+
+
+def detect_format(filename=None, content_type=None, explicit=None):
+    if explicit:
+        if explicit not in ('csv', 'ndjson'):
+            raise ValueError("format must be csv or ndjson")
+        return explicit
+    hint = f"{filename or ''} {content_type or ''}".lower()
+    if 'ndjson' in hint or 'jsonl' in hint or 'json' in hint:
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(stream, fmt):
+    # Binary stream -> (line number, dict) pairs, decoded incrementally
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'ndjson':
+        for line_no, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_no, RowError(f"invalid JSON: {e}")
+                continue
+            yield line_no, row if isinstance(row, dict) else RowError("expected a JSON object")
+    else:
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Header is line 1
+            yield reader.line_num, {k.strip(): v for k, v in row.items() if k}
+
+
+class NameLookup:
+    # Reference tables are small: load each one once, then resolve in memory
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self._tables = {}
+
+    def _load(self, table, name_column):
+        if table not in self._tables:
+            self.cursor.execute(f"SELECT id, {name_column} as name FROM {table}")
+            ids = {}
+            for row in self.cursor.fetchall():
+                row_id, name = (row['id'], row['name']) if isinstance(row, dict) else row
+                ids.setdefault(str(name).strip().lower(), []).append(row_id)
+            self._tables[table] = ids
+        return self._tables[table]
+
+    def resolve(self, table, name_column, name):
+        ids = self._load(table, name_column).get(name.strip().lower())
+        if not ids:
+            raise RowError(f"unknown {table} '{name}'")
+        if len(ids) > 1:
+            raise RowError(f"ambiguous {table} '{name}' ({len(ids)} matches); use the id")
+        return ids[0]
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def validate(row, lookup):
+    # -> tuple of COLUMNS values; raises RowError
+    values = {}
+    for column, max_len in TEXT_COLUMNS.items():
+        value = row.get(column)
+        value = None if _blank(value) else str(value).strip()
+        if max_len and value and len(value) > max_len:
+            raise RowError(f"{column} longer than {max_len} characters")
+        values[column] = value
+    if not values['name']:
+        raise RowError("name is required")
+    if not values['serial_number']:
+        raise RowError("serial_number is required")
+
+    equipment_type = row.get('equipment_type')
+    equipment_type = 'Machine' if _blank(equipment_type) else str(equipment_type).strip().capitalize()
+    if equipment_type not in EQUIPMENT_TYPES:
+        raise RowError(f"equipment_type must be one of: {', '.join(EQUIPMENT_TYPES)}")
+    values['equipment_type'] = equipment_type
+
+    purchase_date = row.get('purchase_date')
+    if _blank(purchase_date):
+        values['purchase_date'] = None
+    else:
+        try:
+            values['purchase_date'] = datetime.date.fromisoformat(str(purchase_date).strip())
+        except ValueError:
+            raise RowError("purchase_date must be YYYY-MM-DD")
+
+    for column, (name_fields, table, name_column) in REFERENCE_COLUMNS.items():
+        value = row.get(column)
+        if not _blank(value):
+            try:
+                values[column] = int(value)
+            except (TypeError, ValueError):
+                raise RowError(f"{column} must be an integer")
+            continue
+        name = next((row[f] for f in name_fields if not _blank(row.get(f))), None)
+        values[column] = lookup.resolve(table, name_column, str(name)) if name is not None else None
+    return tuple(values[c] for c in COLUMNS)
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, line_no, serial, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_no, 'serial_number': serial, 'error': message})
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+            'errors_truncated': self.error_count > len(self.errors),
+        }
+
+
+def _existing_serials(cursor, serials):
+    cursor.execute(f"SELECT serial_number FROM Equipment WHERE serial_number IN ({', '.join(['%s'] * len(serials))})",
+                   list(serials))
+    return {row['serial_number'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()}
+
+
+def _write_chunk(conn, cursor, chunk, report):
+    # chunk: [(line_no, values)]
+    serial_index = COLUMNS.index('serial_number')
+    existing = _existing_serials(cursor, [values[serial_index] for _, values in chunk])
+    try:
+        conn.start_transaction()
+        cursor.executemany(UPSERT_SQL, [values for _, values in chunk])
+        conn.commit()
+    except mysql.connector.Error:
+        # Something in the chunk was rejected (e.g. a stale id): redo it row by
+        # row so only the offending rows are reported
+        conn.rollback()
+        good = []
+        for line_no, values in chunk:
+            try:
+                conn.start_transaction()
+                cursor.execute(UPSERT_SQL, values)
+                conn.commit()
+                good.append(values)
+            except mysql.connector.Error as e:
+                conn.rollback()
+                report.error(line_no, values[serial_index], e.msg)
+        chunk = [(None, values) for values in good]
+    for _, values in chunk:
+        if values[serial_index] in existing:
+            report.updated += 1
+        else:
+            report.created += 1
+
+
+def import_rows(conn, rows, chunk_size=DEFAULT_CHUNK, dry_run=False, out=None):
+    # rows: iterable of (line_no, dict or RowError) -> ImportReport
+    cursor = conn.cursor(dictionary=True)
+    lookup = NameLookup(cursor)
+    report = ImportReport()
+    seen = set()
+    chunk = []
+    for line_no, row in rows:
+        report.rows += 1
+        serial = row.get('serial_number') if isinstance(row, dict) else None
+        try:
+            if isinstance(row, RowError):
+                raise row
+            values = validate(row, lookup)
+            serial = values[COLUMNS.index('serial_number')]
+            if serial in seen:
+                raise RowError("serial_number repeated in this file")
+            seen.add(serial)
+        except RowError as e:
+            report.error(line_no, serial, str(e))
+            continue
+        chunk.append((line_no, values))
+        if len(chunk) >= chunk_size:
+            if not dry_run:
+                _write_chunk(conn, cursor, chunk, report)
+            chunk = []
+            if out:
+                out(f"  {report.rows} rows read, {report.created} created, {report.updated} updated, "
+                    f"{report.error_count} errors")
+    if chunk and not dry_run:
+        _write_chunk(conn, cursor, chunk, report)
+    cursor.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import equipment from CSV or NDJSON")
+    parser.add_argument('file', help="path, or - for stdin")
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help="default: from the file extension")
+    parser.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help="rows per INSERT / transaction")
+    parser.add_argument('--dry-run', action='store_true', help="validate only")
+    args = parser.parse_args(argv)
+
+    fmt = detect_format(args.file, explicit=args.format)
+    stream = sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')
+    conn = connect()
+    try:
+        report = import_rows(conn, read_rows(stream, fmt), args.chunk, args.dry_run, out=print)
+        if not args.dry_run and (report.created or report.updated):
+            cursor = conn.cursor()
+            qcache.cache.invalidate(cursor, 'Equipment')
+            cursor.close()
+    finally:
+        conn.close()
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    for error in report.errors:
+        print(f"  line {error['line']}: {error['serial_number'] or '-'}: {error['error']}")
+    if report.error_count > len(report.errors):
+        print(f"  ... {report.error_count - len(report.errors)} more errors")
+    verb = "Validated" if args.dry_run else "Imported"
+    print(f"{verb} {report.rows} rows: {report.created} created, {report.updated} updated, "
+          f"{report.error_count} errors.")
+    return 1 if report.error_count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,352 @@
+import bisect
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import Response, g, request, session
+
+import audit
+import db
+import passwords
+import qcache
+
+# Per-request SQL and route instrumentation.
+#
+#   METRICS_ENABLED=1     wrap the request's connection and cursors, time every
+#                         query, add Server-Timing headers and serve /metrics
+#   METRICS_LOG_JSON=1    also log one JSON line per request (and JSON-format
+#                         every other log record)
+#
+# With METRICS_ENABLED unset nothing is registered: get_db() hands out the bare
+# pooled connection and no hooks run.
+#
+# /metrics is Prometheus text format. Values are per worker process; scrape
+# each worker (or run one worker per metrics port). Access needs an Admin
+# session or `Authorization: Bearer $METRICS_TOKEN`.
+
+ENABLED = os.getenv('METRICS_ENABLED', '0').lower() in ('1', 'true', 'yes')
+LOG_JSON = os.getenv('METRICS_LOG_JSON', '0').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+access_log = logging.getLogger('mechcare.access')
+
+# Set by profiler.py: keep every statement's text and parameters on RequestStats
+capture_statements = False
+
+
+# --- Metric types ---
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join('{}="{}"'.format(n, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                     for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = buckets
+        self._series = {}   # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        names = self.label_names + ('le',)
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter('mechcare_http_requests_total', "HTTP requests by endpoint, method and status",
+                   ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = Histogram('mechcare_http_request_duration_seconds', "Time to produce the response",
+                            ('endpoint', 'method'), REQUEST_BUCKETS)
+ERRORS = Counter('mechcare_http_errors_total', "Unhandled exceptions by endpoint", ('endpoint', 'exception'))
+QUERIES = Counter('mechcare_db_queries_total', "SQL statements executed, by endpoint", ('endpoint',))
+QUERY_LATENCY = Histogram('mechcare_db_query_duration_seconds', "Per-statement execute time",
+                          ('endpoint',), QUERY_BUCKETS)
+QUERIES_PER_REQUEST = Histogram('mechcare_db_queries_per_request', "SQL statements per HTTP request",
+                                ('endpoint',), COUNT_BUCKETS)
+# Recorded whatever METRICS_ENABLED says: the login view observes these itself
+LOGINS = Counter('mechcare_logins_total', "Login attempts by outcome", ('outcome',))
+LOGIN_LATENCY = Histogram('mechcare_login_duration_seconds', "Login POST time, password queue wait included",
+                          ('outcome',), REQUEST_BUCKETS)
+METRICS = [REQUESTS, REQUEST_LATENCY, ERRORS, QUERIES, QUERY_LATENCY, QUERIES_PER_REQUEST, LOGINS, LOGIN_LATENCY]
+
+POOL_GAUGES = ('size', 'max_overflow', 'in_use', 'idle', 'total')
+
+
+def _status_lines(prefix, stats, gauges=()):
+    # Flat numeric stats dicts (pool, audit writer, query cache) as counters/gauges
+    lines = []
+    for key, value in sorted(stats.items()):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        kind = 'gauge' if key in gauges else 'counter'
+        if kind == 'counter' and not name.endswith('_total'):
+            name += '_total'
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {value}")
+    return lines
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(_status_lines('mechcare_db_pool', db.pool_stats(), POOL_GAUGES))
+    lines.extend(_status_lines('mechcare_audit', audit.writer.status(), ('queue_depth', 'queue_size')))
+    lines.extend(_status_lines('mechcare_query_cache', qcache.cache.status(), ('entries', 'hit_ratio')))
+    lines.extend(_status_lines('mechcare_password_pool', passwords.pool.status(),
+                               ('queue_depth', 'in_flight', 'workers', 'queue_size')))
+    lines.extend(_status_lines('mechcare_login', passwords.throttle.status()))
+    return '\n'.join(lines) + '\n'
+
+
+def observe_login(outcome, elapsed):
+    # outcome: success, failure, throttled or busy
+    LOGINS.inc(outcome)
+    LOGIN_LATENCY.observe(elapsed, outcome)
+
+
+# --- Connection / cursor wrappers ---
+
+class RequestStats:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        # (sql, params, seconds, executemany) when capture_statements is on
+        self.statements = [] if capture_statements else None
+
+    def record(self, elapsed, sql=None, params=None, many=False):
+        self.queries += 1
+        self.db_time += elapsed
+        QUERY_LATENCY.observe(elapsed, self.endpoint)
+        if self.statements is not None:
+            self.statements.append((sql, params, elapsed, many))
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, stats):
+        self.__wrapped__ = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.__wrapped__, name)
+
+    def __iter__(self):
+        return iter(self.__wrapped__)
+
+    def _timed(self, fn, many, operation, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(operation, *args, **kwargs)
+        finally:
+            params = args[0] if args else kwargs.get('params', kwargs.get('seq_params'))
+            self._stats.record(time.perf_counter() - start, operation, params, many)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self.__wrapped__.execute, False, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self.__wrapped__.executemany, True, operation, *args, **kwargs)
+
+    def callproc(self, procname, *args, **kwargs):
+        return self._timed(self.__wrapped__.callproc, False, procname, *args, **kwargs)
+
+    # Unbuffered cursors do the network reads here: add the time, not a statement
+    def _fetch(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._stats.db_time += time.perf_counter() - start
+
+    def fetchone(self):
+        return self._fetch(self.__wrapped__.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self.__wrapped__.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self.__wrapped__.fetchall)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn, stats):
+        self.__wrapped__ = conn
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.__wrapped__, name)
+
+    def __setattr__(self, name, value):
+        if name in ('__wrapped__', '_stats'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.__wrapped__, name, value)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.__wrapped__.cursor(*args, **kwargs), self._stats)
+
+    # Each of these is a statement round trip of its own
+    def _timed(self, sql, fn, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._stats.record(time.perf_counter() - start, sql)
+
+    def start_transaction(self, *args, **kwargs):
+        return self._timed('START TRANSACTION', self.__wrapped__.start_transaction, *args, **kwargs)
+
+    def commit(self):
+        return self._timed('COMMIT', self.__wrapped__.commit)
+
+    def rollback(self):
+        return self._timed('ROLLBACK', self.__wrapped__.rollback)
+
+
+def wrap_connection(conn):
+    # db.get_db() hook: attribute the connection's statements to this request
+    stats = g.get('request_stats')
+    return InstrumentedConnection(conn, stats) if stats is not None else conn
+
+
+# --- Request hooks ---
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _start_request():
+    g.request_stats = RequestStats(_endpoint())
+
+
+def _finish_request(response):
+    stats = g.get('request_stats')
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - stats.started
+    REQUESTS.inc(stats.endpoint, request.method, response.status_code)
+    REQUEST_LATENCY.observe(elapsed, stats.endpoint, request.method)
+    QUERIES.inc(stats.endpoint, amount=stats.queries)
+    QUERIES_PER_REQUEST.observe(stats.queries, stats.endpoint)
+    response.headers.add('Server-Timing', f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"')
+    response.headers.add('Server-Timing', f'app;dur={elapsed * 1000:.1f}')
+    if LOG_JSON:
+        access_log.info('request', extra={'fields': {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': stats.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 2),
+            'db_ms': round(stats.db_time * 1000, 2),
+            'queries': stats.queries,
+            'user_id': session.get('user_id'),
+        }})
+    return response
+
+
+def _record_exception(exc):
+    if exc is not None:
+        ERRORS.inc(_endpoint(), type(exc).__name__)
+
+
+def metrics_view():
+    auth = request.headers.get('Authorization', '')
+    token_ok = METRICS_TOKEN and auth == f'Bearer {METRICS_TOKEN}'
+    if not token_ok and session.get('user_role') != 'Admin':
+        return Response("Forbidden\n", status=403, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+# --- JSON logging ---
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _configure_json_logging():
+    handler = logging.StreamHandler()
+    handler.setFormatter(JSONFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    if root.level > logging.INFO or root.level == logging.NOTSET:
+        root.setLevel(logging.INFO)
+
+
+def init_app(app, force=False):
+    # force: turned on by another module (the profiler) whatever METRICS_ENABLED says
+    if not (ENABLED or force) or 'instrumentation' in app.extensions:
+        return
+    app.extensions['instrumentation'] = True
+    # Registered ahead of the app's own hooks, so identity loading is counted too
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_record_exception)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    db.connection_wrapper = wrap_connection
+    if LOG_JSON:
+        _configure_json_logging()
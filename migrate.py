@@ -0,0 +1,261 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import storage
+
+load_dotenv()
+
+# Versioned schema migrations.
+#
+#   python migrate.py              apply pending migrations
+#   python migrate.py --dry-run    print what would run
+#   python migrate.py status       list applied / pending versions
+#   python migrate.py check        EXPLAIN the hot queries and report index misses
+#
+# Migrations are numbered .sql files in migrations/ (NNNN_description.sql),
+# applied in order and recorded in SchemaMigration. Statements that fail
+# because the object already exists (e.g. databases created from the current
+# schema.sql or patched by the old ad-hoc scripts) are reported and skipped.
+#
+# Runs against DB_BACKEND like the app (see storage.py). On SQLite the
+# statements are translated and data backfills skipped; `check` needs MySQL.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# Duplicate column / duplicate key name / table exists / can't drop (already gone)
+ALREADY_APPLIED_ERRORS = {1060, 1061, 1050, 1091}
+
+# Representative shapes of the hot queries in app.py, with the indexes we
+# expect MySQL to pick. Keep these in step with the queries they mirror.
+HOT_QUERIES = [
+    {
+        'name': 'requests: admin board',
+        'sql': "SELECT r.id FROM MaintenanceRequest r ORDER BY r.created_at DESC, r.id DESC LIMIT 50",
+        'params': (),
+        'indexes': ['idx_request_created'],
+    },
+    {
+        'name': 'requests: company user board',
+        'sql': ("SELECT r.id FROM MaintenanceRequest r WHERE r.created_by_user_id = %s "
+                "ORDER BY r.created_at DESC, r.id DESC LIMIT 50"),
+        'params': (1,),
+        'indexes': ['idx_request_creator_created'],
+    },
+    {
+        'name': 'requests: technician board',
+        'sql': ("SELECT r.id FROM MaintenanceRequest r WHERE (r.team_id = %s OR r.technician_id = %s) "
+                "ORDER BY r.created_at DESC, r.id DESC LIMIT 50"),
+        'params': (1, 1),
+        'indexes': ['idx_request_team_created', 'idx_request_technician_created', 'idx_request_created'],
+    },
+    {
+        'name': 'requests: kanban date filter',
+        'sql': "SELECT r.id FROM MaintenanceRequest r WHERE r.scheduled_date = %s",
+        'params': ('2025-01-01',),
+        'indexes': ['idx_request_scheduled_date'],
+    },
+    {
+        'name': 'calendar: company user month',
+        'sql': ("SELECT r.scheduled_date, COUNT(*) FROM MaintenanceRequest r WHERE r.scheduled_date >= %s "
+                "AND r.scheduled_date < %s AND r.created_by_user_id = %s GROUP BY r.scheduled_date"),
+        'params': ('2025-01-01', '2025-02-01', 1),
+        'indexes': ['idx_request_creator_scheduled', 'idx_request_scheduled_date'],
+    },
+    {
+        'name': 'equipment: cascade counter fixup',
+        'sql': ("SELECT stage, COUNT(*) FROM MaintenanceRequest WHERE equipment_id = %s "
+                "GROUP BY stage"),
+        'params': (1,),
+        'indexes': ['idx_request_equipment_stage'],
+    },
+    {
+        'name': 'equipment: filtered listing',
+        'sql': ("SELECT e.id FROM Equipment e WHERE e.equipment_type IN (%s) "
+                "ORDER BY e.id DESC LIMIT 50"),
+        'params': ('Machine',),
+        'indexes': ['idx_equipment_type', 'PRIMARY'],
+    },
+    {
+        'name': 'logs: admin browser',
+        'sql': ("SELECT l.id FROM AuditLog l WHERE l.action = %s "
+                "ORDER BY l.timestamp DESC, l.id DESC LIMIT 51"),
+        'params': ('LOGIN',),
+        'indexes': ['idx_auditlog_action_time'],
+    },
+    {
+        'name': 'stats: team counters',
+        'sql': "SELECT stage, SUM(request_count) FROM RequestStatCounter WHERE team_id = %s GROUP BY stage",
+        'params': (1,),
+        'indexes': ['PRIMARY'],
+    },
+]
+
+
+def connect():
+    # MySQL or SQLite, per DB_BACKEND; one transaction per migration
+    conn = storage.get_driver().connect()
+    conn.autocommit = False
+    return conn
+
+
+def split_statements(sql):
+    # Drop full-line comments, then split on ';' like setup_db.apply_sql_file
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def discover():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = re.match(r'^(\d{4})_(\w+)\.sql$', filename)
+        if not match:
+            continue
+        with open(os.path.join(MIGRATIONS_DIR, filename)) as f:
+            sql = f.read()
+        migrations.append({
+            'version': match.group(1),
+            'name': match.group(2),
+            'checksum': hashlib.sha256(sql.encode()).hexdigest(),
+            'statements': split_statements(sql),
+        })
+    return migrations
+
+
+def ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS SchemaMigration (
+            version VARCHAR(16) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied_versions(cursor):
+    cursor.execute("SELECT version, checksum FROM SchemaMigration")
+    return {version: checksum for version, checksum in cursor.fetchall()}
+
+
+def pending(cursor):
+    ensure_table(cursor)
+    applied = applied_versions(cursor)
+    return [m for m in discover() if m['version'] not in applied]
+
+
+def apply_pending(conn, dry_run=False, out=print):
+    cursor = conn.cursor()
+    todo = pending(cursor)
+    if not todo:
+        out("Schema is up to date.")
+    for migration in todo:
+        label = f"{migration['version']}_{migration['name']}"
+        if dry_run:
+            out(f"-- would apply {label}")
+            for stmt in migration['statements']:
+                out(stmt + ';')
+            continue
+
+        out(f"Applying {label}...")
+        for stmt in migration['statements']:
+            try:
+                storage.execute_ddl(cursor, stmt)
+            except mysql.connector.Error as err:
+                if err.errno not in ALREADY_APPLIED_ERRORS:
+                    conn.rollback()
+                    cursor.close()
+                    raise
+                out(f"  already present, skipped: {err.msg}")
+        cursor.execute("INSERT INTO SchemaMigration (version, name, checksum) VALUES (%s, %s, %s)",
+                       (migration['version'], migration['name'], migration['checksum']))
+        conn.commit()
+    cursor.close()
+    return todo
+
+
+def status(conn, out=print):
+    cursor = conn.cursor()
+    ensure_table(cursor)
+    applied = applied_versions(cursor)
+    cursor.close()
+    for migration in discover():
+        label = f"{migration['version']}_{migration['name']}"
+        checksum = applied.get(migration['version'])
+        if checksum is None:
+            out(f"  pending  {label}")
+        elif checksum != migration['checksum']:
+            out(f"  CHANGED  {label} (file edited after it was applied)")
+        else:
+            out(f"  applied  {label}")
+
+
+def _explain_tables(plan):
+    # Walk EXPLAIN FORMAT=JSON and collect every table access
+    found = []
+    if isinstance(plan, dict):
+        if 'table_name' in plan and 'access_type' in plan:
+            found.append(plan)
+        for value in plan.values():
+            found.extend(_explain_tables(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            found.extend(_explain_tables(value))
+    return found
+
+
+def check_indexes(conn, out=print):
+    cursor = conn.cursor()
+    problems = 0
+    for query in HOT_QUERIES:
+        cursor.execute("EXPLAIN FORMAT=JSON " + query['sql'], query['params'])
+        plan = json.loads(cursor.fetchone()[0])
+        tables = _explain_tables(plan)
+        driving = tables[0] if tables else {}
+        # index_merge lists its keys under nested nodes, so collect every key in the plan
+        used = set(re.findall(r'"key": "(\w+)"', json.dumps(plan)))
+        ok = driving.get('access_type') != 'ALL' and bool(used & set(query['indexes']))
+        if not ok:
+            problems += 1
+        status_label = 'ok  ' if ok else 'MISS'
+        out(f"  {status_label} {query['name']}: access={driving.get('access_type')} "
+            f"key={', '.join(sorted(used)) or 'none'} (expected {' / '.join(query['indexes'])})")
+    cursor.close()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MechCare schema migrations")
+    parser.add_argument('command', nargs='?', default='migrate', choices=['migrate', 'status', 'check'])
+    parser.add_argument('--dry-run', action='store_true', help="print pending migrations without applying them")
+    args = parser.parse_args(argv)
+    if args.command == 'check' and storage.get_driver().name != 'mysql':
+        print("migrate.py check needs MySQL (EXPLAIN FORMAT=JSON); DB_BACKEND is "
+              f"{storage.get_driver().name}.")
+        return 1
+
+    conn = connect()
+    try:
+        if args.command == 'status':
+            status(conn)
+        elif args.command == 'check':
+            problems = check_indexes(conn)
+            if problems:
+                print(f"{problems} hot quer{'y' if problems == 1 else 'ies'} not using the expected index.")
+                return 1
+            print("All hot queries use their indexes.")
+        else:
+            apply_pending(conn, dry_run=args.dry_run)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2 @@
+-- Free-text description on maintenance requests (was add_description_col.py)
+ALTER TABLE MaintenanceRequest ADD COLUMN description TEXT;
@@ -0,0 +1,2 @@
+-- Month range scans for /api/calendar (was add_calendar_index.py)
+CREATE INDEX idx_request_scheduled_date ON MaintenanceRequest (scheduled_date);
@@ -0,0 +1,37 @@
+-- Maintained dashboard counters (see counters.py), backfilled from existing requests
+CREATE TABLE IF NOT EXISTS RequestStatCounter (
+    team_id INT NOT NULL DEFAULT 0,
+    created_by_user_id INT NOT NULL DEFAULT 0,
+    stage ENUM('New', 'In Progress', 'Repaired', 'Scrap') NOT NULL,
+    request_type ENUM('Corrective', 'Preventive') NOT NULL,
+    has_technician BOOLEAN NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, created_by_user_id, stage, request_type, has_technician),
+    INDEX idx_stat_counter_creator (created_by_user_id)
+);
+
+CREATE TABLE IF NOT EXISTS CriticalEquipmentCounter (
+    team_id INT NOT NULL DEFAULT 0,
+    created_by_user_id INT NOT NULL DEFAULT 0,
+    equipment_id INT NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, created_by_user_id, equipment_id),
+    INDEX idx_critical_counter_creator (created_by_user_id),
+    INDEX idx_critical_counter_equipment (equipment_id)
+);
+
+DELETE FROM RequestStatCounter;
+
+INSERT INTO RequestStatCounter (team_id, created_by_user_id, stage, request_type, has_technician, request_count)
+SELECT COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), stage, request_type,
+       technician_id IS NOT NULL, COUNT(*)
+FROM MaintenanceRequest
+GROUP BY COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), stage, request_type, technician_id IS NOT NULL;
+
+DELETE FROM CriticalEquipmentCounter;
+
+INSERT INTO CriticalEquipmentCounter (team_id, created_by_user_id, equipment_id, request_count)
+SELECT COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), equipment_id, COUNT(*)
+FROM MaintenanceRequest
+WHERE request_type = 'Corrective' AND stage IN ('New', 'In Progress')
+GROUP BY COALESCE(team_id, 0), COALESCE(created_by_user_id, 0), equipment_id;
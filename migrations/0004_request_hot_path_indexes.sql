@@ -0,0 +1,19 @@
+-- Composite indexes matched to the WHERE / ORDER BY shapes in app.py.
+-- Listings order by (created_at, id) DESC and are scoped per role:
+--   Admin           -> no scope               -> idx_request_created
+--   Company User    -> created_by_user_id = ? -> idx_request_creator_created
+--   Technician      -> team_id = ? OR technician_id = ? (index merge)
+--                      -> idx_request_team_created / idx_request_technician_created
+CREATE INDEX idx_request_created ON MaintenanceRequest (created_at, id);
+CREATE INDEX idx_request_creator_created ON MaintenanceRequest (created_by_user_id, created_at, id);
+CREATE INDEX idx_request_team_created ON MaintenanceRequest (team_id, created_at, id);
+CREATE INDEX idx_request_technician_created ON MaintenanceRequest (technician_id, created_at, id);
+
+-- Stage filter on the board: stage IN (...) ORDER BY created_at, id
+CREATE INDEX idx_request_stage_created ON MaintenanceRequest (stage, created_at, id);
+
+-- Calendar / Kanban date filters for company users: creator + scheduled_date range
+CREATE INDEX idx_request_creator_scheduled ON MaintenanceRequest (created_by_user_id, scheduled_date);
+
+-- open_requests per equipment: equipment_id = ? AND stage NOT IN ('Repaired', 'Scrap')
+CREATE INDEX idx_request_equipment_stage ON MaintenanceRequest (equipment_id, stage);
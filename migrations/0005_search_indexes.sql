@@ -0,0 +1,6 @@
+-- Ranked text search (see search.py): FULLTEXT on the free-text columns,
+-- B-tree on Equipment.name for prefix matches. serial_number prefix lookups
+-- use its existing UNIQUE index.
+ALTER TABLE Equipment ADD FULLTEXT INDEX ft_equipment_text (name, description);
+ALTER TABLE MaintenanceRequest ADD FULLTEXT INDEX ft_request_text (subject, description);
+CREATE INDEX idx_equipment_name ON Equipment (name);
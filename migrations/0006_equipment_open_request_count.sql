@@ -0,0 +1,18 @@
+-- Denormalised open request count per equipment, maintained by counters.py.
+-- Replaces the correlated COUNT(*) subquery in the equipment listing/detail.
+ALTER TABLE Equipment ADD COLUMN open_request_count INT NOT NULL DEFAULT 0;
+
+UPDATE Equipment e
+LEFT JOIN (
+    SELECT equipment_id, COUNT(*) as n
+    FROM MaintenanceRequest
+    WHERE stage NOT IN ('Repaired', 'Scrap')
+    GROUP BY equipment_id
+) open_requests ON open_requests.equipment_id = e.id
+SET e.open_request_count = COALESCE(open_requests.n, 0);
+
+-- /api/equipment filters; InnoDB appends the primary key, so each index also
+-- serves the ORDER BY e.id DESC keyset pagination
+CREATE INDEX idx_equipment_type ON Equipment (equipment_type);
+CREATE INDEX idx_equipment_department ON Equipment (department);
+CREATE INDEX idx_equipment_scrapped ON Equipment (is_scrapped);
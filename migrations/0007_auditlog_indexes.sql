@@ -0,0 +1,6 @@
+-- /api/logs pages newest-first on (timestamp, id) with optional filters;
+-- audit_retention.py finds expired rows through idx_auditlog_timestamp.
+CREATE INDEX idx_auditlog_timestamp ON AuditLog (timestamp, id);
+CREATE INDEX idx_auditlog_user_time ON AuditLog (user_id, timestamp, id);
+CREATE INDEX idx_auditlog_action_time ON AuditLog (action, timestamp, id);
+CREATE INDEX idx_auditlog_target_time ON AuditLog (target_type, target_id, timestamp, id);
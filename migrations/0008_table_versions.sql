@@ -0,0 +1,13 @@
+-- Version counters behind the ETag / Last-Modified headers on reference data
+-- endpoints (see table_versions.py). Bumped by the write paths.
+CREATE TABLE IF NOT EXISTS TableVersion (
+    table_name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO TableVersion (table_name, version) VALUES
+    ('MaintenanceTeam', 1),
+    ('Technician', 1),
+    ('WorkCenter', 1),
+    ('EquipmentCategory', 1);
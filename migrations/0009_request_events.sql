@@ -0,0 +1,18 @@
+-- Change feed behind /api/events (see events.py). Written in the same
+-- transaction as the request change; every worker process polls it by id.
+-- Scope columns hold the row's visibility before (old_*) and after the change
+-- so subscribers can be told about cards entering or leaving their view.
+-- No foreign keys: events outlive the rows they describe.
+CREATE TABLE IF NOT EXISTS RequestEvent (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    request_id INT NOT NULL,
+    action VARCHAR(16) NOT NULL,
+    team_id INT NULL,
+    technician_id INT NULL,
+    created_by_user_id INT NULL,
+    old_team_id INT NULL,
+    old_technician_id INT NULL,
+    payload MEDIUMTEXT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_requestevent_created (created_at)
+);
@@ -0,0 +1,7 @@
+-- TableVersion.updated_at feeds Last-Modified, which HTTP defines in UTC. A
+-- TIMESTAMP column is read back in the session time zone, so hold the value
+-- in a DATETIME written with UTC_TIMESTAMP() (table_versions.bump) instead.
+-- Existing rows are restamped: clients revalidate once.
+ALTER TABLE TableVersion MODIFY updated_at DATETIME NOT NULL;
+
+UPDATE TableVersion SET updated_at = UTC_TIMESTAMP();
@@ -0,0 +1,76 @@
+import base64
+import datetime
+import json
+
+# Opaque keyset cursors: the client gets back whatever sort key the last row
+# had and hands it back unchanged to fetch the next page.
+DEFAULT_MAX_LIMIT = 500
+
+
+class InvalidParam(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    parts = []
+    for v in values:
+        if isinstance(v, (datetime.datetime, datetime.date)):
+            v = v.isoformat()
+        parts.append(v)
+    raw = json.dumps(parts, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        parts = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise InvalidParam('Invalid cursor')
+    if not isinstance(parts, list) or len(parts) != size:
+        raise InvalidParam('Invalid cursor')
+    return parts
+
+
+def parse_limit(value, default=None, maximum=DEFAULT_MAX_LIMIT):
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidParam('limit must be an integer')
+    if limit < 1:
+        raise InvalidParam('limit must be positive')
+    return min(limit, maximum)
+
+
+def parse_date(value, name):
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidParam(f'{name} must be a YYYY-MM-DD date')
+
+
+def parse_datetime(value, name):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise InvalidParam(f'{name} must be an ISO date or datetime')
+
+
+def parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidParam(f'{name} must be an integer')
+
+
+def parse_choices(value, name, allowed):
+    # Accepts a single value or a comma separated list
+    values = [v.strip() for v in value.split(',') if v.strip()]
+    for v in values:
+        if v not in allowed:
+            raise InvalidParam(f"Invalid {name}: {v}")
+    if not values:
+        raise InvalidParam(f"Invalid {name}")
+    return values
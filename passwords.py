@@ -0,0 +1,282 @@
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing off the request threads.
+#
+# Hashes are deliberately slow, so a login storm (shift change: hundreds of
+# technicians at once) would otherwise keep every server thread busy hashing
+# and starve all other routes. Hashing and verification run in a small
+# process pool per server worker; at most PASSWORD_POOL_WORKERS run at once
+# and up to PASSWORD_QUEUE_SIZE more wait. Past that, or when a job has
+# waited PASSWORD_QUEUE_TIMEOUT seconds without starting, PasswordBusy is
+# raised and the app answers 503 with Retry-After.
+#
+# PASSWORD_POOL_WORKERS=0 hashes in the request thread (tests, scripts).
+# Unset, the CPU cores are shared between the server workers (at least one
+# process each); if you set it, keep SERVER_WORKERS x PASSWORD_POOL_WORKERS at
+# or below the cores.
+#
+# PASSWORD_HASH_METHOD / PASSWORD_SALT_LENGTH are werkzeug's method and salt
+# length ('scrypt', 'pbkdf2:sha256:600000', ...). Changing them takes effect
+# for existing users on their next successful login, when the stored hash is
+# replaced with one made with the current parameters.
+#
+# Login attempts are throttled per account (email) and per client address
+# with in-memory token buckets, per server worker process: each key gets
+# *_BURST attempts, then one more every *_REFILL seconds. The per-address
+# burst is large because a whole shift may log in from one NAT address.
+# LOGIN_THROTTLE=0 turns throttling off (benchmarks).
+
+HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+SALT_LENGTH = int(os.getenv('PASSWORD_SALT_LENGTH', 16))
+
+
+def default_pool_workers(server_workers=None):
+    cores = os.cpu_count() or 1
+    return max(1, cores // (server_workers or int(os.getenv('SERVER_WORKERS') or cores)))
+
+
+POOL_WORKERS = int(os.getenv('PASSWORD_POOL_WORKERS') or default_pool_workers())
+QUEUE_SIZE = int(os.getenv('PASSWORD_QUEUE_SIZE', 64))
+QUEUE_TIMEOUT = float(os.getenv('PASSWORD_QUEUE_TIMEOUT', 3))
+# Upper bound on one hash once started; only hit if the pool is wedged
+RUN_TIMEOUT = float(os.getenv('PASSWORD_RUN_TIMEOUT', 10))
+
+THROTTLE = os.getenv('LOGIN_THROTTLE', '1').lower() in ('1', 'true', 'yes')
+ACCOUNT_BURST = int(os.getenv('LOGIN_ACCOUNT_BURST', 5))
+ACCOUNT_REFILL = float(os.getenv('LOGIN_ACCOUNT_REFILL', 30))
+ADDRESS_BURST = int(os.getenv('LOGIN_IP_BURST', 300))
+ADDRESS_REFILL = float(os.getenv('LOGIN_IP_REFILL', 0.1))
+
+
+class PasswordBusy(Exception):
+    pass
+
+
+# --- Run in the pool processes (top-level so they can be pickled) ---
+
+_EXPIRED = 'expired'
+
+
+@functools.lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug expands defaults ('scrypt' -> 'scrypt:32768:8:1'); once per process
+    return generate_password_hash('', method, 1).split('$', 1)[0]
+
+
+def needs_rehash(pwhash, method, salt_length):
+    parts = pwhash.split('$')
+    if len(parts) != 3:
+        return True
+    return parts[0] != _method_prefix(method) or len(parts[1]) != salt_length
+
+
+def _hash(password, method, salt_length, deadline):
+    if time.time() > deadline:
+        return _EXPIRED
+    return generate_password_hash(password, method, salt_length)
+
+
+def _verify(pwhash, password, method, salt_length, deadline):
+    # -> (ok, new hash or None); the rehash rides along in the same job
+    if time.time() > deadline:
+        return _EXPIRED
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if needs_rehash(pwhash, method, salt_length):
+        return True, generate_password_hash(password, method, salt_length)
+    return True, None
+
+
+# --- Pool ---
+
+def _context():
+    # Never plain fork: the server workers are multi-threaded
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+class PasswordPool:
+    def __init__(self, workers=POOL_WORKERS, queue_size=QUEUE_SIZE, queue_timeout=QUEUE_TIMEOUT,
+                 run_timeout=RUN_TIMEOUT, method=HASH_METHOD, salt_length=SALT_LENGTH):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.run_timeout = run_timeout
+        self.method = method
+        self.salt_length = salt_length
+        self.stats = {
+            'hashed': 0,
+            'verified': 0,
+            'rehashed': 0,    # logins that upgraded a hash to the current parameters
+            'busy': 0,        # rejected at once: workers and queue full
+            'expired': 0,     # waited past queue_timeout without starting
+            'wait_time': 0.0, # seconds callers spent waiting for results
+        }
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._pid = None
+        self._executor = None
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _get_executor(self):
+        # Created lazily and again after a fork (the pool processes belong to the parent)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=_context())
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_size:
+                self.stats['busy'] += 1
+                raise PasswordBusy("Password queue is full")
+            self._pending += 1
+        deadline = time.time() + self.queue_timeout
+        start = time.monotonic()
+        try:
+            if self.workers <= 0:
+                result = fn(*args, deadline)
+            else:
+                future = self._get_executor().submit(fn, *args, deadline)
+                try:
+                    result = future.result(timeout=self.queue_timeout + self.run_timeout)
+                except concurrent.futures.TimeoutError:
+                    future.cancel()
+                    result = _EXPIRED
+                except BrokenProcessPool:
+                    # A pool process died (OOM killer...): start a fresh pool next time
+                    with self._lock:
+                        self._pid = None
+                    raise
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.stats['wait_time'] += time.monotonic() - start
+        if result == _EXPIRED:
+            self._count('expired')
+            raise PasswordBusy(f"Password check did not start within {self.queue_timeout}s")
+        return result
+
+    def hash_password(self, password):
+        self._count('hashed')
+        return self._run(_hash, password, self.method, self.salt_length)
+
+    def verify_password(self, pwhash, password):
+        # -> (ok, new_hash): new_hash is set when pwhash used outdated parameters
+        self._count('verified')
+        ok, new_hash = self._run(_verify, pwhash, password, self.method, self.salt_length)
+        if new_hash is not None:
+            self._count('rehashed')
+        return ok, new_hash
+
+    def close(self):
+        with self._lock:
+            executor = self._executor if self._pid == os.getpid() else None
+            self._executor = None
+            self._pid = None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def status(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['queue_depth'] = max(self._pending - max(self.workers, 0), 0)
+            stats['in_flight'] = self._pending
+        stats['workers'] = self.workers
+        stats['queue_size'] = self.queue_size
+        return stats
+
+
+# --- Attempt throttling ---
+
+class TokenBucket:
+    def __init__(self, burst, refill, max_keys=100000):
+        self.burst = burst
+        self.refill = refill
+        self.max_keys = max_keys
+        self._buckets = {}   # key -> (tokens, monotonic time of last update)
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        # -> 0 when allowed, else seconds until the next attempt is
+        if self.burst <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) / self.refill)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) * self.refill
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # Full buckets carry no state; if that isn't enough, start over
+        full = [k for k, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) / self.refill >= self.burst]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) > self.max_keys:
+            self._buckets.clear()
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class LoginThrottle:
+    def __init__(self, enabled=THROTTLE):
+        self.enabled = enabled
+        self.accounts = TokenBucket(ACCOUNT_BURST, ACCOUNT_REFILL)
+        self.addresses = TokenBucket(ADDRESS_BURST, ADDRESS_REFILL)
+        self.stats = {'throttled': 0}
+        self._lock = threading.Lock()
+
+    def check(self, email, address):
+        # -> seconds to wait (0 = go ahead); a blocked address spends no account tokens
+        if not self.enabled:
+            return 0
+        wait = self.addresses.take(address or '')
+        if not wait:
+            wait = self.accounts.take((email or '').strip().lower())
+        if wait:
+            with self._lock:
+                self.stats['throttled'] += 1
+        return wait
+
+    def clear(self):
+        self.accounts.clear()
+        self.addresses.clear()
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+pool = PasswordPool()
+throttle = LoginThrottle()
+
+
+def hash_password(password):
+    return pool.hash_password(password)
+
+
+def verify_password(pwhash, password):
+    return pool.verify_password(pwhash, password)
@@ -0,0 +1,418 @@
+import argparse
+import atexit
+import glob
+import html
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+import db
+import instrumentation
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+# Development / staging query profiler.
+#
+#   PROFILER_ENABLED=1 python app.py
+#   python profiler.py report profiles/*.json --html profile.html
+#
+# Records every SQL statement of every request (through the instrumentation
+# wrappers) and looks for:
+# - N+1 patterns: one statement shape run PROFILER_N_PLUS_ONE or more times in
+#   a single request (executemany counts once);
+# - slow statements: over PROFILER_SLOW_MS. These get an EXPLAIN FORMAT=JSON
+#   (once per shape per process, on a separate pooled connection), flagged for
+#   full table / index scans, filesorts and temporary tables.
+# Findings are logged, summarised in an X-Profiler response header and
+# aggregated per endpoint into PROFILER_REPORT_DIR/profile-<pid>.json (one file
+# per worker; `report` merges them and renders HTML).
+#
+# Tests: with PROFILER_ENABLED=1 set before the app is imported, the
+# `query_budget` pytest fixture (load this module as a plugin) fails a test
+# when a request inside its block runs more statements than allowed:
+#
+#   def test_request_listing(client, query_budget):
+#       with query_budget(4):
+#           client.get('/api/requests')
+#
+# Adds a round trip per slow shape and per-statement bookkeeping, so keep it
+# out of production.
+
+ENABLED = os.getenv('PROFILER_ENABLED', '0').lower() in ('1', 'true', 'yes')
+SLOW_MS = float(os.getenv('PROFILER_SLOW_MS', 100))
+N_PLUS_ONE = int(os.getenv('PROFILER_N_PLUS_ONE', 5))
+REPORT_DIR = os.getenv('PROFILER_REPORT_DIR', 'profiles')
+WRITE_INTERVAL = 10.0
+
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+TRANSACTION_CONTROL = ('START TRANSACTION', 'COMMIT', 'ROLLBACK')
+
+log = logging.getLogger(__name__)
+
+
+# --- Analysis ---
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def shape(sql):
+    # Statement with literals and placeholder lists collapsed, so repeats match
+    sql = _SPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _LIST.sub('(...)', sql)
+
+
+def plan_flags(plan):
+    # Walk EXPLAIN FORMAT=JSON output for the patterns worth a look
+    flags = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            access = node.get('access_type')
+            if access == 'ALL':
+                flags.add(f"full scan: {node.get('table_name')}")
+            elif access == 'index':
+                flags.add(f"full index scan: {node.get('table_name')}")
+            if node.get('using_filesort'):
+                flags.add('filesort')
+            if node.get('using_temporary_table'):
+                flags.add('temporary table')
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(plan)
+    return sorted(flags)
+
+
+def analyse(statements, n_plus_one=N_PLUS_ONE, slow_ms=SLOW_MS):
+    # statements: RequestStats.statements -> (repeated, slow)
+    #   repeated: [(shape, count, total_ms)], slow: [(shape, sql, params, ms)]
+    counts = {}
+    slow = []
+    for sql, params, elapsed, many in statements:
+        if not sql or sql in TRANSACTION_CONTROL:
+            continue
+        key = shape(sql)
+        count, total = counts.get(key, (0, 0.0))
+        counts[key] = (count + 1, total + elapsed * 1000)
+        if elapsed * 1000 >= slow_ms and not many and key.split(' ', 1)[0].upper() in EXPLAINABLE:
+            slow.append((key, sql, params, elapsed * 1000))
+    repeated = [(key, count, total) for key, (count, total) in counts.items() if count >= n_plus_one]
+    return repeated, slow
+
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+
+def explain(key, sql, params):
+    # -> (plan, flags) for the shape, from cache after the first call
+    with _plans_lock:
+        if key in _plans:
+            return _plans[key]
+    pool = db.get_pool()
+    try:
+        conn = pool.checkout()
+    except Exception as e:
+        # PoolTimeout and the like: the profiled response must not fail, and
+        # the plan is worth another try next time (not cached)
+        return {'error': str(e)}, []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("EXPLAIN FORMAT=JSON " + sql, params)
+        plan = json.loads(cursor.fetchone()[0])
+        cursor.close()
+        result = (plan, plan_flags(plan))
+    except Exception as e:
+        result = ({'error': str(e)}, [])
+    finally:
+        pool.release(conn)
+    with _plans_lock:
+        _plans[key] = result
+    return result
+
+
+# --- Per-endpoint report ---
+
+class Report:
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        self._last_write = time.monotonic()
+
+    def add(self, name, stats, repeated, slow):
+        # -> findings not seen before for this endpoint (to log once)
+        new = []
+        with self._lock:
+            entry = self.endpoints.setdefault(name, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+                'n_plus_one': {}, 'slow': {},
+            })
+            entry['requests'] += 1
+            entry['queries'] += stats.queries
+            entry['max_queries'] = max(entry['max_queries'], stats.queries)
+            entry['db_ms'] += stats.db_time * 1000
+            for key, count, total in repeated:
+                finding = entry['n_plus_one'].get(key)
+                if finding is None:
+                    finding = entry['n_plus_one'][key] = {'requests': 0, 'max_count': 0, 'total_ms': 0.0}
+                    new.append(f"N+1 in {name}: {count}x {key}")
+                finding['requests'] += 1
+                finding['max_count'] = max(finding['max_count'], count)
+                finding['total_ms'] += total
+            for key, sql, params, ms, plan, flags in slow:
+                finding = entry['slow'].get(key)
+                if finding is None:
+                    finding = entry['slow'][key] = {'count': 0, 'max_ms': 0.0, 'total_ms': 0.0,
+                                                    'flags': flags, 'plan': plan,
+                                                    'example_params': _jsonable(params)}
+                    new.append(f"Slow statement in {name} ({ms:.0f} ms{'; ' + ', '.join(flags) if flags else ''}): "
+                               f"{key}")
+                finding['count'] += 1
+                finding['max_ms'] = max(finding['max_ms'], ms)
+                finding['total_ms'] += ms
+        return new
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self.endpoints))
+
+    def write(self, directory=None):
+        directory = REPORT_DIR if directory is None else directory
+        if not directory or not self.endpoints:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"profile-{os.getpid()}.json")
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'pid': os.getpid(), 'slow_ms': SLOW_MS, 'n_plus_one': N_PLUS_ONE,
+                       'endpoints': self.snapshot()}, f, indent=1, sort_keys=True)
+        os.replace(path + '.tmp', path)
+        self._last_write = time.monotonic()
+        return path
+
+    def maybe_write(self):
+        if time.monotonic() - self._last_write > WRITE_INTERVAL:
+            try:
+                self.write()
+            except OSError:
+                log.exception("Could not write the profiler report")
+
+
+def _jsonable(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: str(v) for k, v in params.items()}
+    return [v if isinstance(v, (int, float, str, type(None))) else str(v) for v in params]
+
+
+report = Report()
+
+
+# --- Request hook ---
+
+# capture() blocks active in each thread; a request only reports to its own thread's
+_local = threading.local()
+
+
+def _collectors():
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    return collectors
+
+
+def _profile_request(response):
+    stats = g.get('request_stats')
+    if stats is None or stats.statements is None:
+        return response
+    repeated, slow = analyse(stats.statements)
+    slow = [(key, sql, params, ms) + explain(key, sql, params) for key, sql, params, ms in slow]
+    name = f"{request.method} {stats.endpoint}"
+    for message in report.add(name, stats, repeated, slow):
+        log.warning(message)
+    if repeated or slow:
+        response.headers['X-Profiler'] = f"n+1={len(repeated)}, slow={len(slow)}"
+    for collected in _collectors():
+        collected.append({'endpoint': name, 'path': request.full_path.rstrip('?'),
+                          'queries': stats.queries, 'statements': list(stats.statements),
+                          'n_plus_one': repeated})
+    report.maybe_write()
+    return response
+
+
+def init_app(app):
+    if not ENABLED:
+        return
+    instrumentation.capture_statements = True
+    instrumentation.init_app(app, force=True)
+    app.after_request(_profile_request)
+    atexit.register(report.write)
+
+
+# --- Query budgets ---
+
+@contextmanager
+def capture():
+    # Requests handled in this thread inside the block, as dicts
+    collected = []
+    _collectors().append(collected)
+    try:
+        yield collected
+    finally:
+        _collectors().remove(collected)
+
+
+def budget_violations(collected, max_queries, allow_n_plus_one=False):
+    problems = []
+    for item in collected:
+        if item['queries'] > max_queries:
+            listing = '\n'.join(f"    {shape(sql)}" for sql, _, _, _ in item['statements'] if sql)
+            problems.append(f"{item['path']} ran {item['queries']} statements (budget {max_queries}):\n{listing}")
+        if not allow_n_plus_one:
+            for key, count, _ in item['n_plus_one']:
+                problems.append(f"{item['path']} repeats {count}x: {key}")
+    return problems
+
+
+if pytest is not None:
+    @pytest.fixture
+    def query_budget():
+        if not instrumentation.capture_statements:
+            pytest.fail("query_budget needs PROFILER_ENABLED=1 before the app is imported")
+
+        @contextmanager
+        def budget(max_queries, allow_n_plus_one=False):
+            with capture() as collected:
+                yield collected
+            problems = budget_violations(collected, max_queries, allow_n_plus_one)
+            if problems:
+                pytest.fail('\n'.join(problems), pytrace=False)
+
+        return budget
+
+
+# --- Report CLI ---
+
+def merge(paths):
+    merged = {}
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        for name, entry in data['endpoints'].items():
+            target = merged.setdefault(name, {'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+                                              'n_plus_one': {}, 'slow': {}})
+            target['requests'] += entry['requests']
+            target['queries'] += entry['queries']
+            target['max_queries'] = max(target['max_queries'], entry['max_queries'])
+            target['db_ms'] += entry['db_ms']
+            for key, finding in entry['n_plus_one'].items():
+                t = target['n_plus_one'].setdefault(key, {'requests': 0, 'max_count': 0, 'total_ms': 0.0})
+                t['requests'] += finding['requests']
+                t['max_count'] = max(t['max_count'], finding['max_count'])
+                t['total_ms'] += finding['total_ms']
+            for key, finding in entry['slow'].items():
+                t = target['slow'].setdefault(key, dict(finding, count=0, max_ms=0.0, total_ms=0.0))
+                t['count'] += finding['count']
+                t['max_ms'] = max(t['max_ms'], finding['max_ms'])
+                t['total_ms'] += finding['total_ms']
+    return merged
+
+
+def _by_db_time(endpoints):
+    return sorted(endpoints.items(), key=lambda item: item[1]['db_ms'], reverse=True)
+
+
+def render_text(endpoints):
+    lines = []
+    for name, e in _by_db_time(endpoints):
+        avg = e['queries'] / e['requests'] if e['requests'] else 0
+        lines.append(f"{name}: {e['requests']} requests, {avg:.1f} queries avg (max {e['max_queries']}), "
+                     f"{e['db_ms'] / max(e['requests'], 1):.1f} ms DB avg")
+        for key, f in sorted(e['n_plus_one'].items(), key=lambda kv: -kv[1]['total_ms']):
+            lines.append(f"  N+1  up to {f['max_count']}x in {f['requests']} requests: {key}")
+        for key, f in sorted(e['slow'].items(), key=lambda kv: -kv[1]['total_ms']):
+            flags = f"  [{', '.join(f['flags'])}]" if f['flags'] else ''
+            lines.append(f"  SLOW {f['count']}x, max {f['max_ms']:.0f} ms{flags}: {key}")
+    return '\n'.join(lines)
+
+
+def render_html(endpoints):
+    esc = html.escape
+    parts = ["<!doctype html><meta charset='utf-8'><title>Query profile</title>",
+             "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:1em}"
+             "td,th{border:1px solid #ccc;padding:4px 8px;text-align:left;vertical-align:top}"
+             "code{white-space:pre-wrap}.flag{color:#b00}</style>",
+             "<h1>Query profile</h1>",
+             "<table><tr><th>Endpoint</th><th>Requests</th><th>Avg queries</th><th>Max queries</th>"
+             "<th>Avg DB ms</th><th>N+1</th><th>Slow</th></tr>"]
+    ranked = _by_db_time(endpoints)
+    for name, e in ranked:
+        n = max(e['requests'], 1)
+        parts.append(f"<tr><td><a href='#{esc(name)}'>{esc(name)}</a></td><td>{e['requests']}</td>"
+                     f"<td>{e['queries'] / n:.1f}</td><td>{e['max_queries']}</td><td>{e['db_ms'] / n:.1f}</td>"
+                     f"<td>{len(e['n_plus_one'])}</td><td>{len(e['slow'])}</td></tr>")
+    parts.append("</table>")
+    for name, e in ranked:
+        if not e['n_plus_one'] and not e['slow']:
+            continue
+        parts.append(f"<h2 id='{esc(name)}'>{esc(name)}</h2>")
+        if e['n_plus_one']:
+            parts.append("<table><tr><th>Repeats</th><th>Requests</th><th>Total ms</th><th>Statement</th></tr>")
+            for key, f in sorted(e['n_plus_one'].items(), key=lambda kv: -kv[1]['total_ms']):
+                parts.append(f"<tr><td>{f['max_count']}</td><td>{f['requests']}</td><td>{f['total_ms']:.1f}</td>"
+                             f"<td><code>{esc(key)}</code></td></tr>")
+            parts.append("</table>")
+        for key, f in sorted(e['slow'].items(), key=lambda kv: -kv[1]['total_ms']):
+            flags = ''.join(f"<div class='flag'>{esc(flag)}</div>" for flag in f['flags'])
+            parts.append(f"<table><tr><th>Slow: {f['count']}x, max {f['max_ms']:.0f} ms</th></tr>"
+                         f"<tr><td><code>{esc(key)}</code>{flags}</td></tr>"
+                         f"<tr><td><details><summary>Plan</summary><code>{esc(json.dumps(f['plan'], indent=2))}"
+                         f"</code></details></td></tr></table>")
+    return '\n'.join(parts)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Merge and render query profiler reports")
+    sub = parser.add_subparsers(dest='command', required=True)
+    rep = sub.add_parser('report')
+    rep.add_argument('files', nargs='*', help=f"default: {REPORT_DIR}/profile-*.json")
+    rep.add_argument('--html', metavar='FILE', help="also write an HTML report")
+    rep.add_argument('--json', metavar='FILE', help="also write the merged JSON")
+    args = parser.parse_args(argv)
+
+    paths = args.files or sorted(glob.glob(os.path.join(REPORT_DIR, 'profile-*.json')))
+    if not paths:
+        print("No profiler reports found.")
+        return 1
+    endpoints = merge(paths)
+    print(render_text(endpoints))
+    if args.html:
+        with open(args.html, 'w') as f:
+            f.write(render_html(endpoints))
+        print(f"\nHTML report written to {args.html}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(endpoints, f, indent=1, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
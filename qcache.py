@@ -0,0 +1,187 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import table_versions
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# Result cache for the heavy read queries (equipment listing / detail, request
+# listing). Entries are keyed by query shape, parameters and visibility scope,
+# and tagged with the tables they read.
+#
+# Tags are the TableVersion counters: the current version of every tag is part
+# of the key, so invalidate() makes every worker process miss at once.
+# Superseded entries are never read again and age out through LRU / TTL.
+# Writers call invalidate() after they commit: inside the transaction the bump
+# would hold the tag's TableVersion row lock, which every writer of that table
+# needs, until commit. A reader between the commit and the bump can still get
+# the previous entry for that moment.
+#
+# A tag need not be a table name: request listings are tagged per visibility
+# scope as well (queries.request_scope_tags), so a card move only misses for
+# the users who can see that card.
+#
+#   QUERY_CACHE_BACKEND=lru     per-process LRU (default)
+#   QUERY_CACHE_BACKEND=redis   shared Redis-compatible server (QUERY_CACHE_REDIS_URL)
+#   QUERY_CACHE_BACKEND=off     always miss
+
+BACKEND = os.getenv('QUERY_CACHE_BACKEND', 'lru')
+CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 1024))
+CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 300))
+REDIS_URL = os.getenv('QUERY_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+KEY_PREFIX = 'mechcare:qc:'
+
+log = logging.getLogger(__name__)
+
+
+class LRUBackend:
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    # Values are pickled rows; eviction is Redis' own (maxmemory-policy allkeys-lru)
+    def __init__(self, url=REDIS_URL):
+        if redis is None:
+            raise RuntimeError("QUERY_CACHE_BACKEND=redis needs the 'redis' package")
+        self.client = redis.Redis.from_url(url)
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self.client.get(KEY_PREFIX + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.set(KEY_PREFIX + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def clear(self):
+        for key in self.client.scan_iter(KEY_PREFIX + '*'):
+            self.client.delete(key)
+
+    def size(self):
+        return None
+
+    def server_evictions(self):
+        return self.client.info('stats').get('evicted_keys', 0)
+
+
+class QueryCache:
+    def __init__(self, backend, ttl=CACHE_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0, 'invalidations': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def make_key(shape, params, scope, versions):
+        raw = repr((shape, tuple(params), scope, sorted((t, v[0]) for t, v in versions.items())))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def fetch(self, cursor, tags, shape, params, scope, compute):
+        # compute() -> value to cache; only called on a miss.
+        # Cached values are shared between requests: callers must not mutate them.
+        if self.backend is None:
+            self._count('misses')
+            return compute()
+        versions = table_versions.get_versions(cursor, tags)
+        key = self.make_key(shape, params, scope, versions)
+        value = self.lookup(key)
+        if value is not None:
+            return value
+        value = compute()
+        self.store(key, value)
+        return value
+
+    # fetch() in two halves, for callers that compute the value themselves (asgi_app.py)
+    def lookup(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception:
+            # A cache outage degrades to uncached reads
+            self._count('errors')
+            log.exception("Query cache read failed")
+            value = None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def store(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+            self._count('stores')
+        except Exception:
+            self._count('errors')
+            log.exception("Query cache write failed")
+
+    def invalidate(self, cursor, *tags):
+        # After the writer's commit (autocommit: each bump is its own short statement)
+        table_versions.bump(cursor, *tags)
+        self._count('invalidations')
+
+    def status(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats['backend'] = BACKEND
+        stats['evictions'] = getattr(self.backend, 'evictions', 0)
+        if isinstance(self.backend, RedisBackend):
+            try:
+                stats['evictions'] = self.backend.server_evictions()
+            except Exception:
+                stats['evictions'] = None
+        stats['entries'] = self.backend.size() if self.backend is not None else 0
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
+
+
+def _make_backend(name):
+    if name == 'off':
+        return None
+    if name == 'redis':
+        return RedisBackend()
+    return LRUBackend()
+
+
+cache = QueryCache(_make_backend(BACKEND))
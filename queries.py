@@ -0,0 +1,281 @@
+from pagination import (InvalidParam, encode_cursor, decode_cursor, parse_date, parse_datetime, parse_int,
+                        parse_choices)
+
+# SQL for the listing endpoints, shared by the Flask views (app.py) and the
+# async API (asgi_app.py). Everything here is pure: functions take the query
+# string (any mapping with .get / []) and the caller's identity and return
+# (sql, params) with %s placeholders; callers run them on their own
+# connections. Bad input raises pagination.InvalidParam.
+
+REQUEST_STAGES = ('New', 'In Progress', 'Repaired', 'Scrap')
+
+REQUEST_TYPES = ('Corrective', 'Preventive')
+
+# One Kanban card: the request listing row, also sent in change events
+REQUEST_CARD_QUERY = """
+    SELECT r.*, r.description, e.name as equipment_name, e.location as equipment_location, t.name as technician_name, t.avatar_url, m.team_name, ec.name as category_name, u.name as created_by_name
+    FROM MaintenanceRequest r
+    JOIN Equipment e ON r.equipment_id = e.id
+    LEFT JOIN EquipmentCategory ec ON e.category_id = ec.id
+    LEFT JOIN Technician t ON r.technician_id = t.id
+    LEFT JOIN MaintenanceTeam m ON r.team_id = m.id
+    LEFT JOIN User u ON r.created_by_user_id = u.id
+"""
+
+
+def request_scope_conditions(ident, alias='r'):
+    # Visibility rules for MaintenanceRequest rows, shared by every listing.
+    # ident: identity.load_identity() result for the session user
+    conditions = []
+    params = []
+    if ident['role'] == 'Company User':
+        conditions.append(f"{alias}.created_by_user_id = %s")
+        params.append(ident['user']['id'])
+    elif ident['role'] == 'Technician':
+        # User's team and technician ID come from the cached identity
+        if ident['technician_id']:
+            if ident['team_id']:
+                # Restrict to Team OR Self
+                conditions.append(f"({alias}.team_id = %s OR {alias}.technician_id = %s)")
+                params.extend([ident['team_id'], ident['technician_id']])
+            # Teamless -> Show ALL (Global View for new/unassigned techs)
+        else:
+            conditions.append("1=0")  # No tech record found
+    return conditions, params
+
+
+def request_scope_tags(ident):
+    # Query cache tags (qcache.py) for one visibility scope; mirrors
+    # request_scope_conditions. A listing is tagged with 'MaintenanceRequest'
+    # (bulk changes: cascades, rebuilds) plus these, so moving a card only
+    # invalidates the scopes that can see it (request_change_tags).
+    if ident['role'] == 'Company User':
+        return [f"MaintenanceRequest:user:{ident['user']['id']}"]
+    if ident['role'] == 'Technician':
+        if not ident['technician_id']:
+            return []
+        if ident['team_id']:
+            return [f"MaintenanceRequest:team:{ident['team_id']}",
+                    f"MaintenanceRequest:technician:{ident['technician_id']}"]
+    return ['MaintenanceRequest:all']
+
+
+def request_change_tags(rows):
+    # Tags to bump when these MaintenanceRequest rows change (pass the old and
+    # new versions; None for a side that doesn't exist)
+    tags = {'MaintenanceRequest:all'}
+    for row in rows:
+        if row is None:
+            continue
+        if row.get('created_by_user_id'):
+            tags.add(f"MaintenanceRequest:user:{row['created_by_user_id']}")
+        if row.get('team_id'):
+            tags.add(f"MaintenanceRequest:team:{row['team_id']}")
+        if row.get('technician_id'):
+            tags.add(f"MaintenanceRequest:technician:{row['technician_id']}")
+    return sorted(tags)
+
+
+def request_filter_conditions(args, alias='r'):
+    # Optional filters from the query string; raises InvalidParam on bad input
+    conditions = []
+    params = []
+    if args.get('equipment_id'):
+        conditions.append(f"{alias}.equipment_id = %s")
+        params.append(parse_int(args['equipment_id'], 'equipment_id'))
+    if args.get('date'):
+        conditions.append(f"{alias}.scheduled_date = %s")
+        params.append(parse_date(args['date'], 'date'))
+    if args.get('from'):
+        conditions.append(f"{alias}.scheduled_date >= %s")
+        params.append(parse_date(args['from'], 'from'))
+    if args.get('to'):
+        conditions.append(f"{alias}.scheduled_date <= %s")
+        params.append(parse_date(args['to'], 'to'))
+    if args.get('created_from'):
+        conditions.append(f"{alias}.created_at >= %s")
+        params.append(parse_datetime(args['created_from'], 'created_from'))
+    if args.get('created_to'):
+        conditions.append(f"{alias}.created_at <= %s")
+        params.append(parse_datetime(args['created_to'], 'created_to'))
+    for key, allowed in (('stage', REQUEST_STAGES), ('request_type', REQUEST_TYPES)):
+        if args.get(key):
+            values = parse_choices(args[key], key, allowed)
+            conditions.append(f"{alias}.{key} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+    for key in ('team_id', 'technician_id'):
+        if args.get(key):
+            conditions.append(f"{alias}.{key} = %s")
+            params.append(parse_int(args[key], key))
+    return conditions, params
+
+
+EQUIPMENT_TYPES = ('Machine', 'Vehicle', 'Computer')
+
+
+def equipment_filter_conditions(args, alias='e'):
+    conditions = []
+    params = []
+    if args.get('id'):
+        conditions.append(f"{alias}.id = %s")
+        params.append(parse_int(args['id'], 'id'))
+    if args.get('equipment_type'):
+        values = parse_choices(args['equipment_type'], 'equipment_type', EQUIPMENT_TYPES)
+        conditions.append(f"{alias}.equipment_type IN ({', '.join(['%s'] * len(values))})")
+        params.extend(values)
+    if args.get('department'):
+        conditions.append(f"{alias}.department = %s")
+        params.append(args['department'])
+    if args.get('maintenance_team_id'):
+        conditions.append(f"{alias}.maintenance_team_id = %s")
+        params.append(parse_int(args['maintenance_team_id'], 'maintenance_team_id'))
+    if args.get('is_scrapped'):
+        value = args['is_scrapped'].lower()
+        if value not in ('0', '1', 'true', 'false'):
+            raise InvalidParam('is_scrapped must be true or false')
+        conditions.append(f"{alias}.is_scrapped = %s")
+        params.append(value in ('1', 'true'))
+    if args.get('purchased_from'):
+        conditions.append(f"{alias}.purchase_date >= %s")
+        params.append(parse_date(args['purchased_from'], 'purchased_from'))
+    if args.get('purchased_to'):
+        conditions.append(f"{alias}.purchase_date <= %s")
+        params.append(parse_date(args['purchased_to'], 'purchased_to'))
+    return conditions, params
+
+
+def log_filter_conditions(args, alias='l'):
+    conditions = []
+    params = []
+    for key in ('user_id', 'target_id'):
+        if args.get(key):
+            conditions.append(f"{alias}.{key} = %s")
+            params.append(parse_int(args[key], key))
+    for key in ('action', 'target_type'):
+        if args.get(key):
+            conditions.append(f"{alias}.{key} = %s")
+            params.append(args[key])
+    if args.get('from'):
+        conditions.append(f"{alias}.timestamp >= %s")
+        params.append(parse_datetime(args['from'], 'from'))
+    if args.get('to'):
+        conditions.append(f"{alias}.timestamp <= %s")
+        params.append(parse_datetime(args['to'], 'to'))
+    return conditions, params
+
+
+EQUIPMENT_LIST_QUERY = """
+    SELECT e.*, t.name as technician_name, m.team_name, wc.name as work_center_name, ec.name as category_name,
+    e.open_request_count as open_requests
+    FROM Equipment e
+    LEFT JOIN Technician t ON e.default_technician_id = t.id
+    LEFT JOIN MaintenanceTeam m ON e.maintenance_team_id = m.id
+    LEFT JOIN WorkCenter wc ON e.work_center_id = wc.id
+    LEFT JOIN EquipmentCategory ec ON e.category_id = ec.id
+"""
+
+LOG_LIST_QUERY = """
+    SELECT l.*, u.name as user_name, u.role as user_role
+    FROM AuditLog l
+    LEFT JOIN User u ON l.user_id = u.id
+"""
+
+
+def _in(column, values):
+    return f"{column} IN ({', '.join(['%s'] * len(values))})"
+
+
+def request_list_query(args, scope_conditions, scope_params, limit, search_ids=None):
+    # Request listing page, newest first. search_ids: ranked ids for ?search=;
+    # then every matching row comes back and search_page() orders and pages them
+    query = REQUEST_CARD_QUERY
+    conditions, params = request_filter_conditions(args)
+    if search_ids is not None:
+        conditions.append(_in("r.id", search_ids))
+        params.extend(search_ids)
+        limit = None
+    conditions += scope_conditions
+    params += scope_params
+
+    # Keyset pagination on (created_at, id)
+    if args.get('cursor') and search_ids is None:
+        created_at, last_id = decode_cursor(args['cursor'], 2)
+        created_at = parse_datetime(created_at, 'cursor')
+        last_id = parse_int(last_id, 'cursor')
+        conditions.append("(r.created_at < %s OR (r.created_at = %s AND r.id < %s))")
+        params.extend([created_at, created_at, last_id])
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY r.created_at DESC, r.id DESC"
+    if limit:
+        # Fetch one extra row to know whether another page exists
+        query += " LIMIT %s"
+        params.append(limit + 1)
+    return query, params
+
+
+def equipment_list_query(args, limit, search_ids=None):
+    # Equipment listing page, newest first (keyset on id)
+    query = EQUIPMENT_LIST_QUERY
+    conditions, params = equipment_filter_conditions(args)
+    if search_ids is not None:
+        conditions.append(_in("e.id", search_ids))
+        params.extend(search_ids)
+        limit = None
+    elif args.get('cursor'):
+        last_id, = decode_cursor(args['cursor'], 1)
+        conditions.append("e.id < %s")
+        params.append(parse_int(last_id, 'cursor'))
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY e.id DESC"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit + 1)
+    return query, params
+
+
+def log_list_query(args, limit):
+    # Audit log page, newest first (keyset on timestamp, id)
+    conditions, params = log_filter_conditions(args)
+    if args.get('cursor'):
+        timestamp, last_id = decode_cursor(args['cursor'], 2)
+        timestamp = parse_datetime(timestamp, 'cursor')
+        last_id = parse_int(last_id, 'cursor')
+        conditions.append("(l.timestamp < %s OR (l.timestamp = %s AND l.id < %s))")
+        params.extend([timestamp, timestamp, last_id])
+
+    query = LOG_LIST_QUERY
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY l.timestamp DESC, l.id DESC LIMIT %s"
+    return query, params + [limit + 1]
+
+
+def split_page(rows, limit, *key):
+    # Rows fetched with LIMIT limit + 1 -> (page, cursor for the next page or None)
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(*(rows[-1][k] for k in key))
+    return rows, None
+
+
+def search_page(rows, ranked_ids, args, limit, max_results):
+    # Search listings: every matching row -> (page, next cursor, truncated), in
+    # relevance order. The cursor is the offset into the ranked hits.
+    # truncated: search stopped at max_results candidates, so the last page
+    # may not be the last match (the client should narrow the search)
+    offset = 0
+    if args.get('cursor'):
+        tag, offset = decode_cursor(args['cursor'], 2)
+        offset = parse_int(offset, 'cursor')
+        if tag != 'search' or offset < 0:
+            raise InvalidParam('Invalid cursor')
+    rank = {row_id: i for i, row_id in enumerate(ranked_ids)}
+    rows = sorted(rows, key=lambda row: rank[row['id']])
+    end = offset + limit if limit else len(rows)
+    next_cursor = encode_cursor('search', end) if end < len(rows) else None
+    truncated = next_cursor is None and len(ranked_ids) >= max_results
+    return rows[offset:end], next_cursor, truncated
@@ -1,4 +1,10 @@
+-- Base schema. Later changes (indexes, new columns) live in migrations/;
+-- run `python migrate.py` after loading this file (setup_db.py does both).
+
 -- Drop tables if they exist to start fresh
+DROP TABLE IF EXISTS SchemaMigration;
+DROP TABLE IF EXISTS CriticalEquipmentCounter;
+DROP TABLE IF EXISTS RequestStatCounter;
 DROP TABLE IF EXISTS AuditLog;
 DROP TABLE IF EXISTS MaintenanceRequest;
 DROP TABLE IF EXISTS Equipment;
@@ -91,7 +97,9 @@ CREATE TABLE MaintenanceRequest (
     stage ENUM('New', 'In Progress', 'Repaired', 'Scrap') DEFAULT 'New',
     scheduled_date DATE,
     duration_hours DECIMAL(5, 2),
+    description TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_request_scheduled_date (scheduled_date),
     FOREIGN KEY (equipment_id) REFERENCES Equipment(id) ON DELETE CASCADE,
     FOREIGN KEY (team_id) REFERENCES MaintenanceTeam(id) ON DELETE SET NULL,
     FOREIGN KEY (technician_id) REFERENCES Technician(id) ON DELETE SET NULL,
@@ -109,3 +117,25 @@ CREATE TABLE AuditLog (
     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES User(id) ON DELETE SET NULL
 );
+
+-- Dashboard counters, maintained by the request write paths (see counters.py)
+CREATE TABLE RequestStatCounter (
+    team_id INT NOT NULL DEFAULT 0,
+    created_by_user_id INT NOT NULL DEFAULT 0,
+    stage ENUM('New', 'In Progress', 'Repaired', 'Scrap') NOT NULL,
+    request_type ENUM('Corrective', 'Preventive') NOT NULL,
+    has_technician BOOLEAN NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, created_by_user_id, stage, request_type, has_technician),
+    INDEX idx_stat_counter_creator (created_by_user_id)
+);
+
+CREATE TABLE CriticalEquipmentCounter (
+    team_id INT NOT NULL DEFAULT 0,
+    created_by_user_id INT NOT NULL DEFAULT 0,
+    equipment_id INT NOT NULL,
+    request_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, created_by_user_id, equipment_id),
+    INDEX idx_critical_counter_creator (created_by_user_id),
+    INDEX idx_critical_counter_equipment (equipment_id)
+);
@@ -0,0 +1,157 @@
+import os
+import re
+
+# Indexed search over equipment and maintenance requests.
+#
+# Each way of matching is its own index-driven branch (FULLTEXT on the text
+# columns, prefix LIKE on serial_number / name B-tree indexes) and the branches
+# are merged with UNION ALL. A single WHERE with MATCH ... OR LIKE would make
+# MySQL fall back to a full table scan.
+
+# Candidates ranked per search; listings page through these and flag the last
+# page with X-Search-Truncated when the cap was hit
+MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 200))
+DEFAULT_LIMIT = 20
+# InnoDB ignores shorter words (innodb_ft_min_token_size); they still hit the prefix branches
+MIN_FULLTEXT_TOKEN = 3
+
+SERIAL_SCORE = 10
+NAME_PREFIX_SCORE = 5
+EQUIPMENT_NAME_SCORE = 1
+
+
+def _tokens(text):
+    return re.findall(r'\w+', text or '')
+
+
+def fulltext_query(text):
+    # '+term*' for every token: all words required, each matched as a prefix
+    words = [w for w in _tokens(text) if len(w) >= MIN_FULLTEXT_TOKEN]
+    return ' '.join(f'+{w}*' for w in words)
+
+
+def like_prefix(text):
+    escaped = (text or '').strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def _equipment_hits(text, limit):
+    # -> (sql, params) yielding (id, score) rows
+    branches = []
+    params = []
+    ft = fulltext_query(text)
+    if ft:
+        branches.append("""
+            (SELECT e.id, MATCH(e.name, e.description) AGAINST (%s IN BOOLEAN MODE) as score
+             FROM Equipment e
+             WHERE MATCH(e.name, e.description) AGAINST (%s IN BOOLEAN MODE)
+             LIMIT %s)
+        """)
+        params.extend([ft, ft, limit])
+    prefix = like_prefix(text)
+    branches.append(f"""
+        (SELECT e.id, {SERIAL_SCORE} as score FROM Equipment e WHERE e.serial_number LIKE %s LIMIT %s)
+    """)
+    params.extend([prefix, limit])
+    branches.append(f"""
+        (SELECT e.id, {NAME_PREFIX_SCORE} as score FROM Equipment e WHERE e.name LIKE %s LIMIT %s)
+    """)
+    params.extend([prefix, limit])
+    return " UNION ALL ".join(branches), params
+
+
+def _ids(rows):
+    return [row['id'] if isinstance(row, dict) else row[0] for row in rows]
+
+
+def equipment_ids_query(text, limit=None):
+    # (sql, params) for the best-ranked equipment ids, None when nothing can match
+    if not _tokens(text):
+        return None
+    limit = limit or MAX_RESULTS
+    hits, params = _equipment_hits(text, limit)
+    return f"""
+        SELECT id, SUM(score) as score FROM ({hits}) hits
+        GROUP BY id ORDER BY score DESC, id DESC LIMIT %s
+    """, params + [limit]
+
+
+def equipment_ids(cursor, text, limit=None):
+    # Best-ranked equipment ids for `text`
+    query = equipment_ids_query(text, limit)
+    if query is None:
+        return []
+    cursor.execute(*query)
+    return _ids(cursor.fetchall())
+
+
+def request_ids_query(text, scope_conditions=(), scope_params=(), limit=None):
+    # (sql, params) for the best-ranked request ids, restricted to the caller's
+    # scope; None when nothing can match. Matches the subject/description or
+    # the name of the request's equipment.
+    if not _tokens(text):
+        return None
+    limit = limit or MAX_RESULTS
+    scope = "".join(f" AND {c}" for c in scope_conditions)
+    branches = []
+    params = []
+    ft = fulltext_query(text)
+    if ft:
+        branches.append(f"""
+            (SELECT r.id, MATCH(r.subject, r.description) AGAINST (%s IN BOOLEAN MODE) as score
+             FROM MaintenanceRequest r
+             WHERE MATCH(r.subject, r.description) AGAINST (%s IN BOOLEAN MODE){scope}
+             LIMIT %s)
+        """)
+        params.extend([ft, ft, *scope_params, limit])
+
+    eq_hits, eq_params = _equipment_hits(text, limit)
+    branches.append(f"""
+        (SELECT r.id, {EQUIPMENT_NAME_SCORE} as score
+         FROM (SELECT DISTINCT id FROM ({eq_hits}) eh) eq
+         JOIN MaintenanceRequest r ON r.equipment_id = eq.id
+         WHERE 1=1{scope}
+         LIMIT %s)
+    """)
+    params.extend([*eq_params, *scope_params, limit])
+
+    return f"""
+        SELECT id, SUM(score) as score FROM ({" UNION ALL ".join(branches)}) hits
+        GROUP BY id ORDER BY score DESC, id DESC LIMIT %s
+    """, params + [limit]
+
+
+def request_ids(cursor, text, scope_conditions=(), scope_params=(), limit=None):
+    # Best-ranked request ids for `text`, restricted to the caller's scope
+    query = request_ids_query(text, scope_conditions, scope_params, limit)
+    if query is None:
+        return []
+    cursor.execute(*query)
+    return _ids(cursor.fetchall())
+
+
+def fetch_equipment(cursor, ids):
+    if not ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+        SELECT e.id, e.name, e.serial_number, e.equipment_type, e.department, e.location, e.is_scrapped
+        FROM Equipment e WHERE e.id IN ({placeholders})
+    """, list(ids))
+    rows = {row['id']: row for row in cursor.fetchall()}
+    return [rows[i] for i in ids if i in rows]
+
+
+def fetch_requests(cursor, ids):
+    if not ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"""
+        SELECT r.id, r.subject, r.stage, r.request_type, r.scheduled_date, r.equipment_id,
+               e.name as equipment_name
+        FROM MaintenanceRequest r
+        JOIN Equipment e ON r.equipment_id = e.id
+        WHERE r.id IN ({placeholders})
+    """, list(ids))
+    rows = {row['id']: row for row in cursor.fetchall()}
+    return [rows[i] for i in ids if i in rows]
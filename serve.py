@@ -0,0 +1,257 @@
+import argparse
+import logging
+import os
+import signal
+import sys
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Production server: gunicorn, pre-forked workers with a thread pool each.
+#
+#   python serve.py                       start in the foreground
+#   python serve.py --workers 8 --threads 16
+#   python serve.py reload                zero-downtime reload (new code too)
+#   python serve.py stop                  graceful shutdown
+#
+# Needs SECRET_KEY: sessions are signed with it, so every worker and every
+# restart must use the same key (`python -c "import secrets; print(secrets.token_hex(32))"`).
+#
+# The app is imported once in the master (preload) and forked. Nothing opens
+# a connection or starts a thread at import; post_fork drops any pool the
+# master built anyway, and the audit writer, event broker and password pool
+# start their threads / processes on first use in each worker. Workers are
+# replaced after SERVER_MAX_REQUESTS requests (plus jitter, so they don't all
+# recycle at once).
+#
+# Workers are gthread: each /api/events stream holds a thread for as long as
+# the client stays connected (but no database connection). Each worker admits
+# at most SERVER_THREADS - EVENTS_RESERVED_THREADS streams (and never more
+# than EVENTS_MAX_SUBSCRIBERS); the reserved threads stay free for every
+# other route. Keep DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW at or above
+# SERVER_THREADS.
+#
+# SIGTERM (stop) finishes in-flight requests for up to SERVER_GRACEFUL_TIMEOUT,
+# ends event streams at once (browsers reconnect to another worker with
+# Last-Event-ID) and flushes the audit queue. `reload` sends USR2: the master
+# re-executes this script, starting a new master with new workers on the same
+# listening socket; once it has stayed up for SERVER_RELOAD_SETTLE seconds the
+# old master is stopped gracefully. If the new one fails to start, the old one
+# keeps serving. (HUP only restarts workers from the already-loaded code.)
+#
+# Load balancers: GET /readyz (503 when the database is unreachable) and
+# GET /healthz (process is up).
+
+BIND = os.getenv('SERVER_BIND', '0.0.0.0:8000')
+WORKERS = int(os.getenv('SERVER_WORKERS') or os.cpu_count() or 2)
+THREADS = int(os.getenv('SERVER_THREADS', 8))
+MAX_REQUESTS = int(os.getenv('SERVER_MAX_REQUESTS', 5000))
+MAX_REQUESTS_JITTER = int(os.getenv('SERVER_MAX_REQUESTS_JITTER', 500))
+# gthread workers heartbeat from the main thread, so this is not a request time limit
+TIMEOUT = int(os.getenv('SERVER_TIMEOUT', 30))
+GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 30))
+KEEPALIVE = int(os.getenv('SERVER_KEEPALIVE', 5))
+PIDFILE = os.getenv('SERVER_PIDFILE', 'serve.pid')
+# Access log file ('-' for stderr); empty = off (METRICS_LOG_JSON has its own)
+ACCESS_LOG = os.getenv('SERVER_ACCESS_LOG', '') or None
+RELOAD_SETTLE = float(os.getenv('SERVER_RELOAD_SETTLE', 5))
+RELOAD_TIMEOUT = float(os.getenv('SERVER_RELOAD_TIMEOUT', 60))
+
+log = logging.getLogger('mechcare.serve')
+
+
+# --- gunicorn hooks ---
+
+def when_ready(server):
+    server.log.info("MechCare serving on %s: %s workers x %s threads", ', '.join(server.cfg.bind),
+                    server.cfg.workers, server.cfg.threads)
+
+
+def post_fork(server, worker):
+    # Connections must never be shared across processes
+    import db
+    import events
+    db.reset_pool()
+    events.broker.max_subscribers = events.subscriber_cap(server.cfg.threads)
+
+
+def post_worker_init(worker):
+    # Runs after gunicorn installs its signal handlers: end event streams as
+    # soon as shutdown starts, then let gunicorn drain the other requests
+    import events
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(sig, frame):
+        events.broker.close()
+        if callable(previous):
+            previous(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_exit(server, worker):
+    import audit
+    import db
+    import passwords
+    audit.writer.close()
+    passwords.pool.close()
+    db.reset_pool()
+
+
+def options(args):
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'max_requests': MAX_REQUESTS,
+        'max_requests_jitter': MAX_REQUESTS_JITTER,
+        'timeout': TIMEOUT,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+        'keepalive': KEEPALIVE,
+        'pidfile': args.pidfile,
+        'accesslog': ACCESS_LOG,
+        'proc_name': 'mechcare',
+        'when_ready': when_ready,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+        'worker_exit': worker_exit,
+    }
+
+
+def check(args):
+    problems = []
+    if not os.getenv('SECRET_KEY'):
+        problems.append("SECRET_KEY is not set: sessions would not survive restarts or work across workers")
+    elif len(os.getenv('SECRET_KEY')) < 32:
+        log.warning("SECRET_KEY is shorter than 32 characters")
+    import events
+    cap = events.subscriber_cap(args.threads)
+    if cap < 1:
+        problems.append(f"SERVER_THREADS={args.threads} leaves no thread for live event streams "
+                        f"(EVENTS_RESERVED_THREADS={events.RESERVED_THREADS}); raise --threads")
+    elif cap < events.MAX_SUBSCRIBERS:
+        log.info("Live event streams limited to %s per worker (SERVER_THREADS=%s - EVENTS_RESERVED_THREADS=%s)",
+                 cap, args.threads, events.RESERVED_THREADS)
+    import db
+    if db.POOL_SIZE + db.POOL_MAX_OVERFLOW < args.threads:
+        log.warning("DB pool (%s + %s overflow) is smaller than SERVER_THREADS=%s; busy workers will "
+                    "wait for connections", db.POOL_SIZE, db.POOL_MAX_OVERFLOW, args.threads)
+    import passwords
+    cores = os.cpu_count() or 1
+    if os.getenv('PASSWORD_POOL_WORKERS') and args.workers * passwords.pool.workers > cores:
+        log.warning("%s workers x PASSWORD_POOL_WORKERS=%s hashing processes exceed %s cores; login storms "
+                    "will slow every route", args.workers, passwords.pool.workers, cores)
+    return problems
+
+
+def start(args):
+    import passwords
+    if not os.getenv('PASSWORD_POOL_WORKERS'):
+        # Share the cores between however many workers --workers asked for
+        passwords.pool.workers = passwords.default_pool_workers(args.workers)
+    problems = check(args)
+    if problems:
+        for problem in problems:
+            print(f"serve.py: {problem}", file=sys.stderr)
+        return 2
+
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options(args).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from app import app
+            return app
+
+    # USR2 re-executes `python serve.py <same args>`
+    Server().run()
+    return 0
+
+
+# --- Signals to a running master ---
+
+def _read_pid(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+def reload(args):
+    old = _read_pid(args.pidfile)
+    if old is None or not _alive(old):
+        print(f"serve.py: no running server in {args.pidfile}", file=sys.stderr)
+        return 1
+    os.kill(old, signal.SIGUSR2)
+
+    # The old master renames its pidfile to <pidfile>.oldbin; the new one writes <pidfile>
+    deadline = time.monotonic() + RELOAD_TIMEOUT
+    new = None
+    while time.monotonic() < deadline:
+        pid = _read_pid(args.pidfile)
+        if pid and pid != old and _alive(pid):
+            new = pid
+            break
+        time.sleep(0.2)
+    if new is None:
+        print(f"serve.py: new master did not start within {RELOAD_TIMEOUT:g}s; "
+              f"old master {old} keeps serving", file=sys.stderr)
+        return 1
+
+    # A new master that dies while booting its workers (bad code, bad config)
+    # must not take the old one down with it
+    time.sleep(RELOAD_SETTLE)
+    if not _alive(new):
+        print(f"serve.py: new master {new} exited; old master {old} keeps serving", file=sys.stderr)
+        return 1
+    os.kill(old, signal.SIGTERM)
+    print(f"Reloaded: master {old} -> {new}")
+    return 0
+
+
+def stop(args):
+    pid = _read_pid(args.pidfile)
+    if pid is None or not _alive(pid):
+        print(f"serve.py: no running server in {args.pidfile}", file=sys.stderr)
+        return 1
+    os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+    while _alive(pid) and time.monotonic() < deadline:
+        time.sleep(0.2)
+    return 0 if not _alive(pid) else 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run MechCare under gunicorn.")
+    parser.add_argument('command', nargs='?', default='start', choices=['start', 'reload', 'stop'])
+    parser.add_argument('--bind', default=BIND)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--threads', type=int, default=THREADS)
+    parser.add_argument('--pidfile', default=PIDFILE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(name)s: %(message)s')
+    args = parse_args(argv)
+    return {'start': start, 'reload': reload, 'stop': stop}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
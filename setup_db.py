@@ -2,6 +2,8 @@ import mysql.connector
 import os
 from dotenv import load_dotenv
 
+import storage
+
 load_dotenv()
 
 # Config
@@ -11,6 +13,9 @@ DB_PASSWORD = os.getenv('Pme@010607')
 DB_NAME = os.getenv('DB_NAME', 'mechcare_db')
 
 def setup():
+    if storage.BACKEND == 'sqlite':
+        return setup_sqlite()
+
     print(f"Connecting to MySQL at {DB_HOST} as {DB_USER}...")
     
     # 1. Connect to MySQL Server (no DB selected yet)
@@ -44,9 +49,35 @@ def setup():
 
     cnx.commit()
     cursor.close()
+
+    # 5. Bring the schema up to the latest migration
+    print("Applying migrations...")
+    import migrate
+    migrate.apply_pending(cnx)
     cnx.close()
     
-    # 5. Run User Seeding (uses App context)
+    seed_users()
+
+def setup_sqlite():
+    # DB_BACKEND=sqlite: the driver creates the file from schema.sql + migrations/
+    if storage.SQLITE_PATH == ':memory:':
+        print("SQLITE_PATH is :memory:, nothing would be kept. Set it to a file path.")
+        return
+    print(f"Using SQLite database {storage.SQLITE_PATH}...")
+    cnx = storage.get_driver().connect()
+    cursor = cnx.cursor()
+    print("Applying basic seeds...")
+    apply_sql_file(cursor, 'seeds.sql')
+    cursor.close()
+
+    print("Applying migrations...")
+    import migrate
+    migrate.apply_pending(cnx)
+    cnx.close()
+    seed_users()
+
+def seed_users():
+    # 6. Run User Seeding (uses App context)
     print("Seeding Users...")
     import sys
     os.system(f"{sys.executable} seed_users.py")
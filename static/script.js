@@ -3,16 +3,99 @@ let allEquipment = [];
 let allTeams = [];
 let currentUserRole = null; // Will need to be set by the page
 
+/* --- Paged Listings --- */
+// Listings are requested in the compact columnar form ({columns, rows}) and
+// expanded back into one object per row here
+function expandColumnar(payload) {
+    if (Array.isArray(payload)) return payload;
+    const { columns, rows } = payload;
+    return rows.map(values => {
+        const row = {};
+        columns.forEach((col, i) => { row[col] = values[i]; });
+        return row;
+    });
+}
+
+async function fetchRows(path, params = new URLSearchParams()) {
+    params.set('format', 'columnar');
+    const res = await fetch(`${path}?${params.toString()}`);
+    if (!res.ok) throw new Error(`Failed to load ${path}`);
+    return {
+        rows: expandColumnar(await res.json()),
+        next: res.headers.get('X-Next-Cursor'),
+        truncated: res.headers.get('X-Search-Truncated') === '1'
+    };
+}
+
+// Server-side filtered listing, one page per next() call (X-Next-Cursor);
+// pages show the first one and load the rest on "Load more" / scroll
+function pagedListing(path, filters = {}, pageSize = 50) {
+    const params = new URLSearchParams();
+    Object.entries(filters).forEach(([k, v]) => {
+        if (v !== null && v !== undefined && v !== '') params.set(k, v);
+    });
+    params.set('limit', pageSize);
+
+    const pager = { hasMore: true, truncated: false, loading: null };
+    let cursor = null;
+    pager.next = () => {
+        if (!pager.hasMore) return Promise.resolve([]);
+        // One request at a time: the scroll observer may fire again meanwhile
+        if (!pager.loading) {
+            if (cursor) params.set('cursor', cursor);
+            pager.loading = fetchRows(path, params).then(page => {
+                cursor = page.next;
+                pager.hasMore = Boolean(page.next);
+                pager.truncated = page.truncated;
+                return page.rows;
+            }).finally(() => { pager.loading = null; });
+        }
+        return pager.loading;
+    };
+    return pager;
+}
+
+function fetchRequests(filters = {}, pageSize = 50) {
+    return pagedListing('/api/requests', filters, pageSize);
+}
+
+function fetchEquipment(filters = {}, pageSize = 50) {
+    return pagedListing('/api/equipment', filters, pageSize);
+}
+
+// Show `button` while the pager has more pages; clicking it, or scrolling it
+// into view, calls the latest load()
+function bindLoadMore(button, pager, load) {
+    if (!button) return;
+    button.style.display = pager.hasMore ? 'inline-block' : 'none';
+    button.loadMore = load;
+    if (button.dataset.bound) return;
+    button.dataset.bound = '1';
+    button.addEventListener('click', () => button.loadMore());
+    if (window.IntersectionObserver) {
+        new IntersectionObserver(entries => {
+            if (entries.some(e => e.isIntersecting) && button.style.display !== 'none') button.loadMore();
+        }, { rootMargin: '200px' }).observe(button);
+    }
+}
+
 /* --- Equipment Page --- */
-async function loadEquipment() {
+let equipmentPager = null;
+
+async function loadEquipment(more = false) {
     const list = document.getElementById('equipment-list');
     if (!list) return;
 
-    const res = await fetch('/api/equipment');
-    const data = await res.json();
-    allEquipment = data;
+    if (!more || !equipmentPager) {
+        equipmentPager = fetchEquipment();
+        allEquipment = [];
+        list.innerHTML = '';
+    }
+    const data = await equipmentPager.next();
+    allEquipment = allEquipment.concat(data);
+    bindLoadMore(document.getElementById('equipment-load-more'), equipmentPager, () => loadEquipment(true));
 
-    list.innerHTML = data.map(item => `
+    list.insertAdjacentHTML('beforeend', data.map(item => `
         <tr style="${item.is_scrapped ? 'opacity: 0.5; text-decoration: line-through;' : ''}">
             <td><a href="/equipment/${item.id}" style="color: var(--text-main); font-weight: 500; text-decoration: none;">${item.name}</a></td>
             <td>${item.serial_number}</td>
@@ -34,7 +117,7 @@ async function loadEquipment() {
                 </a>
             </td>
         </tr>
-    `).join('');
+    `).join(''));
 }
 
 /* --- Kanban Board --- */
@@ -46,6 +129,8 @@ function getPriorityColor(type) {
 
 // Drag & Drop
 let draggedCardId = null;
+// Multi-select (Ctrl/Cmd/Shift + click); a drag of a selected card moves the whole selection
+const selectedCards = new Set();
 
 function allowDrop(ev) {
     ev.preventDefault();
@@ -64,22 +149,94 @@ async function drop(ev) {
     let newStage = targetCol.id.replace('col-', '');
     if (newStage === 'InProgress') newStage = 'In Progress';
 
+    const data = { stage: newStage };
     if (newStage === 'Repaired') {
         const hours = prompt("Enter repair duration (hours):", "1.0");
         if (hours === null) return;
-        await updateRequest(draggedCardId, { stage: newStage, duration_hours: hours });
+        data.duration_hours = hours;
     } else if (newStage === 'Scrap') {
         if (!confirm("WARNING: Moving to Scrap will permanently mark the equipment as SCRAPPED. Continue?")) return;
-        await updateRequest(draggedCardId, { stage: newStage });
-    } else {
-        await updateRequest(draggedCardId, { stage: newStage });
     }
 
-    loadKanban();
+    const ids = selectedCards.has(draggedCardId) ? [...selectedCards] : [draggedCardId];
+
+    // Move the cards right away; the change events re-render them with server data
+    const list = targetCol.querySelector('.kanban-cards');
+    ids.forEach(id => {
+        const card = document.getElementById(`req-${id}`);
+        if (card && list) list.prepend(card);
+    });
+    updateKanbanCounts();
+
+    if (ids.length > 1) {
+        const result = await batchRequests({ update: ids.map(id => ({ id: Number(id), ...data })) });
+        clearSelection();
+        if (result.failed.length) loadKanban();
+        return;
+    }
+
+    const res = await updateRequest(draggedCardId, data);
+    if (!res.ok) {
+        const err = await res.json().catch(() => ({}));
+        if (err.error) alert('Error: ' + err.error);
+        loadKanban(); // put the card back where the server has it
+    }
+}
+
+// Many changes in one call to /api/requests/batch; reports the items that failed
+async function batchRequests(body) {
+    const res = await fetch('/api/requests/batch', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(body)
+    });
+    const data = await res.json().catch(() => ({}));
+    if (!res.ok) {
+        alert('Error: ' + (data.error || 'Batch update failed'));
+        return { failed: [{ error: data.error }] };
+    }
+    const failed = (data.results || []).filter(r => r.status !== 200);
+    if (failed.length) {
+        alert(`${failed.length} of ${data.results.length} changes failed:\n` +
+              failed.map(r => `#${r.id}: ${r.error}`).join('\n'));
+    }
+    return { ...data, failed };
+}
+
+function toggleCardSelection(ev, id) {
+    if (!(ev.ctrlKey || ev.metaKey || ev.shiftKey)) return;
+    ev.preventDefault();
+    if (selectedCards.has(id)) selectedCards.delete(id);
+    else selectedCards.add(id);
+    document.getElementById(`req-${id}`)?.classList.toggle('selected', selectedCards.has(id));
+    updateSelectionBar();
+}
+
+function clearSelection() {
+    selectedCards.forEach(id => document.getElementById(`req-${id}`)?.classList.remove('selected'));
+    selectedCards.clear();
+    updateSelectionBar();
+}
+
+function updateSelectionBar() {
+    const bar = document.getElementById('selection-bar');
+    if (!bar) return;
+    bar.style.display = selectedCards.size ? 'flex' : 'none';
+    const count = document.getElementById('selection-count');
+    if (count) count.innerText = `${selectedCards.size} selected`;
+}
+
+async function deleteSelected() {
+    if (!selectedCards.size) return;
+    if (!confirm(`Delete ${selectedCards.size} requests? This action cannot be undone.`)) return;
+    const ids = [...selectedCards].map(Number);
+    const result = await batchRequests({ delete: ids });
+    (result.results || []).filter(r => r.status === 200).forEach(r => removeKanbanCard(r.id));
+    clearSelection();
 }
 
 async function updateRequest(id, data) {
-    await fetch(`/api/requests/${id}`, {
+    return fetch(`/api/requests/${id}`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(data)
@@ -91,8 +248,8 @@ async function confirmDelete(id) {
 
     const res = await fetch(`/api/requests/${id}`, { method: 'DELETE' });
     if (res.ok) {
-        // Reload current view
-        if (window.location.pathname.includes('kanban')) loadKanban();
+        // The Kanban board drops the card when the change event arrives
+        if (window.location.pathname.includes('kanban')) removeKanbanCard(id);
         else if (window.location.pathname.includes('dashboard')) location.reload();
     } else {
         const err = await res.json();
@@ -109,14 +266,37 @@ async function loadFormDependencies() {
     const teamRes = await fetch('/api/teams');
     allTeams = await teamRes.json();
 
-    try {
-        const eqRes = await fetch('/api/equipment');
-        if (!eqRes.ok) throw new Error('Failed to load equipment');
+    const currentEqId = new URLSearchParams(window.location.search).get('equipment_id');
+    await loadEquipmentOptions('', currentEqId);
+    if (currentEqId) {
+        eqSelect.value = currentEqId;
+        autoFillTeam();
+    }
+}
 
-        allEquipment = await eqRes.json();
-        const activeEquipment = allEquipment.filter(e => !e.is_scrapped);
+// The picker lists one page of active equipment: the newest, or the best
+// matches for what was typed into #equipmentSearch
+let equipmentSearchTimer = null;
 
-        const currentEqId = new URLSearchParams(window.location.search).get('equipment_id');
+function searchFormEquipment(text) {
+    clearTimeout(equipmentSearchTimer);
+    equipmentSearchTimer = setTimeout(() => loadEquipmentOptions(text.trim()), 250);
+}
+
+async function loadEquipmentOptions(text = '', preselectedId = null) {
+    const eqSelect = document.getElementById('equipmentSelect');
+    const currentEqId = preselectedId || eqSelect.value;
+    try {
+        // Scrapped equipment is excluded server-side
+        const pager = fetchEquipment({ is_scrapped: 'false', search: text });
+        let activeEquipment = await pager.next();
+        // Keep the chosen equipment in the list even when the page doesn't hold it
+        if (currentEqId && !activeEquipment.some(e => e.id == currentEqId)) {
+            const selected = allEquipment.find(e => e.id == currentEqId);
+            const rows = selected ? [selected] : await fetchEquipment({ id: currentEqId, is_scrapped: 'false' }, 1).next();
+            activeEquipment = rows.concat(activeEquipment);
+        }
+        allEquipment = activeEquipment;
 
         // Group by Type
         const computers = activeEquipment.filter(e => e.equipment_type === 'Computer');
@@ -138,16 +318,16 @@ async function loadFormDependencies() {
             html += `<optgroup label="Other">${buildOptions(others)}</optgroup>`;
         }
 
+        if (pager.hasMore || pager.truncated) {
+            html += '<option value="" disabled>More equipment: type to search</option>';
+        }
+
         if (activeEquipment.length === 0) {
-            html = '<option value="">No Active Equipment Available</option>';
+            html = `<option value="">${text ? 'No matching equipment' : 'No Active Equipment Available'}</option>`;
         }
 
         eqSelect.innerHTML = html;
-
-        if (currentEqId) {
-            eqSelect.value = currentEqId;
-            autoFillTeam();
-        }
+        if (currentEqId) eqSelect.value = currentEqId;
     } catch (err) {
         console.error(err);
         eqSelect.innerHTML = '<option value="">Error loading equipment</option>';
@@ -228,6 +408,7 @@ async function submitRequest(e) {
 
 /* --- Calendar Logic --- */
 let currentDate = new Date();
+let calendarMonth = null; // { monthStr, firstDay, daysInMonth, perDay, days } as last fetched
 
 async function initCalendar() {
     renderCalendarGrid();
@@ -245,36 +426,39 @@ async function renderCalendarGrid() {
 
     header.innerText = currentDate.toLocaleDateString('en-US', { month: 'long', year: 'numeric' });
 
-    const res = await fetch('/api/requests');
-    const allRequests = await res.json();
-    // Prompt: "we cant see the registered date" -> implies showing all requests with dates.
-    // Previously filtered only "Preventive". Now showing ALL that have a date.
-    const requestsWithDate = allRequests.filter(r => r.scheduled_date);
-
-    calendarBody.innerHTML = '';
-
     const year = currentDate.getFullYear();
     const month = currentDate.getMonth();
 
     const firstDay = new Date(year, month, 1).getDay();
     const daysInMonth = new Date(year, month + 1, 0).getDate();
 
+    // One small, pre-aggregated payload per month: counts + a capped list of cards per day
+    const monthStr = `${year}-${String(month + 1).padStart(2, '0')}`;
+    const res = await fetch(`/api/calendar?month=${monthStr}`);
+    const calendar = await res.json();
+    calendarMonth = { monthStr, firstDay, daysInMonth, perDay: 3, days: calendar.days || {} };
+    drawCalendar();
+}
+
+function drawCalendar() {
+    const calendarBody = document.getElementById('calendar-body');
+    if (!calendarBody || !calendarMonth) return;
+    const { monthStr, firstDay, daysInMonth, days } = calendarMonth;
+
+    // Build off-DOM and attach once instead of re-parsing innerHTML per cell
+    const fragment = document.createDocumentFragment();
+
     for (let i = 0; i < firstDay; i++) {
-        calendarBody.innerHTML += `<div></div>`;
+        fragment.appendChild(document.createElement('div'));
     }
 
     for (let day = 1; day <= daysInMonth; day++) {
-        const dateStr = `${year}-${String(month + 1).padStart(2, '0')}-${String(day).padStart(2, '0')}`;
-        // Compare using YYYY-MM-DD substring to be safe against time components
-        const dayEvents = requestsWithDate.filter(r => {
-            if (!r.scheduled_date) return false;
-            // Take first 10 chars (YYYY-MM-DD)
-            return r.scheduled_date.substring(0, 10) === dateStr;
-        });
+        const dateStr = `${monthStr}-${String(day).padStart(2, '0')}`;
+        const bucket = days[dateStr];
+        const dayEvents = bucket ? bucket.cards : [];
 
         const dayCell = document.createElement('div');
         dayCell.className = 'calendar-day';
-        // dayCell.onclick = () => openDayModal(dateStr, dayEvents); // OLD
         // Req: "When user clicks a date on Calendar: Kanban board must reload. Only show cards whose scheduled_date equals selected date."
         dayCell.onclick = () => window.location.href = `/kanban?date=${dateStr}`;
 
@@ -298,10 +482,51 @@ async function renderCalendarGrid() {
                         ${e.technician_name ? `<div style="font-size:0.7rem; opacity:0.6"><i class="fa-solid fa-user"></i> ${e.technician_name.split(' ')[0]}</div>` : ''}
                     </div>
                 `).join('')}
+                ${bucket && bucket.more > 0 ? `<div style="font-size:0.7rem; opacity:0.7">+${bucket.more} more</div>` : ''}
             </div>
         `;
-        calendarBody.appendChild(dayCell);
+        fragment.appendChild(dayCell);
+    }
+
+    calendarBody.replaceChildren(fragment);
+}
+
+function adjustCalendarDay(dateStr, stage, type, delta) {
+    if (!dateStr || !dateStr.startsWith(calendarMonth.monthStr + '-')) return null;
+    const day = calendarMonth.days[dateStr] ||
+        (calendarMonth.days[dateStr] = { total: 0, by_type: {}, by_stage: {}, cards: [], more: 0 });
+    day.total += delta;
+    day.by_type[type] = (day.by_type[type] || 0) + delta;
+    day.by_stage[stage] = (day.by_stage[stage] || 0) + delta;
+    return day;
+}
+
+// Patch the month in place from a change event instead of refetching it
+function applyCalendarEvent(msg) {
+    if (!calendarMonth) return;
+    if (msg.action === 'resync') return renderCalendarGrid();
+
+    if (msg.previous && msg.action !== 'created') {
+        const prev = msg.previous;
+        const day = adjustCalendarDay(prev.scheduled_date, prev.stage, prev.request_type, -1);
+        if (day) day.cards = day.cards.filter(c => c.id !== msg.request_id);
     }
+    if (msg.request) {
+        const req = msg.request;
+        const day = adjustCalendarDay(req.scheduled_date, req.stage, req.request_type, 1);
+        if (day && day.cards.length < calendarMonth.perDay) {
+            day.cards.push({
+                id: req.id, subject: req.subject, request_type: req.request_type, stage: req.stage,
+                scheduled_date: req.scheduled_date, equipment_name: req.equipment_name,
+                equipment_location: req.equipment_location, technician_name: req.technician_name
+            });
+        }
+    }
+    Object.entries(calendarMonth.days).forEach(([date, day]) => {
+        if (day.total <= 0) delete calendarMonth.days[date];
+        else day.more = day.total - day.cards.length;
+    });
+    drawCalendar();
 }
 /*
 function openDayModal(dateStr, events) {
@@ -310,23 +535,19 @@ function openDayModal(dateStr, events) {
 */
 
 /* --- Kanban Board Modified for Date Filter --- */
+let kanbanPager = null;
+
 async function loadKanban() {
     const urlParams = new URLSearchParams(window.location.search);
     const equipmentId = urlParams.get('equipment_id');
     const dateFilter = urlParams.get('date'); // NEW
 
-    let url = '/api/requests';
-    if (equipmentId) url += `?equipment_id=${equipmentId}`;
+    // Date and equipment filters are applied server-side; newest cards first,
+    // older ones page in from the "Load more" button
+    kanbanPager = fetchRequests({ equipment_id: equipmentId, date: dateFilter }, 100);
+    const requests = await kanbanPager.next();
 
-    const res = await fetch(url);
-    const allRequests = await res.json();
-
-    // Filter by Date if present
-    let requests = allRequests;
     if (dateFilter) {
-        // Compare YYYY-MM-DD
-        requests = allRequests.filter(r => r.scheduled_date && r.scheduled_date.startsWith(dateFilter));
-
         // Update Board Header to show filtered state
         const header = document.querySelector('h1');
         if (header) header.innerText = `Maintenance Board (${dateFilter})`;
@@ -335,58 +556,123 @@ async function loadKanban() {
     // Clear columns
     ['New', 'InProgress', 'Repaired', 'Scrap'].forEach(stage => {
         const col = document.getElementById(`list-${stage}`);
-        const colContainer = document.getElementById(`col-${stage}`);
         if (col) col.innerHTML = '';
-
-        // Update counts
-        const count = requests.filter(r => r.stage.replace(' ', '') === stage).length;
-        const badge = colContainer.querySelector('.count-badge');
-        if (badge) badge.innerText = count;
     });
 
+    appendKanbanCards(requests);
+}
+
+async function loadMoreKanban() {
+    if (!kanbanPager) return;
+    appendKanbanCards(await kanbanPager.next());
+}
+
+function appendKanbanCards(requests) {
     requests.forEach(req => {
+        // A live event may have placed the card already
+        if (document.getElementById(`req-${req.id}`)) return;
         // Map DB stage to ID
-        let stageId = req.stage.replace(' ', '');
-        const col = document.getElementById(`list-${stageId}`);
-        if (col) {
-            // Overdue Logic: Strictly past dates (yesterday and before). Today is NOT overdue.
-            const todayStr = new Date().toLocaleDateString('en-CA'); // YYYY-MM-DD
-            const isOverdue = req.scheduled_date && req.scheduled_date < todayStr && req.stage !== 'Repaired' && req.stage !== 'Scrap';
-            const isLocked = req.stage === 'Scrap'; // Strict Lock
-
-            const card = document.createElement('div');
-            card.className = 'kanban-card';
-            if (!isLocked) {
-                card.draggable = true;
-                card.ondragstart = (e) => drag(e);
-            } else {
-                card.style.opacity = '0.7';
-                card.style.border = '1px solid var(--danger)';
-                card.title = "Scrapped - Locked";
-            }
-            card.id = `req-${req.id}`;
-            card.dataset.id = req.id;
-
-            card.innerHTML = `
-                <div class="card-tag" style="background:${getPriorityColor(req.request_type)}">${req.request_type}</div>
-                <div class="card-title">${req.subject}</div>
-                <div style="font-size:0.85rem; color:var(--text-muted); margin-bottom:0.5rem;">
-                    <i class="fa-solid fa-cube"></i> ${req.equipment_name}
-                </div>
-                <div class="card-footer">
-                    <div class="date-indicator ${isOverdue ? 'overdue' : ''}">
-                        <i class="fa-regular fa-clock"></i> ${req.scheduled_date || 'No Date'}
-                    </div>
-                </div>
-                <div style="margin-top: 0.5rem; display: flex; justify-content: space-between; align-items: center;">
-                    ${req.avatar_url ? `<img src="${req.avatar_url}" class="tech-avatar" title="${req.technician_name}">` : '<span style="font-size:0.8rem; color:var(--text-muted);">Unassigned</span>'}
-                    
-                    ${!isLocked ? `<button onclick="confirmDelete(${req.id})" class="btn-icon-danger" title="Delete Request" style="background: none; border: none; color: var(--danger); cursor: pointer; opacity: 0.6; transition: 0.2s;">
-                        <i class="fa-solid fa-trash"></i>
-                    </button>` : '<i class="fa-solid fa-lock" style="color:var(--danger)"></i>'}
-                </div>
-            `;
-            col.appendChild(card);
-        }
+        const col = document.getElementById(`list-${req.stage.replace(' ', '')}`);
+        if (col) col.appendChild(renderKanbanCard(req));
     });
+    updateKanbanCounts();
+    bindLoadMore(document.getElementById('kanban-load-more'), kanbanPager, loadMoreKanban);
+}
+
+function updateKanbanCounts() {
+    // "+": older cards not loaded yet
+    const more = kanbanPager && kanbanPager.hasMore ? '+' : '';
+    ['New', 'InProgress', 'Repaired', 'Scrap'].forEach(stage => {
+        const col = document.getElementById(`list-${stage}`);
+        const badge = document.getElementById(`col-${stage}`)?.querySelector('.count-badge');
+        if (col && badge) badge.innerText = col.children.length + more;
+    });
+}
+
+function renderKanbanCard(req) {
+    // Overdue Logic: Strictly past dates (yesterday and before). Today is NOT overdue.
+    const todayStr = new Date().toLocaleDateString('en-CA'); // YYYY-MM-DD
+    const isOverdue = req.scheduled_date && req.scheduled_date < todayStr && req.stage !== 'Repaired' && req.stage !== 'Scrap';
+    const isLocked = req.stage === 'Scrap'; // Strict Lock
+
+    const card = document.createElement('div');
+    card.className = 'kanban-card';
+    if (!isLocked) {
+        card.draggable = true;
+        card.ondragstart = (e) => drag(e);
+    } else {
+        card.style.opacity = '0.7';
+        card.style.border = '1px solid var(--danger)';
+        card.title = "Scrapped - Locked";
+    }
+    card.id = `req-${req.id}`;
+    card.dataset.id = req.id;
+    card.onclick = (e) => toggleCardSelection(e, String(req.id));
+    if (selectedCards.has(String(req.id))) card.classList.add('selected');
+
+    card.innerHTML = `
+        <div class="card-tag" style="background:${getPriorityColor(req.request_type)}">${req.request_type}</div>
+        <div class="card-title">${req.subject}</div>
+        <div style="font-size:0.85rem; color:var(--text-muted); margin-bottom:0.5rem;">
+            <i class="fa-solid fa-cube"></i> ${req.equipment_name}
+        </div>
+        <div class="card-footer">
+            <div class="date-indicator ${isOverdue ? 'overdue' : ''}">
+                <i class="fa-regular fa-clock"></i> ${req.scheduled_date || 'No Date'}
+            </div>
+        </div>
+        <div style="margin-top: 0.5rem; display: flex; justify-content: space-between; align-items: center;">
+            ${req.avatar_url ? `<img src="${req.avatar_url}" class="tech-avatar" title="${req.technician_name}">` : '<span style="font-size:0.8rem; color:var(--text-muted);">Unassigned</span>'}
+            
+            ${!isLocked ? `<button onclick="confirmDelete(${req.id})" class="btn-icon-danger" title="Delete Request" style="background: none; border: none; color: var(--danger); cursor: pointer; opacity: 0.6; transition: 0.2s;">
+                <i class="fa-solid fa-trash"></i>
+            </button>` : '<i class="fa-solid fa-lock" style="color:var(--danger)"></i>'}
+        </div>
+    `;
+    return card;
+}
+
+function removeKanbanCard(id) {
+    const card = document.getElementById(`req-${id}`);
+    if (card) card.remove();
+    if (selectedCards.delete(String(id))) updateSelectionBar();
+    updateKanbanCounts();
+}
+
+// Apply one change event to the board without refetching it
+function applyKanbanEvent(msg) {
+    if (msg.action === 'resync') return loadKanban();
+    const req = msg.request;
+    if (!req) return removeKanbanCard(msg.request_id);
+
+    // Same filters loadKanban sends to the server
+    const urlParams = new URLSearchParams(window.location.search);
+    const equipmentId = urlParams.get('equipment_id');
+    const dateFilter = urlParams.get('date');
+    if ((equipmentId && String(req.equipment_id) !== equipmentId) ||
+        (dateFilter && req.scheduled_date !== dateFilter)) {
+        return removeKanbanCard(req.id);
+    }
+
+    const col = document.getElementById(`list-${req.stage.replace(' ', '')}`);
+    if (!col) return;
+    const card = renderKanbanCard(req);
+    const existing = document.getElementById(`req-${req.id}`);
+    if (existing && existing.parentElement === col) existing.replaceWith(card);
+    else {
+        if (existing) existing.remove();
+        col.prepend(card);
+    }
+    updateKanbanCounts();
+}
+
+/* --- Live Updates --- */
+// Request change events (SSE) from /api/events; EventSource reconnects on its own
+let requestEvents = null;
+
+function subscribeRequestEvents(onEvent) {
+    if (!window.EventSource || requestEvents) return;
+    requestEvents = new EventSource('/api/events');
+    requestEvents.addEventListener('request', e => onEvent(JSON.parse(e.data)));
+    requestEvents.addEventListener('resync', () => onEvent({ action: 'resync' }));
 }
@@ -0,0 +1,539 @@
+import datetime
+import decimal
+import functools
+import itertools
+import os
+import re
+import sqlite3
+import threading
+import time
+import weakref
+
+import mysql.connector
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Storage drivers behind db.connect() / get_db().
+#
+#   DB_BACKEND=mysql    mysql-connector against DB_HOST/DB_NAME (default)
+#   DB_BACKEND=sqlite   SQLite; SQLITE_PATH=:memory: (default) or a file path
+#
+# The SQLite driver is for tests and benchmarks. It hands out connections with
+# the slice of the mysql-connector API the app uses (dictionary cursors,
+# start_transaction, autocommit, column_names, ...), rewrites the MySQL
+# dialect the app speaks (%s placeholders, ON DUPLICATE KEY UPDATE, INSERT
+# IGNORE, FOR UPDATE, MATCH ... AGAINST, NOW() - INTERVAL, DELETE ... LIMIT,
+# parenthesised UNION branches) and raises mysql.connector errors, so callers' except clauses work
+# unchanged. New databases get schema.sql plus migrations/, translated: ENUMs
+# become CHECK constraints, AUTO_INCREMENT becomes AUTOINCREMENT, inline
+# indexes become CREATE INDEX, FULLTEXT indexes are dropped (MATCH runs as a
+# Python function) and data backfill UPDATEs are skipped. migrate.py and
+# setup_db.py go through the same translation (execute_ddl). Not covered:
+# UPDATE ... JOIN (counters.rebuild, migration backfills) and SHOW / EXPLAIN
+# (`migrate.py check`).
+#
+# An in-memory database lives as long as its driver: every connection opened
+# by the same driver sees the same data, other drivers (other test workers)
+# get their own.
+
+BACKEND = os.getenv('DB_BACKEND', 'mysql')
+SQLITE_PATH = os.getenv('SQLITE_PATH', ':memory:')
+# How long a writer waits for another connection's transaction, in seconds
+SQLITE_LOCK_TIMEOUT = float(os.getenv('SQLITE_LOCK_TIMEOUT', 5))
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class MySQLDriver:
+    name = 'mysql'
+
+    def connect(self):
+        conn = mysql.connector.connect(
+            host=os.getenv('DB_HOST', 'localhost'),
+            user=os.getenv('DB_USER', 'root'),
+            password=os.getenv('DB_PASSWORD'),
+            database=os.getenv('DB_NAME', 'mechcare_db')
+        )
+        conn.autocommit = True
+        return conn
+
+    def close(self):
+        pass
+
+
+# --- SQLite types ---
+
+def _convert_date(value):
+    text = value.decode()
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        return datetime.datetime.fromisoformat(text).date()
+
+
+def _convert_datetime(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+sqlite3.register_adapter(datetime.date, lambda v: v.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda v: v.isoformat(' '))
+sqlite3.register_adapter(decimal.Decimal, str)
+sqlite3.register_converter('DATE', _convert_date)
+sqlite3.register_converter('TIMESTAMP', _convert_datetime)
+sqlite3.register_converter('DATETIME', _convert_datetime)
+sqlite3.register_converter('DECIMAL', lambda v: decimal.Decimal(v.decode()))
+
+
+def _match_against(query, *columns):
+    # MySQL BOOLEAN MODE subset used by search.fulltext_query: '+word*' terms
+    words = set(re.findall(r'\w+', ' '.join(c for c in columns if c).lower()))
+    score = 0
+    for term in (query or '').split():
+        word = term.strip('+-*').lower()
+        if term.endswith('*'):
+            hit = any(w.startswith(word) for w in words)
+        else:
+            hit = word in words
+        if hit:
+            score += 1
+        elif term.startswith('+'):
+            return 0
+    return score
+
+
+# --- Statement translation ---
+
+_FOR_UPDATE = re.compile(r'\s+(FOR\s+UPDATE|LOCK\s+IN\s+SHARE\s+MODE)\b', re.I)
+_INSERT_IGNORE = re.compile(r'\bINSERT\s+IGNORE\b', re.I)
+_ON_DUPLICATE = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b', re.I)
+_VALUES_FN = re.compile(r'\bVALUES\((\w+)\)', re.I)
+_MATCH = re.compile(r'MATCH\s*\(([^)]*)\)\s*AGAINST\s*\(\s*(%s)\s+IN\s+BOOLEAN\s+MODE\s*\)', re.I)
+_INTERVAL = re.compile(r'NOW\(\)\s*([+-])\s*INTERVAL\s+(%s|\d+)\s+(SECOND|MINUTE|HOUR|DAY)\b', re.I)
+_NOW = re.compile(r'\b(NOW|UTC_TIMESTAMP)\(\)', re.I)
+_GREATEST = re.compile(r'\bGREATEST\(', re.I)
+_LEAST = re.compile(r'\bLEAST\(', re.I)
+_DELETE_LIMIT = re.compile(r'^\s*DELETE\s+FROM\s+(\w+)(.*?)\s+LIMIT\s+(%s|\d+)\s*$', re.I | re.S)
+_SELECT_BRANCH = re.compile(r'\(\s*SELECT\b', re.I)
+_PLACEHOLDER = re.compile(r'%s')
+_NOOP = re.compile(r'^\s*(SET|ANALYZE)\b', re.I)
+
+
+def _closing_paren(sql, start):
+    # Index of the ')' matching sql[start] == '(', skipping quoted strings
+    depth = 0
+    quote = None
+    for i in range(start, len(sql)):
+        ch = sql[i]
+        if quote:
+            if ch == quote and sql[i - 1] != '\\':
+                quote = None
+        elif ch in ("'", '"', '`'):
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+def _unwrap_union_branches(sql):
+    # MySQL allows (SELECT ... LIMIT n) UNION ALL (SELECT ...); SQLite wants each
+    # branch as a plain SELECT, so wrap them as SELECT * FROM (...)
+    if 'UNION' not in sql.upper():
+        return sql
+    inserts = []
+    for match in _SELECT_BRANCH.finditer(sql):
+        start = match.start()
+        end = _closing_paren(sql, start)
+        if end < 0:
+            continue
+        before = sql[:start].rstrip().upper()
+        after = sql[end + 1:].lstrip().upper()
+        if before.endswith('UNION ALL') or before.endswith('UNION') or after.startswith('UNION'):
+            inserts.append(start)
+    for start in reversed(inserts):
+        sql = sql[:start] + 'SELECT * FROM ' + sql[start:]
+    return sql
+
+
+def _interval(match):
+    sign = '-' if match.group(1) == '-' else '+'
+    unit = match.group(3).lower() + 's'
+    amount = match.group(2)
+    if amount == '%s':
+        return f"datetime('now', '{sign}' || %s || ' {unit}')"
+    return f"datetime('now', '{sign}{amount} {unit}')"
+
+
+@functools.lru_cache(maxsize=2048)
+def translate(sql):
+    # MySQL statement -> SQLite statement (None for statements that are no-ops here)
+    if _NOOP.match(sql):
+        return None
+    sql = _FOR_UPDATE.sub('', sql)
+    sql = _INSERT_IGNORE.sub('INSERT OR IGNORE', sql)
+    if _ON_DUPLICATE.search(sql):
+        head, tail = _ON_DUPLICATE.split(sql, 1)
+        sql = head + 'ON CONFLICT DO UPDATE SET' + _VALUES_FN.sub(r'excluded.\1', tail)
+    sql = _MATCH.sub(lambda m: f"mysql_match({m.group(2)}, {m.group(1)})", sql)
+    sql = _INTERVAL.sub(_interval, sql)
+    sql = _NOW.sub('CURRENT_TIMESTAMP', sql)
+    sql = _GREATEST.sub('MAX(', sql)
+    sql = _LEAST.sub('MIN(', sql)
+    sql = _DELETE_LIMIT.sub(r'DELETE FROM \1 WHERE rowid IN (SELECT rowid FROM \1\2 LIMIT \3)', sql)
+    sql = _unwrap_union_branches(sql)
+    return _PLACEHOLDER.sub('?', sql)
+
+
+# --- Schema translation ---
+
+_ENUM = re.compile(r'^(\w+)\s+ENUM\s*\(([^)]*)\)', re.I)
+_AUTO_INCREMENT = re.compile(r'^(\w+)\s+\w+(\(\d+\))?(\s+UNSIGNED)?\s+AUTO_INCREMENT\s+PRIMARY\s+KEY', re.I)
+_TABLE_INDEX = re.compile(r'^(?:INDEX|KEY)\s+(\w+)\s*(\(.*\))$', re.I | re.S)
+_UNIQUE_KEY = re.compile(r'^UNIQUE\s+(?:KEY|INDEX)\s+\w+\s*(\(.*\))$', re.I | re.S)
+_PREFIX_LENGTH = re.compile(r'(\w+)\s*\(\d+\)(?=\s*[,)])')
+_CREATE_TABLE = re.compile(r'^\s*CREATE\s+TABLE\s+(IF\s+NOT\s+EXISTS\s+)?(\w+)\s*\(', re.I)
+_ALTER_ADD_INDEX = re.compile(r'^\s*ALTER\s+TABLE\s+(\w+)\s+ADD\s+(UNIQUE\s+)?(?:INDEX|KEY)\s+(\w+)\s*(\(.*\))\s*$',
+                              re.I | re.S)
+_ALTER_FULLTEXT = re.compile(r'^\s*ALTER\s+TABLE\s+\w+\s+ADD\s+FULLTEXT\b', re.I)
+_CREATE_INDEX = re.compile(r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\s+(\w+)\s+ON\s+(\w+)\s*(\(.*\))\s*$', re.I | re.S)
+_DROP_INDEX = re.compile(r'^\s*DROP\s+INDEX\s+(\w+)\s+ON\s+\w+\s*$', re.I)
+_UPDATE = re.compile(r'^\s*UPDATE\b', re.I)
+_ALTER_MODIFY = re.compile(r'^\s*ALTER\s+TABLE\s+\w+\s+MODIFY\b', re.I)
+
+
+def _split_top_level(body):
+    items, depth, current = [], 0, []
+    for ch in body:
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        if ch == ',' and depth == 0:
+            items.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if ''.join(current).strip():
+        items.append(''.join(current).strip())
+    return items
+
+
+def _column(item):
+    item = re.sub(r'\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b', '', item, flags=re.I)
+    match = _AUTO_INCREMENT.match(item)
+    if match:
+        return f"{match.group(1)} INTEGER PRIMARY KEY AUTOINCREMENT" + item[match.end():]
+    match = _ENUM.match(item)
+    if match:
+        return f"{match.group(1)} TEXT CHECK ({match.group(1)} IN ({match.group(2)}))" + item[match.end():]
+    return re.sub(r'\s+UNSIGNED\b', '', item, flags=re.I)
+
+
+def _index(name, table, columns, unique=False):
+    columns = _PREFIX_LENGTH.sub(r'\1', columns)
+    return f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} {columns}"
+
+
+def translate_ddl(stmt):
+    # MySQL DDL statement -> list of SQLite statements
+    # Backfills, fulltext indexes and column type changes have nothing to do
+    # here (SQLite columns are loosely typed, CURRENT_TIMESTAMP is already UTC)
+    if _UPDATE.match(stmt) or _ALTER_FULLTEXT.match(stmt) or _ALTER_MODIFY.match(stmt):
+        return []
+    match = _ALTER_ADD_INDEX.match(stmt)
+    if match:
+        return [_index(match.group(3), match.group(1), match.group(4), bool(match.group(2)))]
+    match = _CREATE_INDEX.match(stmt)
+    if match:
+        return [_index(match.group(2), match.group(3), match.group(4), bool(match.group(1)))]
+    match = _DROP_INDEX.match(stmt)
+    if match:
+        return [f"DROP INDEX IF EXISTS {match.group(1)}"]
+    match = _CREATE_TABLE.match(stmt)
+    if not match:
+        sql = translate(stmt)
+        if sql is None:
+            return []
+        return [_column(sql) if re.match(r'^\s*ALTER\s+TABLE', sql, re.I) else sql]
+
+    table = match.group(2)
+    open_paren = match.end() - 1
+    close_paren = _closing_paren(stmt, open_paren)
+    columns, indexes = [], []
+    for item in _split_top_level(stmt[open_paren + 1:close_paren]):
+        index = _TABLE_INDEX.match(item)
+        unique = _UNIQUE_KEY.match(item)
+        if item.upper().startswith('FULLTEXT'):
+            continue
+        elif index:
+            indexes.append(_index(index.group(1), table, index.group(2)))
+        elif unique:
+            columns.append(f"UNIQUE {unique.group(1)}")
+        else:
+            columns.append(_column(item))
+    create = f"CREATE TABLE {match.group(1) or ''}{table} (\n    " + ',\n    '.join(columns) + "\n)"
+    return [create] + indexes
+
+
+# --- SQLite connection / cursor ---
+
+def _mysql_error(e):
+    # sqlite3 error -> the mysql.connector error callers already handle
+    message = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        errno = 1062 if 'UNIQUE' in message else 1452 if 'FOREIGN KEY' in message else 1048
+        return mysql.connector.errors.IntegrityError(msg=message, errno=errno)
+    if 'duplicate column' in message or 'already exists' in message:
+        # Duplicate column / duplicate key name / table exists (migrate.ALREADY_APPLIED_ERRORS)
+        errno = 1060 if 'column' in message else 1061 if message.startswith('index') else 1050
+        return mysql.connector.errors.ProgrammingError(msg=message, errno=errno)
+    if 'no such' in message or 'syntax error' in message:
+        return mysql.connector.errors.ProgrammingError(msg=message, errno=1064)
+    return mysql.connector.errors.DatabaseError(msg=message, errno=1205 if 'locked' in message else None)
+
+
+class SQLiteCursor:
+    def __init__(self, conn, dictionary=False):
+        self._conn = conn
+        self._cursor = conn._raw.cursor()
+        self.dictionary = dictionary
+        self._noop = False
+
+    def _run(self, fn, sql, params):
+        translated = translate(sql)
+        self._noop = translated is None
+        if self._noop:
+            return
+        if not self._conn.autocommit and not self._conn._raw.in_transaction:
+            self._conn._begin()
+        self._conn._retry(fn, translated, params)
+
+    def execute(self, operation, params=None, multi=False):
+        self._run(self._cursor.execute, operation, tuple(params) if params is not None else ())
+
+    def executemany(self, operation, seq_params):
+        self._run(self._cursor.executemany, operation, [tuple(p) for p in seq_params])
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self.dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return None if self._noop else self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [] if self._noop else [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [] if self._noop else [self._row(r) for r in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def close(self):
+        self._cursor.close()
+
+
+def execute_ddl(cursor, stmt):
+    # One statement from schema.sql or migrations/, on either backend
+    if isinstance(cursor, SQLiteCursor):
+        for sql in translate_ddl(stmt):
+            cursor._conn._retry(cursor._cursor.execute, sql, ())
+    else:
+        cursor.execute(stmt)
+
+
+class SQLiteConnection:
+    def __init__(self, raw, lock_timeout=SQLITE_LOCK_TIMEOUT):
+        self._raw = raw
+        self.lock_timeout = lock_timeout
+        self.autocommit = True
+        self._cursors = weakref.WeakSet()
+
+    def _retry(self, fn, *args):
+        # Shared-cache memory databases report table locks at once instead of
+        # waiting like file databases do; wait here for up to lock_timeout
+        deadline = None
+        while True:
+            try:
+                return fn(*args)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e):
+                    raise _mysql_error(e)
+                deadline = deadline or time.monotonic() + self.lock_timeout
+                if time.monotonic() > deadline:
+                    raise _mysql_error(e)
+                time.sleep(0.005)
+            except sqlite3.Error as e:
+                raise _mysql_error(e)
+
+    def _begin(self):
+        # IMMEDIATE takes the write lock up front, like InnoDB's FOR UPDATE reads
+        self._retry(self._raw.execute, 'BEGIN IMMEDIATE')
+
+    def cursor(self, dictionary=False, buffered=None, **kwargs):
+        cursor = SQLiteCursor(self, dictionary)
+        self._cursors.add(cursor)
+        return cursor
+
+    def start_transaction(self, **kwargs):
+        if self._raw.in_transaction:
+            raise mysql.connector.errors.ProgrammingError(msg="Transaction already in progress")
+        self._begin()
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def commit(self):
+        if self._raw.in_transaction:
+            self._retry(self._raw.execute, 'COMMIT')
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.execute('ROLLBACK')
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._raw.execute('SELECT 1')
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        # Like MySQL, closing the connection ends its cursors: SQLite keeps a
+        # closed connection (and its shared-cache table locks) alive until every
+        # statement is finalized
+        for cursor in list(self._cursors):
+            cursor.close()
+        self._raw.close()
+
+
+_names = itertools.count(1)
+
+
+class SQLiteDriver:
+    name = 'sqlite'
+
+    def __init__(self, path=SQLITE_PATH, name=None, create_schema=True):
+        self.path = path
+        self._lock = threading.Lock()
+        self._keeper = None
+        if path == ':memory:':
+            name = name or f"mechcare-{os.getpid()}-{next(_names)}"
+            self._target = f"file:{name}?mode=memory&cache=shared"
+            # The database disappears with its last connection; hold one open
+            self._keeper = self._open()
+        else:
+            self._target = path
+        if create_schema:
+            self.ensure_schema()
+
+    def _open(self):
+        raw = sqlite3.connect(self._target, uri=self._target.startswith('file:'),
+                              detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                              isolation_level=None, timeout=SQLITE_LOCK_TIMEOUT)
+        raw.create_function('mysql_match', -1, _match_against, deterministic=True)
+        raw.execute('PRAGMA foreign_keys = ON')
+        if self._keeper is None and self.path != ':memory:':
+            raw.execute('PRAGMA journal_mode = WAL')
+        return raw
+
+    def connect(self):
+        return SQLiteConnection(self._open())
+
+    def tables(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+        names = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return names
+
+    def ensure_schema(self):
+        # schema.sql on a database without a User table, then any pending
+        # migrations (the same path as `python migrate.py`)
+        import migrate
+        with self._lock:
+            conn = self.connect()
+            try:
+                if 'User' not in self.tables(conn):
+                    cursor = conn.cursor()
+                    with open(os.path.join(BASE_DIR, 'schema.sql')) as f:
+                        for stmt in migrate.split_statements(f.read()):
+                            execute_ddl(cursor, stmt)
+                    cursor.close()
+                migrate.apply_pending(conn, out=lambda line: None)
+            finally:
+                conn.close()
+
+    def reset(self):
+        # Empty every table (and restart ids) without rebuilding the schema
+        conn = self.connect()
+        try:
+            raw = conn._raw
+            raw.execute('PRAGMA foreign_keys = OFF')
+            raw.execute('BEGIN')
+            for table in self.tables(conn):
+                if table != 'SchemaMigration':
+                    raw.execute(f'DELETE FROM "{table}"')
+            if raw.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_sequence'").fetchone():
+                raw.execute('DELETE FROM sqlite_sequence')
+            raw.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._keeper is not None:
+            self._keeper.close()
+            self._keeper = None
+
+
+# --- Driver selection ---
+
+_driver = None
+_driver_lock = threading.Lock()
+
+
+def driver_from_env():
+    if BACKEND == 'sqlite':
+        return SQLiteDriver(SQLITE_PATH)
+    if BACKEND != 'mysql':
+        raise RuntimeError(f"Unknown DB_BACKEND '{BACKEND}' (expected mysql or sqlite)")
+    return MySQLDriver()
+
+
+def get_driver():
+    global _driver
+    if _driver is None:
+        with _driver_lock:
+            if _driver is None:
+                _driver = driver_from_env()
+    return _driver
+
+
+def set_driver(driver):
+    # Swap the backend (tests); callers also reset db's pool
+    global _driver
+    with _driver_lock:
+        previous, _driver = _driver, driver
+    return previous
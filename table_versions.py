@@ -0,0 +1,83 @@
+import datetime
+import hashlib
+import os
+
+from flask import request, make_response
+
+# Per-table version counters stored in the database (so every worker process
+# sees the same value). Write paths call bump(); read endpoints derive a strong
+# ETag and Last-Modified from the versions of the tables they read and answer
+# 304 Not Modified without running their query when the client is current.
+
+CACHE_CONTROL = os.getenv('REFERENCE_CACHE_CONTROL', 'private, no-cache')
+
+
+def bump(cursor, *tables):
+    # Row locks are taken in one global (sorted) order whatever the caller
+    # passes, so concurrent writers bumping overlapping tables can't deadlock.
+    # updated_at is UTC whatever the server's time zone (migration 0010)
+    cursor.executemany("""
+        INSERT INTO TableVersion (table_name, version, updated_at) VALUES (%s, 1, UTC_TIMESTAMP())
+        ON DUPLICATE KEY UPDATE version = version + 1, updated_at = UTC_TIMESTAMP()
+    """, [(t,) for t in sorted(set(tables))])
+
+
+def versions_query(tables):
+    placeholders = ', '.join(['%s'] * len(tables))
+    return (f"SELECT table_name, version, updated_at FROM TableVersion WHERE table_name IN ({placeholders})",
+            list(tables))
+
+
+def get_versions(cursor, tables):
+    cursor.execute(*versions_query(tables))
+    return versions_from_rows(tables, cursor.fetchall())
+
+
+def versions_from_rows(tables, rows):
+    # -> {table: (version, updated_at)}; tables never bumped are at version 0
+    versions = {t: (0, None) for t in tables}
+    for row in rows:
+        if isinstance(row, dict):
+            versions[row['table_name']] = (row['version'], row['updated_at'])
+        else:
+            versions[row[0]] = (row[1], row[2])
+    return versions
+
+
+def etag_for(versions, vary=''):
+    # Query string is part of the tag: same tables, different filters, different body
+    raw = '|'.join(f"{t}:{versions[t][0]}" for t in sorted(versions)) + '|' + vary
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def last_modified_of(versions):
+    # -> aware UTC datetime (updated_at is stored as naive UTC) or None
+    stamps = [updated for _, updated in versions.values() if updated is not None]
+    return max(stamps).replace(tzinfo=datetime.timezone.utc) if stamps else None
+
+
+def is_not_modified(etag, last_modified, if_none_match, if_modified_since):
+    # if_none_match: werkzeug ETags (empty when absent), if_modified_since: aware
+    # UTC datetime or None (werkzeug's parse_date)
+    if if_none_match:
+        return if_none_match.contains_weak(etag)
+    return (last_modified is not None and if_modified_since is not None
+            and last_modified.replace(microsecond=0) <= if_modified_since)
+
+
+def conditional(cursor, tables, build):
+    # build() -> response body/Response; only called when the client copy is stale
+    versions = get_versions(cursor, tables)
+    etag = etag_for(versions, request.full_path)
+    last_modified = last_modified_of(versions)
+
+    # Weak comparison: compressed responses carry the tag as W/"..." (see wire.py)
+    if is_not_modified(etag, last_modified, request.if_none_match, request.if_modified_since):
+        response = make_response('', 304)
+    else:
+        response = make_response(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    return response
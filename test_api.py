@@ -0,0 +1,177 @@
+import datetime
+
+import qcache
+import search as search_index
+import table_versions
+import testing
+
+# Routes end to end through get_db and the pool, on this worker's SQLite
+# database. Fixtures come from testing.py (and query_budget from profiler.py).
+
+
+# --- Login ---
+
+def test_login(client, make_user):
+    user = make_user()
+    response = client.post('/login', data={'email': user['email'], 'password': testing.PASSWORD})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/dashboard')
+    assert client.get('/api/stats').status_code == 200
+
+
+def test_login_wrong_password(client, make_user):
+    user = make_user()
+    response = client.post('/login', data={'email': user['email'], 'password': 'not it'})
+    assert response.status_code == 200
+    assert b'Invalid email or password' in response.data
+    assert client.get('/api/stats').status_code in (302, 401)
+
+
+def test_login_throttled(client, make_user):
+    user = make_user()
+    statuses = [client.post('/login', data={'email': user['email'], 'password': 'not it'}).status_code
+                for _ in range(8)]
+    assert statuses[-1] == 429
+    assert 'Retry-After' in client.post('/login', data={'email': user['email'], 'password': 'x'}).headers
+
+
+# --- Requests ---
+
+def test_create_and_list_requests(client, conn, make_user, login):
+    team = testing.make_team(conn)
+    user = make_user()
+    login(client, user)
+    equipment_id = testing.create_equipment(client, 'Lathe', team)
+    ids = [testing.create_request(client, f"Fix {n}", equipment_id, team) for n in range(5)]
+
+    seen = []
+    response = client.get('/api/requests?limit=2')
+    while True:
+        assert response.status_code == 200
+        seen += [row['id'] for row in response.json]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+        response = client.get(f"/api/requests?limit=2&cursor={cursor}")
+    assert sorted(seen) == sorted(ids)
+    assert len(seen) == len(set(seen))
+
+    stats = client.get('/api/stats').json
+    assert stats['active_requests'] == 5
+
+
+def test_requests_are_scoped_to_their_creator(client, conn, make_user, login):
+    login(client, make_user())
+    testing.create_request(client, 'Mine', testing.create_equipment(client, 'Press'))
+    login(client, make_user())
+    assert client.get('/api/requests').json == []
+
+
+def test_technician_moves_a_request(client, conn, make_user, login):
+    team = testing.make_team(conn)
+    login(client, make_user())
+    request_id = testing.create_request(client, 'Noisy', testing.create_equipment(client, 'Drill', team), team)
+
+    login(client, make_user('Technician', team_id=team))
+    response = client.put(f"/api/requests/{request_id}", json={'stage': 'In Progress'})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert [row['stage'] for row in client.get('/api/requests').json] == ['In Progress']
+
+
+def test_technicians_cannot_list_equipment(client, make_user, login):
+    login(client, make_user('Technician'))
+    assert client.get('/api/equipment').status_code == 403
+
+
+def test_listing_query_budget(client, conn, make_user, login, query_budget):
+    team = testing.make_team(conn)
+    login(client, make_user())
+    equipment_id = testing.create_equipment(client, 'Mill', team)
+    for n in range(10):
+        testing.create_request(client, f"Check {n}", equipment_id, team)
+    with query_budget(10):
+        assert len(client.get('/api/requests').json) == 10
+
+
+# --- Search ---
+
+def test_search_pages_in_relevance_order(client, make_user, login):
+    login(client, make_user())
+    # Oldest first, so relevance order differs from id order: a serial number
+    # prefix outranks a name prefix, which outranks a word in the description
+    assert client.post('/api/equipment', json={
+        'name': 'Bench grinder', 'serial_number': 'LATHE-7', 'equipment_type': 'Machine'}).status_code == 201
+    assert client.post('/api/equipment', json={
+        'name': 'Drill press', 'serial_number': 'DP-1', 'equipment_type': 'Machine',
+        'description': 'Next to the lathe'}).status_code == 201
+    for name in ('Lathe A', 'Grinder', 'Lathe B'):
+        testing.create_equipment(client, name)
+
+    response = client.get('/api/equipment?search=Lathe&limit=2')
+    first = [row['name'] for row in response.json]
+    cursor = response.headers['X-Next-Cursor']
+    second = [row['name'] for row in client.get(f"/api/equipment?search=Lathe&limit=2&cursor={cursor}").json]
+    assert first == ['Bench grinder', 'Lathe B']
+    assert second == ['Lathe A', 'Drill press']
+    assert 'X-Search-Truncated' not in response.headers
+
+
+def test_search_reports_truncation(client, make_user, login, monkeypatch):
+    login(client, make_user())
+    for n in range(3):
+        testing.create_equipment(client, f"Pump {n}")
+    monkeypatch.setattr(search_index, 'MAX_RESULTS', 2)
+
+    response = client.get('/api/equipment?search=Pump')
+    assert len(response.json) == 2
+    assert response.headers['X-Search-Truncated'] == '1'
+
+
+# --- Caching ---
+
+def test_teams_etag(client, conn, make_user, login):
+    testing.make_team(conn, 'Electrical')
+    login(client, make_user())
+    response = client.get('/api/teams')
+    assert [team['team_name'] for team in response.json] == ['Electrical']
+    etag = response.headers['ETag']
+    assert client.get('/api/teams', headers={'If-None-Match': etag}).status_code == 304
+
+    login(client, make_user('Admin'))
+    assert client.post('/api/teams', json={'name': 'Hydraulics'}).status_code == 201
+    assert client.get('/api/teams', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_teams_last_modified_is_utc(client, conn, make_user, login):
+    testing.make_team(conn, 'Electrical')
+    login(client, make_user('Admin'))
+    assert client.post('/api/teams', json={'name': 'Hydraulics'}).status_code == 201
+    response = client.get('/api/teams')
+    last_modified = response.last_modified
+    assert abs(last_modified - datetime.datetime.now(datetime.timezone.utc)) < datetime.timedelta(minutes=1)
+
+    since = response.headers['Last-Modified']
+    assert client.get('/api/teams', headers={'If-Modified-Since': since}).status_code == 304
+    earlier = last_modified - datetime.timedelta(seconds=1)
+    assert client.get('/api/teams', headers={'If-Modified-Since': earlier.strftime('%a, %d %b %Y %H:%M:%S GMT')}
+                      ).status_code == 200
+
+
+def test_request_writes_only_invalidate_their_scopes(client, conn, make_user, login):
+    mine, other = make_user(), make_user()
+    login(client, other)
+    other_request = testing.create_request(client, 'Theirs', testing.create_equipment(client, 'Saw'))
+    login(client, mine)
+    testing.create_request(client, 'Mine', testing.create_equipment(client, 'Welder'))
+    client.get('/api/requests')
+    equipment_version = table_versions.get_versions(conn.cursor(), ['Equipment'])['Equipment'][0]
+
+    login(client, make_user('Technician'))
+    assert client.put(f"/api/requests/{other_request}", json={'stage': 'In Progress'}).status_code == 200
+
+    login(client, mine)
+    hits = qcache.cache.stats['hits']
+    assert [row['subject'] for row in client.get('/api/requests').json] == ['Mine']
+    assert qcache.cache.stats['hits'] == hits + 1
+    # New -> In Progress leaves open_request_count alone
+    assert table_versions.get_versions(conn.cursor(), ['Equipment'])['Equipment'][0] == equipment_version
@@ -0,0 +1,127 @@
+import events
+import testing
+
+# Live request events: the broker is polled by hand here instead of by its
+# thread, and streams are read as the generators the SSE response iterates.
+
+
+ADMIN = {'role': 'Admin', 'user_id': 0, 'team_id': None, 'technician_id': None}
+
+
+def subscribe(broker, scope, last_event_id=None):
+    # EventBroker.subscribe without starting the polling thread
+    sub = events.Subscription(scope)
+    broker._subscribers.add(sub)
+    if last_event_id:
+        broker._replay(sub, last_event_id)
+    return sub
+
+
+def messages(sub):
+    items = []
+    while not sub.queue.empty():
+        items.append(sub.queue.get_nowait())
+    return items
+
+
+def test_changes_reach_subscribers_in_scope(client, conn, make_user, login):
+    broker = events.EventBroker()
+    broker._poll(conn)
+    owner, other = make_user(), make_user()
+    mine = subscribe(broker, {'role': 'Company User', 'user_id': owner['id'], 'team_id': None,
+                              'technician_id': None})
+    theirs = subscribe(broker, {'role': 'Company User', 'user_id': other['id'], 'team_id': None,
+                                'technician_id': None})
+
+    login(client, owner)
+    request_id = testing.create_request(client, 'Noisy', testing.create_equipment(client, 'Lathe'))
+    login(client, make_user('Technician'))
+    client.put(f"/api/requests/{request_id}", json={'stage': 'In Progress'})
+    broker._poll(conn)
+
+    received = [(message['action'], message['request']['stage']) for _, message in messages(mine)]
+    assert received == [('created', 'New'), ('updated', 'In Progress')]
+    assert messages(theirs) == []
+
+
+def test_overflow_asks_for_resync(client, conn, make_user, login, monkeypatch):
+    monkeypatch.setattr(events, 'SUBSCRIBER_QUEUE', 1)
+    broker = events.EventBroker()
+    broker._poll(conn)
+    sub = subscribe(broker, ADMIN)
+    login(client, make_user())
+    equipment_id = testing.create_equipment(client, 'Lathe')
+    for n in range(3):
+        testing.create_request(client, f"Fix {n}", equipment_id)
+    broker._poll(conn)
+
+    stream = events.stream(sub)
+    assert next(stream).startswith('retry:')
+    assert next(stream) == "event: resync\ndata: {}\n\n"
+    sub.close()
+    assert list(stream) == []
+
+
+def test_reconnect_replays_or_resyncs(client, conn, make_user, login):
+    broker = events.EventBroker()
+    broker._poll(conn)
+    subscribe(broker, ADMIN)
+    login(client, make_user())
+    equipment_id = testing.create_equipment(client, 'Lathe')
+    ids = [testing.create_request(client, f"Fix {n}", equipment_id) for n in range(3)]
+    broker._poll(conn)
+    first_event = broker._recent[0]['id']
+
+    # Last-Event-ID within the buffer: the missed events are replayed
+    sub = subscribe(broker, ADMIN, str(first_event))
+    assert [message['request_id'] for _, message in messages(sub)] == ids[1:]
+    assert not sub.overflowed
+
+    # Older than the buffer: the client must reload
+    sub = subscribe(broker, ADMIN, str(first_event - 5))
+    assert sub.overflowed
+
+
+def add_event(conn, event_id, request_id):
+    # As if the transaction that took this id committed now
+    conn.cursor().execute("INSERT INTO RequestEvent (id, request_id, action) VALUES (%s, %s, 'updated')",
+                          (event_id, request_id))
+
+
+def test_late_commit_is_still_delivered(conn):
+    broker = events.EventBroker()
+    broker._poll(conn)
+    sub = subscribe(broker, ADMIN)
+    add_event(conn, 1, 10)
+    add_event(conn, 150, 11)   # ids 2..149 still uncommitted
+    broker._poll(conn)
+    add_event(conn, 3, 12)     # committed after 147 later ids
+    broker._poll(conn)
+    broker._poll(conn)
+
+    assert [message['request_id'] for _, message in messages(sub)] == [10, 11, 12]
+    assert not sub.overflowed
+    assert broker.status()['open_gaps'] == 147
+
+    # Replay follows delivery order: after event 150 comes the late event 3
+    late = subscribe(broker, ADMIN, '150')
+    assert [event_id for event_id, _ in messages(late)] == [3]
+
+
+def test_gap_that_never_fills_resyncs(conn):
+    broker = events.EventBroker(gap_timeout=0)
+    broker._poll(conn)
+    sub = subscribe(broker, ADMIN)
+    add_event(conn, 1, 10)
+    add_event(conn, 3, 11)     # id 2 was rolled back, or commits too late
+    broker._poll(conn)
+    broker._poll(conn)
+
+    assert sub.overflowed
+    assert broker.status()['open_gaps'] == 0
+    stream = events.stream(sub)
+    next(stream)
+    assert next(stream) == "event: resync\ndata: {}\n\n"
+    # A client that reconnects from before the lost id must reload too
+    assert subscribe(broker, ADMIN, '1').overflowed
+    assert not subscribe(broker, ADMIN, '3').overflowed
@@ -0,0 +1,86 @@
+import csv
+import io
+import json
+
+import mysql.connector
+import pytest
+
+import export
+import testing
+
+# Streaming exports on this worker's SQLite database.
+
+
+def test_requests_csv_is_scoped(client, conn, make_user, login):
+    team = testing.make_team(conn)
+    login(client, make_user())
+    equipment_id = testing.create_equipment(client, 'Lathe', team)
+    for subject in ('Noisy', 'Leak, "urgent"'):
+        testing.create_request(client, subject, equipment_id, team)
+    login(client, make_user())
+    testing.create_request(client, 'Not mine', testing.create_equipment(client, 'Press'))
+
+    # Closing the response gives the export slot back
+    with client.get('/api/export/requests') as response:
+        assert response.status_code == 200
+        assert response.headers['Content-Disposition'].endswith('.csv"')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row['subject'], row['equipment_name']) for row in rows] == [('Not mine', 'Press')]
+
+
+def test_equipment_ndjson(client, make_user, login):
+    login(client, make_user())
+    for name in ('Lathe', 'Press'):
+        testing.create_equipment(client, name)
+    with client.get('/api/export/equipment?format=ndjson') as response:
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [(line['name'], line['serial_number'], line['is_scrapped']) for line in lines] == [
+        ('Lathe', 'SN-Lathe', 0), ('Press', 'SN-Press', 0)]
+
+
+def test_empty_csv_keeps_its_header(client, make_user, login):
+    login(client, make_user())
+    with client.get('/api/export/requests') as response:
+        body = response.get_data(as_text=True)
+    assert body.startswith('id,subject,') and body.count('\n') == 1
+
+
+def test_audit_export_is_admin_only(client, make_user, login):
+    login(client, make_user())
+    assert client.get('/api/export/logs').status_code == 403
+
+
+def connect_failing_after(batches):
+    # A connection whose cursors lose the server after `batches` fetches
+    def connect():
+        connection = testing.install_database().connect()
+        make_cursor = connection.cursor
+
+        def cursor(**kwargs):
+            c = make_cursor(**kwargs)
+            fetchmany = c.fetchmany
+            left = [batches]
+
+            def fetch(size):
+                if not left[0]:
+                    raise mysql.connector.OperationalError("Lost connection to MySQL server during query")
+                left[0] -= 1
+                return fetchmany(size)
+            c.fetchmany = fetch
+            return c
+
+        connection.cursor = cursor
+        return connection
+    return connect
+
+
+def test_failure_mid_stream_aborts_the_download(conn, monkeypatch):
+    for name in ('Mechanics', 'Electrical', 'Hydraulics'):
+        testing.make_team(conn, name)
+    monkeypatch.setattr(export, 'BATCH_ROWS', 1)
+
+    body = export.stream("SELECT team_name FROM MaintenanceTeam ORDER BY id", (), 'csv', connect_failing_after(2))
+    assert next(body) == "team_name\r\nMechanics\r\n"
+    assert next(body) == "Electrical\r\n"
+    with pytest.raises(mysql.connector.OperationalError):
+        next(body)
@@ -0,0 +1,53 @@
+import io
+
+import import_equipment
+import testing
+
+# Bulk equipment import (CSV / NDJSON) through POST /api/equipment/import.
+
+CSV = """name,serial_number,equipment_type,team,purchase_date
+Lathe,L-1,machine,Mechanics,2024-01-02
+Forklift,F-1,Vehicle,,
+No serial,,Machine,,
+Robot,R-1,Machine,Nobody,
+Lathe copy,L-1,Machine,,
+"""
+
+
+def test_csv_import(client, conn, make_user, login):
+    team = testing.make_team(conn, 'Mechanics')
+    login(client, make_user())
+    response = client.post('/api/equipment/import', data=CSV.encode(), content_type='text/csv')
+    assert response.status_code == 200
+    report = response.json
+    assert (report['rows'], report['created'], report['updated'], report['error_count']) == (5, 2, 0, 3)
+    assert [(e['line'], e['serial_number']) for e in report['errors']] == [(4, ''), (5, 'R-1'), (6, 'L-1')]
+
+    rows = {row['serial_number']: row for row in client.get('/api/equipment').json}
+    assert set(rows) == {'L-1', 'F-1'}
+    assert rows['L-1']['maintenance_team_id'] == team
+    assert rows['L-1']['equipment_type'] == 'Machine'
+
+
+def test_reimport_updates_in_place(client, make_user, login):
+    login(client, make_user())
+    client.post('/api/equipment/import', data=b'{"name": "Lathe", "serial_number": "L-1"}\n',
+                content_type='application/x-ndjson')
+    response = client.post('/api/equipment/import?format=ndjson', data={
+        'file': (io.BytesIO(b'{"name": "Big lathe", "serial_number": "L-1", "location": "Bay 2"}\n'), 'a.ndjson')})
+    assert (response.json['created'], response.json['updated']) == (0, 1)
+    assert [(row['name'], row['location']) for row in client.get('/api/equipment').json] == [('Big lathe', 'Bay 2')]
+
+
+def test_dry_run_writes_nothing(client, make_user, login):
+    login(client, make_user())
+    response = client.post('/api/equipment/import?dry_run=1', data=CSV.encode(), content_type='text/csv')
+    assert response.json['error_count'] == 3
+    assert client.get('/api/equipment').json == []
+
+
+def test_read_rows_reports_bad_json():
+    rows = list(import_equipment.read_rows(io.BytesIO(b'{"name": "A"}\n\n[1]\n{oops\n'), 'ndjson'))
+    assert [line for line, _ in rows] == [1, 3, 4]
+    assert isinstance(rows[1][1], import_equipment.RowError)
+    assert isinstance(rows[2][1], import_equipment.RowError)
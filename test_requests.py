@@ -0,0 +1,107 @@
+import counters
+import testing
+
+# Request writes and the dashboard counters they maintain: after every path
+# that changes MaintenanceRequest rows, counters.check() must agree with a
+# fresh scan.
+
+
+def in_sync(conn):
+    ok, expected, actual = counters.check(conn.cursor(dictionary=True))
+    assert ok, (expected, actual)
+    return actual
+
+
+def board(client, conn, make_user, login, requests=4):
+    # A team, a Company User with `requests` open corrective requests on one
+    # machine, and a technician on the team
+    team = testing.make_team(conn)
+    login(client, make_user())
+    equipment_id = testing.create_equipment(client, 'Lathe', team)
+    ids = [testing.create_request(client, f"Fix {n}", equipment_id, team) for n in range(requests)]
+    technician = make_user('Technician', team_id=team)
+    return team, equipment_id, ids, technician
+
+
+def test_single_moves_keep_counters_in_sync(client, conn, make_user, login):
+    team, equipment_id, ids, technician = board(client, conn, make_user, login)
+    login(client, technician)
+    client.put(f"/api/requests/{ids[0]}", json={'stage': 'In Progress', 'technician_id': technician['technician_id']})
+    client.put(f"/api/requests/{ids[1]}", json={'stage': 'Repaired'})
+    client.put(f"/api/requests/{ids[0]}", json={'stage': 'New'})
+
+    stats = in_sync(conn)
+    assert stats['active_requests'] == 3
+    assert dict((s['stage'], s['count']) for s in stats['by_stage']) == {'New': 3, 'Repaired': 1}
+    assert client.get('/api/stats').json == stats
+
+
+def test_rejected_move_changes_nothing(client, conn, make_user, login):
+    team, equipment_id, ids, technician = board(client, conn, make_user, login, requests=1)
+    login(client, technician)
+    assert client.put(f"/api/requests/{ids[0]}", json={'stage': 'Scrap'}).status_code == 200
+    response = client.put(f"/api/requests/{ids[0]}", json={'stage': 'New'})
+    assert response.status_code == 403
+    assert client.put(f"/api/requests/{ids[0]}", json={}).status_code == 400
+    # The rejected PUT released its row lock: the next write goes through
+    login(client, make_user('Admin'))
+    assert client.delete(f"/api/requests/{ids[0]}").status_code == 200
+    assert in_sync(conn)['by_stage'] == []
+
+
+def test_batch(client, conn, make_user, login):
+    team, equipment_id, ids, technician = board(client, conn, make_user, login)
+    login(client, technician)
+    response = client.post('/api/requests/batch', json={'update': [
+        {'id': ids[0], 'stage': 'In Progress', 'technician_id': technician['technician_id']},
+        {'id': ids[1], 'stage': 'Repaired'},
+        {'id': ids[2], 'stage': 'Lost'},
+        {'id': ids[2]},
+        {'id': 999999, 'stage': 'New'},
+    ], 'delete': [ids[3]]})
+    assert response.status_code == 200
+    body = response.json
+    assert (body['updated'], body['deleted']) == (2, 0)
+    assert [(r['id'], r['status']) for r in body['results']] == [
+        (ids[0], 200), (ids[1], 200), (ids[2], 400), (ids[2], 400), (999999, 404), (ids[3], 403)]
+
+    login(client, make_user('Admin'))
+    response = client.post('/api/requests/batch', json={'update': [{'id': ids[1], 'stage': 'New'}],
+                                                        'delete': [ids[2], ids[3]]})
+    assert (response.json['updated'], response.json['deleted']) == (1, 2)
+
+    stats = in_sync(conn)
+    assert stats['technician_load'] == 1
+    assert dict((s['stage'], s['count']) for s in stats['by_stage']) == {'New': 1, 'In Progress': 1}
+    equipment = client.get(f"/api/equipment?id={equipment_id}").json
+    assert equipment[0]['open_requests'] == 2
+
+
+def test_batch_scrap_locks_the_request(client, conn, make_user, login):
+    team, equipment_id, ids, technician = board(client, conn, make_user, login, requests=2)
+    login(client, technician)
+    client.post('/api/requests/batch', json={'update': [{'id': ids[0], 'stage': 'Scrap'}]})
+    response = client.post('/api/requests/batch', json={'update': [{'id': ids[0], 'stage': 'New'},
+                                                                   {'id': ids[1], 'stage': 'In Progress'}]})
+    assert [r['status'] for r in response.json['results']] == [403, 200]
+    in_sync(conn)
+
+    login(client, make_user())
+    assert client.get(f"/api/equipment?id={equipment_id}").json[0]['is_scrapped']
+
+
+def test_cascades_keep_counters_in_sync(client, conn, make_user, login):
+    team, equipment_id, ids, technician = board(client, conn, make_user, login)
+    other_equipment = testing.create_equipment(client, 'Press', team)
+    testing.create_request(client, 'Leak', other_equipment, team)
+
+    login(client, make_user('Admin'))
+    client.put(f"/api/requests/{ids[0]}", json={'technician_id': technician['technician_id']})
+    assert client.delete(f"/api/technicians/{technician['technician_id']}").status_code == 200
+    in_sync(conn)
+    assert client.delete(f"/api/teams/{team}").status_code == 200
+    in_sync(conn)
+
+    login(client, make_user())
+    assert client.delete(f"/api/equipment/{equipment_id}").status_code == 200
+    assert in_sync(conn)['active_requests'] == 1
@@ -0,0 +1,176 @@
+import os
+
+import mysql.connector
+import pytest
+
+import db
+import migrate
+import storage
+import table_versions
+import testing
+
+# The SQLite driver: MySQL dialect translation, schema build, error mapping
+# and one database per test worker.
+
+
+# --- Statement translation ---
+
+def test_placeholders_become_qmarks():
+    assert storage.translate("SELECT * FROM User WHERE id = %s AND role = %s") == \
+        "SELECT * FROM User WHERE id = ? AND role = ?"
+
+
+def test_on_duplicate_key_update_becomes_upsert():
+    sql = storage.translate("INSERT INTO T (a, b) VALUES (%s, %s) ON DUPLICATE KEY UPDATE b = VALUES(b)")
+    assert sql == "INSERT INTO T (a, b) VALUES (?, ?) ON CONFLICT DO UPDATE SET b = excluded.b"
+
+
+def test_insert_ignore_and_locking_reads():
+    assert storage.translate("INSERT IGNORE INTO T (a) VALUES (%s)") == "INSERT OR IGNORE INTO T (a) VALUES (?)"
+    assert storage.translate("SELECT * FROM T WHERE id = %s FOR UPDATE") == "SELECT * FROM T WHERE id = ?"
+
+
+def test_delete_limit_keeps_its_limit():
+    sql = storage.translate("DELETE FROM AuditLog WHERE timestamp < %s LIMIT %s")
+    assert sql == "DELETE FROM AuditLog WHERE rowid IN (SELECT rowid FROM AuditLog WHERE timestamp < ? LIMIT ?)"
+
+
+def test_interval_and_match():
+    assert "datetime('now', '-' || ? || ' minutes')" in storage.translate(
+        "DELETE FROM RequestEvent WHERE created_at < NOW() - INTERVAL %s MINUTE")
+    assert "mysql_match(?, e.name, e.description)" in storage.translate(
+        "SELECT id FROM Equipment e WHERE MATCH(e.name, e.description) AGAINST (%s IN BOOLEAN MODE)")
+
+
+def test_utc_timestamp_is_current_timestamp():
+    # SQLite's CURRENT_TIMESTAMP is UTC already
+    assert storage.translate("UPDATE TableVersion SET updated_at = UTC_TIMESTAMP()") == \
+        "UPDATE TableVersion SET updated_at = CURRENT_TIMESTAMP"
+
+
+def test_session_statements_are_noops():
+    assert storage.translate("SET SESSION innodb_lock_wait_timeout = 5") is None
+
+
+# --- Schema translation ---
+
+def test_enum_becomes_check_constraint():
+    create, = storage.translate_ddl("CREATE TABLE T (stage ENUM('New', 'Done') DEFAULT 'New')")
+    assert "stage TEXT CHECK (stage IN ('New', 'Done')) DEFAULT 'New'" in create
+
+
+def test_auto_increment_and_inline_indexes():
+    statements = storage.translate_ddl("""
+        CREATE TABLE T (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100),
+            body TEXT,
+            INDEX idx_name (name),
+            FULLTEXT ft_body (body)
+        )
+    """)
+    assert "id INTEGER PRIMARY KEY AUTOINCREMENT" in statements[0]
+    assert "FULLTEXT" not in statements[0]
+    assert statements[1:] == ["CREATE INDEX IF NOT EXISTS idx_name ON T (name)"]
+
+
+def test_column_type_changes_are_skipped():
+    assert storage.translate_ddl("ALTER TABLE TableVersion MODIFY updated_at DATETIME NOT NULL") == []
+
+
+def test_schema_builds_every_table(conn):
+    tables = set(testing.install_database().tables(conn))
+    assert {'User', 'Equipment', 'MaintenanceRequest', 'TableVersion', 'RequestEvent', 'SchemaMigration'} <= tables
+
+
+def test_migrations_run_on_sqlite():
+    driver = storage.SQLiteDriver(':memory:', name='mechcare-test-migrations')
+    try:
+        conn = driver.connect()
+        cursor = conn.cursor()
+        cursor.execute("DROP TABLE RequestEvent")
+        cursor.execute("DELETE FROM SchemaMigration WHERE version IN ('0006', '0009')")
+        lines = []
+        applied = migrate.apply_pending(conn, out=lines.append)
+        assert [m['version'] for m in applied] == ['0006', '0009']
+        # 0006's column is already there: reported and skipped, like on MySQL
+        assert any('already present' in line for line in lines)
+        assert 'RequestEvent' in driver.tables(conn)
+        assert migrate.pending(cursor) == []
+        conn.close()
+    finally:
+        driver.close()
+
+
+# --- Running the dialect ---
+
+def test_upsert_runs(conn):
+    cursor = conn.cursor(dictionary=True)
+    table_versions.bump(cursor, 'Equipment', 'MaintenanceRequest')
+    table_versions.bump(cursor, 'Equipment')
+    versions = table_versions.get_versions(cursor, ['Equipment', 'MaintenanceRequest', 'Technician'])
+    assert {t: v for t, (v, _) in versions.items()} == {'Equipment': 2, 'MaintenanceRequest': 1, 'Technician': 0}
+
+
+def test_errors_are_mysql_connector_errors(conn, make_user):
+    user = make_user()
+    cursor = conn.cursor()
+    with pytest.raises(mysql.connector.IntegrityError) as e:
+        cursor.execute("INSERT INTO User (name, email, password_hash, role) VALUES (%s, %s, %s, %s)",
+                       ('Twin', user['email'], 'x', 'Company User'))
+    assert e.value.errno == 1062
+    with pytest.raises(mysql.connector.ProgrammingError):
+        cursor.execute("SELECT * FROM NoSuchTable")
+
+
+def test_transactions_roll_back(conn):
+    other = testing.install_database().connect()
+    try:
+        conn.start_transaction()
+        conn.cursor().execute("INSERT INTO MaintenanceTeam (team_name) VALUES (%s)", ('Gone',))
+        conn.rollback()
+        cursor = other.cursor()
+        cursor.execute("SELECT COUNT(*) FROM MaintenanceTeam")
+        assert cursor.fetchone()[0] == 0
+    finally:
+        other.close()
+
+
+# --- One database per worker ---
+
+def test_database_is_named_after_the_worker(monkeypatch):
+    monkeypatch.setenv('PYTEST_XDIST_WORKER', 'gw3')
+    assert testing.database_name() == f"mechcare-test-gw3-{os.getpid()}"
+
+
+def test_workers_do_not_share_rows(conn):
+    testing.make_team(conn, 'Only here')
+    other = storage.SQLiteDriver(':memory:', name='mechcare-test-other-worker')
+    try:
+        other_conn = other.connect()
+        cursor = other_conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM MaintenanceTeam")
+        assert cursor.fetchone()[0] == 0
+        other_conn.close()
+    finally:
+        other.close()
+
+
+def test_app_uses_this_workers_database(app, conn):
+    assert storage.get_driver() is testing.install_database()
+    testing.make_team(conn, 'Seen by the pool')
+    pooled = db.get_pool().checkout()
+    try:
+        cursor = pooled.cursor()
+        cursor.execute("SELECT team_name FROM MaintenanceTeam")
+        assert cursor.fetchall() == [('Seen by the pool',)]
+    finally:
+        db.get_pool().release(pooled)
+
+
+def test_reset_empties_tables(conn):
+    testing.make_team(conn)
+    testing.reset()
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM MaintenanceTeam")
+    assert cursor.fetchone()[0] == 0
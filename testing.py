@@ -0,0 +1,159 @@
+import os
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+# In-process test support: the app on an in-memory SQLite database, no MySQL.
+#
+#   python -m pytest                 one process
+#   python -m pytest -n auto         one worker per core (pytest-xdist)
+#
+# conftest.py loads this module as the first pytest plugin, so the environment
+# below is set before profiler.py (the next plugin) or a test imports the app.
+# Existing DB_BACKEND etc. values win. Every worker process gets its
+# own database (named after the xdist worker id and pid), created once from
+# schema.sql + migrations/ and emptied between tests, so tests never see each
+# other's rows.
+#
+# Fixtures: app, client, conn (a raw connection), make_user(role=...) and
+# login(client, user). profiler's query_budget fixture is available too.
+# create_equipment / create_request go through the API as the logged-in user.
+
+PASSWORD = 'password123'
+
+
+def configure():
+    os.environ.setdefault('DB_BACKEND', 'sqlite')
+    os.environ.setdefault('SQLITE_PATH', ':memory:')
+    # Audit rows are written on the request's connection, not by a thread
+    os.environ.setdefault('AUDIT_MODE', 'sync')
+    # Passwords are hashed in the test's thread, not a process pool
+    os.environ.setdefault('PASSWORD_POOL_WORKERS', '0')
+    os.environ.setdefault('QUERY_CACHE_BACKEND', 'lru')
+    os.environ.setdefault('PROFILER_ENABLED', '1')
+    os.environ.setdefault('PROFILER_REPORT_DIR', '')
+
+
+configure()
+
+
+def database_name():
+    worker = os.getenv('PYTEST_XDIST_WORKER', 'main')
+    return f"mechcare-test-{worker}-{os.getpid()}"
+
+
+_driver = None
+
+
+def install_database():
+    # One driver (= one database) per process, shared by every test in it
+    global _driver
+    import db
+    import storage
+    if _driver is None:
+        if storage.BACKEND != 'sqlite':
+            raise RuntimeError("Tests run on SQLite: call testing.configure() before importing the app")
+        _driver = storage.SQLiteDriver(storage.SQLITE_PATH, name=database_name())
+        storage.set_driver(_driver)
+        db.reset_pool()
+    return _driver
+
+
+def reset():
+    # Empty tables and every process-local cache that could hold their rows
+    import identity
+    import passwords
+    import qcache
+    install_database().reset()
+    identity.cache.clear()
+    qcache.cache.backend.clear()
+    passwords.throttle.clear()
+
+
+# --- Data helpers ---
+
+def make_user(conn, role='Company User', name=None, email=None, team_id=None):
+    # Technicians also get a Technician row (on team_id, if given)
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT COUNT(*) AS n FROM User")
+    n = cursor.fetchone()['n'] + 1
+    name = name or f"{role} {n}"
+    email = email or f"user{n}@example.test"
+    cursor.execute("INSERT INTO User (name, email, password_hash, role) VALUES (%s, %s, %s, %s)",
+                   (name, email, generate_password_hash(PASSWORD), role))
+    user = {'id': cursor.lastrowid, 'name': name, 'email': email, 'role': role}
+    if role == 'Technician':
+        cursor.execute("INSERT INTO Technician (name, user_id, team_id) VALUES (%s, %s, %s)",
+                       (name, user['id'], team_id))
+        user['technician_id'] = cursor.lastrowid
+    cursor.close()
+    return user
+
+
+def make_team(conn, team_name='Mechanics'):
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO MaintenanceTeam (team_name) VALUES (%s)", (team_name,))
+    team_id = cursor.lastrowid
+    cursor.close()
+    return team_id
+
+
+def create_equipment(client, name, team_id=None, **fields):
+    # Through the API, as the logged-in Company User -> id
+    response = client.post('/api/equipment', json=dict({
+        'name': name, 'serial_number': f"SN-{name}", 'equipment_type': 'Machine',
+        'maintenance_team_id': team_id, 'department': 'Ops', 'location': 'Bay 1'}, **fields))
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.json['id']
+
+
+def create_request(client, subject, equipment_id, team_id=None, **fields):
+    # Through the API, as the logged-in Company User -> id
+    response = client.post('/api/requests', json=dict({
+        'subject': subject, 'equipment_id': equipment_id, 'team_id': team_id,
+        'request_type': 'Corrective', 'scheduled_date': '2025-01-05'}, **fields))
+    assert response.status_code == 201, response.get_data(as_text=True)
+    return response.json['id']
+
+
+def login(client, user):
+    with client.session_transaction() as sess:
+        sess['user_id'] = user['id']
+        sess['user_role'] = user['role']
+        sess['user_name'] = user['name']
+    return client
+
+
+# --- Fixtures ---
+
+@pytest.fixture
+def app():
+    install_database()
+    from app import app as flask_app
+    flask_app.config['TESTING'] = True
+    reset()
+    yield flask_app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def conn(app):
+    connection = install_database().connect()
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(name='make_user')
+def make_user_fixture(conn):
+    def make(role='Company User', **kwargs):
+        return make_user(conn, role, **kwargs)
+    return make
+
+
+@pytest.fixture(name='login')
+def login_fixture():
+    return login
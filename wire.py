@@ -0,0 +1,126 @@
+import datetime
+import decimal
+import gzip
+import json
+import os
+
+from flask import jsonify, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response encoding for the JSON APIs.
+#
+# - JSON goes through orjson when it is installed (falls back to the stdlib
+#   encoder). Dates and datetimes come out as ISO 8601 and Decimals as
+#   strings on both paths, so views don't convert them by hand.
+# - List endpoints accept ?format=columnar: {"columns": [...], "rows": [[...]]}
+#   instead of one object per row, so keys aren't repeated on every row.
+# - Responses above COMPRESS_MIN_SIZE are compressed with brotli (if the
+#   module is installed) or gzip, whichever the client accepts.
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/css', 'application/javascript', 'text/javascript')
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    return DefaultJSONProvider.default(value)
+
+
+def dumps(obj):
+    # -> bytes, for bodies built outside Flask (asgi_app.py)
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=_default).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            # OPT_NON_STR_KEYS: counters and lookups are keyed by ints
+            return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+        kwargs.setdefault('default', _default)
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = dumps(obj) if orjson is not None else self.dumps(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def columnar_requested():
+    return request.args.get('format') == 'columnar'
+
+
+def columnar(rows):
+    # Rows from a dictionary cursor share one key order
+    columns = list(rows[0].keys()) if rows else []
+    return {'columns': columns, 'rows': [list(row.values()) for row in rows]}
+
+
+def rows_response(rows):
+    # jsonify(rows), or the columnar form when the client asked for it
+    return jsonify(columnar(rows) if columnar_requested() else rows)
+
+
+def _choose_encoding(accept_encoding):
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+
+def compress(data, accept_encoding):
+    # -> (body, Content-Encoding or None); accept_encoding is anything that
+    # supports `in` (werkzeug's accept object or the raw header string)
+    encoding = _choose_encoding(accept_encoding)
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return data, None
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY), 'br'
+    return gzip.compress(data, compresslevel=GZIP_LEVEL), 'gzip'
+
+
+def compress_response(response):
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    data, encoding = compress(response.get_data(), request.accept_encodings)
+    if encoding is None:
+        return response
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    # The bytes differ per encoding, so a strong validator would be wrong
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    app.json = JSONProvider(app)
+    app.after_request(compress_response)